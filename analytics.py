@@ -0,0 +1,271 @@
+"""
+Match Analytics
+Match, details and share events go into a bounded in-memory buffer (O(1) append, no I/O on
+the request path); a background task writes them in batches to Postgres (COPY) or SQLite
+"""
+from typing import List, Optional, Sequence, Tuple
+from collections import deque
+from datetime import datetime, timezone
+import asyncio
+import sqlite3
+import time
+
+try:
+    import asyncpg
+except ImportError:  # asyncpg is optional unless ANALYTICS_SINK=postgres
+    asyncpg = None
+
+from metrics import metrics
+from config import settings
+
+
+COLUMNS = (
+    "ts", "event", "fid", "match_fid", "personality1", "personality2", "score", "match_level", "tier"
+)
+
+Event = Tuple[float, str, str, str, str, str, int, str, str]
+
+
+class PostgresSink:
+    """Batches go through COPY (copy_records_to_table); the table is created on first use"""
+
+    def __init__(self, dsn: str, table: str = "match_events"):
+        if asyncpg is None:
+            raise RuntimeError("asyncpg is not installed")
+        self.dsn = dsn
+        self.table = table
+        self._pool = None
+
+    async def _connect(self):
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=2)
+            async with self._pool.acquire() as conn:
+                await conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.table} (
+                        ts timestamptz NOT NULL,
+                        event text NOT NULL,
+                        fid text,
+                        match_fid text,
+                        personality1 text,
+                        personality2 text,
+                        score smallint,
+                        match_level text,
+                        tier text
+                    )
+                """)
+        return self._pool
+
+    async def write(self, events: Sequence[Event]):
+        pool = await self._connect()
+        records = [(datetime.fromtimestamp(event[0], timezone.utc),) + tuple(event[1:]) for event in events]
+        async with pool.acquire() as conn:
+            await conn.copy_records_to_table(self.table, records=records, columns=COLUMNS)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+class SQLiteSink:
+    """Local sink for development and tests; writes run in a worker thread"""
+
+    def __init__(self, path: str, table: str = "match_events"):
+        self.path = path
+        self.table = table
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _write(self, events: Sequence[Event]):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(ts REAL, event TEXT, fid TEXT, match_fid TEXT, personality1 TEXT, "
+                "personality2 TEXT, score INTEGER, match_level TEXT, tier TEXT)"
+            )
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO {self.table} ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                events
+            )
+
+    async def write(self, events: Sequence[Event]):
+        await asyncio.to_thread(self._write, events)
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class EventRecorder:
+    """
+    Bounded event buffer with a batching background flusher
+    When the sink falls behind and the buffer fills, new events are dropped and counted
+    rather than slowing requests down; failed batches are retried with backoff
+    """
+
+    def __init__(
+        self,
+        sink=None,
+        capacity: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_backoff: float = 30.0
+    ):
+        self.sink = sink
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self._buffer: deque = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.events = metrics.counter(
+            "analytics_events_total",
+            "Analytics events by outcome (recorded, dropped, written, failed writes)",
+            ("outcome",)
+        )
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    def record(
+        self,
+        event: str,
+        fid: str,
+        match_fid: str = "",
+        personality1: str = "",
+        personality2: str = "",
+        score: int = 0,
+        match_level: str = "",
+        tier: str = ""
+    ) -> bool:
+        """Append one event (O(1)); returns False if it was dropped"""
+        if self.sink is None:
+            return False
+        if len(self._buffer) >= self.capacity:
+            self.events.inc("dropped")
+            return False
+        self._buffer.append((time.time(), event, fid, match_fid, personality1, personality2, int(score), match_level, tier))
+        self.events.inc("recorded")
+        if len(self._buffer) >= self.batch_size and self._wake is not None:
+            self._wake.set()  # a full batch is waiting, don't sit out the interval
+        return True
+
+    def record_match(self, event: str, result, tier: str = "") -> bool:
+        """Record an event about a MatchResult"""
+        return self.record(
+            event,
+            result.user_fid,
+            result.match_fid,
+            result.user_type.value,
+            result.match_type.value,
+            result.total_score,
+            result.match_level,
+            tier
+        )
+
+    def _take(self) -> List[Event]:
+        count = min(self.batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(count)]
+
+    def _requeue(self, batch: List[Event]):
+        """Put a failed batch back in front, dropping what no longer fits"""
+        room = self.capacity - len(self._buffer)
+        if room < len(batch):
+            self.events.inc("dropped", amount=len(batch) - room)
+            batch = batch[:room]
+        self._buffer.extendleft(reversed(batch))
+
+    async def flush(self) -> int:
+        """Write everything buffered now; returns the number of events written"""
+        written = 0
+        while self._buffer:
+            batch = self._take()
+            try:
+                await self.sink.write(batch)
+            except BaseException:  # cancellation too, a batch mid-write must not vanish
+                self._requeue(batch)
+                raise
+            self.events.inc("written", amount=len(batch))
+            written += len(batch)
+        return written
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping.is_set():
+                break  # stop() writes what's left
+            try:
+                await self.flush()
+                backoff = self.flush_interval
+            except Exception as e:
+                self.events.inc("failed")
+                print(f"Analytics flush failed: {e}, retrying in {backoff:.0f}s")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), backoff)
+                except asyncio.TimeoutError:
+                    pass
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def start(self):
+        """Start the background flusher (call from a running loop)"""
+        if self.sink is not None and (self._task is None or self._task.done()):
+            self._wake = asyncio.Event()
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Stop the flusher, write what's left (each step bounded by timeout) and close the sink"""
+        if self._task is not None:
+            # Let a write in progress finish; cancel only if it outlives the timeout (its batch is requeued)
+            self._stopping.set()
+            self._wake.set()
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._task = None
+        if self.sink is None:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except Exception as e:
+            print(f"Analytics final flush failed, {len(self._buffer)} events lost: {e}")
+            self.events.inc("dropped", amount=len(self._buffer))
+            self._buffer.clear()
+        await self.sink.close()
+
+
+def create_event_sink(backend: str, database_url: Optional[str] = None, sqlite_path: str = "analytics.db"):
+    """Build the configured sink; None disables analytics"""
+    if backend == "postgres" and database_url:
+        try:
+            return PostgresSink(database_url)
+        except Exception as e:
+            print(f"Postgres analytics sink unavailable: {e}, analytics disabled")
+            return None
+    if backend == "sqlite":
+        return SQLiteSink(sqlite_path)
+    return None
+
+
+# Singleton instance
+event_recorder = EventRecorder(
+    create_event_sink(settings.analytics_sink, settings.database_url, settings.analytics_sqlite_path),
+    capacity=settings.analytics_buffer,
+    batch_size=settings.analytics_batch_size,
+    flush_interval=settings.analytics_flush_interval
+)
+metrics.register_callback("analytics_buffered", "Analytics events waiting to be written", lambda: len(event_recorder))
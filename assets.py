@@ -0,0 +1,118 @@
+"""
+Static Assets
+Manifest of fingerprinted assets written by build_assets.py, and a StaticFiles that
+serves their precompressed variants, caching only fingerprinted files as immutable
+"""
+from typing import Dict, FrozenSet
+import json
+import mimetypes
+import os
+import re
+import stat
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+
+from config import settings
+
+
+STATIC_DIR = "static"
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+DIST_URL = "/static/dist"
+MANIFEST_NAME = "manifest.json"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# name.<content hash>.ext as written by build_assets.fingerprint(), plus its .br/.gz files
+FINGERPRINTED = re.compile(r"\.[0-9a-f]{8,64}\.[A-Za-z0-9]+(\.br|\.gz)?$")
+
+
+def is_fingerprinted(path: str) -> bool:
+    """True for content-hashed files, whose bytes never change under the same name"""
+    return FINGERPRINTED.search(path) is not None
+
+
+class AssetManifest:
+    """Maps source asset names (icon.png) to fingerprinted files (icon.3fa2c1d9e0.png)"""
+
+    def __init__(self, dist_dir: str = DIST_DIR):
+        self.dist_dir = dist_dir
+        self.files: Dict[str, str] = {}
+        self.load()
+
+    def load(self) -> bool:
+        """(Re)read the manifest, returns False when the assets haven't been built"""
+        path = os.path.join(self.dist_dir, MANIFEST_NAME)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+            return False
+        return True
+
+    def url(self, name: str) -> str:
+        """Site-relative URL, fingerprinted when built, plain /static otherwise"""
+        hashed = self.files.get(name)
+        return f"{DIST_URL}/{hashed}" if hashed else f"/static/{name}"
+
+    def absolute_url(self, name: str) -> str:
+        return f"{settings.base_url}{self.url(name)}"
+
+    def rewrite(self, text: str) -> str:
+        """Point /static/<name> references in HTML/CSS/JSON at the fingerprinted files"""
+        for name, hashed in self.files.items():
+            text = text.replace(f"/static/{name}", f"{DIST_URL}/{hashed}")
+        return text
+
+
+def _accepted_encodings(scope) -> FrozenSet[str]:
+    for name, value in scope.get("headers", []):
+        if name == b"accept-encoding":
+            accepted = set()
+            for part in value.decode("latin-1").split(","):
+                encoding, _, params = part.strip().partition(";")
+                if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                    accepted.add(encoding.strip().lower())
+            return frozenset(accepted)
+    return frozenset()
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles for fingerprinted assets: sends the .br/.gz file built next to an
+    asset when the client accepts it; hashed names are immutable, anything else
+    (manifest.json) is revalidated so a new build is picked up
+    """
+
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    async def get_response(self, path: str, scope):
+        response = None
+        accepted = _accepted_encodings(scope)
+        for encoding, suffix in self.ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            except OSError:
+                continue
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers["content-encoding"] = encoding
+                media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                if media_type.startswith("text/"):
+                    media_type += "; charset=utf-8"
+                response.headers["content-type"] = media_type
+                break
+
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["cache-control"] = IMMUTABLE if is_fingerprinted(path) else REVALIDATE
+        response.headers["vary"] = "Accept-Encoding"
+        return response
+
+
+# Singleton instance
+assets = AssetManifest()
@@ -0,0 +1,173 @@
+"""
+Batch Match Scoring
+Scores streams of fid pairs and yields results one at a time (NDJSON friendly)
+"""
+from typing import AsyncIterator, Dict, Iterable, Optional, Tuple
+from collections import OrderedDict, deque
+import asyncio
+import json
+
+from candidate_pool import candidate_pool
+from comedy_generator import comedy_generator
+from image_generator import image_generator
+from matchmaking import matchmaking_engine
+from overload import overload_controller
+from personality import PersonalityAnalyzer
+from config import settings
+from starlette.responses import StreamingResponse
+
+
+def parse_pair_line(line: str) -> Optional[Tuple[str, str]]:
+    """Parse `{"fid1": a, "fid2": b}`, `[a, b]` or `a,b` (CSV); blank lines and headers give None"""
+    line = line.strip()
+    if not line:
+        return None
+
+    if line[0] in "[{":
+        data = json.loads(line)
+        if isinstance(data, dict):
+            return str(data["fid1"]), str(data["fid2"])
+        return str(data[0]), str(data[1])
+
+    parts = [part.strip().strip('"') for part in line.split(",")]
+    if len(parts) < 2 or parts[0].lower() in ("fid1", "fid", "user_fid"):
+        return None
+    return parts[0], parts[1]
+
+
+async def pairs_from_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[str, str]]:
+    """Split a byte stream into lines and parse each as a pair, without buffering the whole body"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            pair = parse_pair_line(line.decode("utf-8"))
+            if pair:
+                yield pair
+    pair = parse_pair_line(buffer.decode("utf-8"))
+    if pair:
+        yield pair
+
+
+async def pairs_from_list(pairs: Iterable) -> AsyncIterator[Tuple[str, str]]:
+    """Adapt an in-memory list of pairs (JSON body) to the async pair stream"""
+    for pair in pairs:
+        if isinstance(pair, dict):
+            yield str(pair["fid1"]), str(pair["fid2"])
+        else:
+            yield str(pair[0]), str(pair[1])
+
+
+class BatchScorer:
+    """Scores fid pairs through MatchmakingEngine, comedy/images optional"""
+
+    def __init__(self, analysis_cache_size: int = 10_000):
+        self.analysis_cache_size = analysis_cache_size
+
+    def _analysis(self, fid: str, cache: "OrderedDict[str, Dict]") -> Dict:
+        """Pool record for known users; unknown fids are analyzed once per batch (LRU-bounded)"""
+        candidate = candidate_pool.get(fid)
+        if candidate is not None:
+            return candidate.to_analysis()
+
+        analysis = cache.get(fid)
+        if analysis is None:
+            analysis = PersonalityAnalyzer.analyze_user()
+            cache[fid] = analysis
+            if len(cache) > self.analysis_cache_size:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(fid)
+        return analysis
+
+    def _score(self, fid1: str, fid2: str, cache) -> Tuple[Dict, Dict]:
+        score = matchmaking_engine.score_compatibility(self._analysis(fid1, cache), self._analysis(fid2, cache))
+        record = {
+            "fid1": fid1,
+            "fid2": fid2,
+            "total_score": score["total_score"],
+            "match_level": score["match_level"],
+            "breakdown": score["breakdown"],
+            "common_tokens": score["common_tokens"],
+            "personality1": score["personality1"].value,
+            "personality2": score["personality2"].value
+        }
+        return record, score
+
+    async def _enrich(self, record: Dict, score: Dict, comedy: bool, image: bool) -> Dict:
+        profile1, profile2 = score["profile1"], score["profile2"]
+        tier = overload_controller.tier  # batches degrade with the live traffic
+        text = ""
+        try:
+            if comedy:
+                text = await comedy_generator.generate_match_comedy(
+                    profile1, profile2, record["total_score"], record["match_level"], mode=tier.comedy
+                )
+                record["comedy"] = text
+                record["date_idea"] = await comedy_generator.generate_date_idea(profile1, profile2)
+            if image:
+                key = await image_generator.store_match_image_async(
+                    profile1, profile2, record["total_score"], record["match_level"], text, mode=tier.image
+                )
+                record["image_url"] = f"{settings.base_url}/image/{key}.png"
+        except Exception as e:
+            record["error"] = str(e)
+        return record
+
+    async def score_pairs(
+        self,
+        pairs: AsyncIterator[Tuple[str, str]],
+        comedy: bool = False,
+        image: bool = False,
+        concurrency: int = 8
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield one result per pair, in input order
+        At most `concurrency` comedy/image stages run at once, so memory stays flat
+        """
+        cache: "OrderedDict[str, Dict]" = OrderedDict()
+        window: deque = deque()
+        count = 0
+
+        async for fid1, fid2 in pairs:
+            try:
+                record, score = self._score(fid1, fid2, cache)
+            except Exception as e:
+                record, score = {"fid1": fid1, "fid2": fid2, "error": str(e)}, None
+
+            if not (comedy or image) or score is None:
+                if window:
+                    # Keep input order behind any enrichments still running
+                    window.append(asyncio.create_task(asyncio.sleep(0, result=record)))
+                else:
+                    yield record
+            else:
+                window.append(asyncio.create_task(self._enrich(record, score, comedy, image)))
+
+            while len(window) >= max(1, concurrency):
+                yield await window.popleft()
+
+            count += 1
+            if count % 256 == 0:
+                await asyncio.sleep(0)  # let other requests run during long batches
+
+        while window:
+            yield await window.popleft()
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator may still be reading the request body
+    Skips Starlette's disconnect listener, which would compete for `receive` messages;
+    a disconnect surfaces from request.stream() or send() instead
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+# Singleton instance
+batch_scorer = BatchScorer()
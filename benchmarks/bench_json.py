@@ -0,0 +1,95 @@
+"""
+Benchmark: frame payload parsing and JSON response rendering, stdlib vs fast path
+Usage: python benchmarks/bench_json.py --rounds 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from starlette.responses import JSONResponse
+
+from export import top_pairs, type_pair_rows
+from fast_json import FastJSONResponse, loads, orjson
+from frame_models import FramePayload
+from personality import PersonalityAnalyzer
+
+
+FRAME_BODY = json.dumps({
+    "untrustedData": {
+        "fid": 2,
+        "url": "https://cryptomatch.example/match",
+        "messageHash": "0xd2b1ddc6c88e865a33cb1a565e0058d757042974",
+        "timestamp": 1706243218,
+        "network": 1,
+        "buttonIndex": 1,
+        "inputText": "",
+        "castId": {"fid": 226, "hash": "0xa48dd46161d8e57725f5e26e34ec19c13ff7f3b9"}
+    },
+    "trustedData": {"messageBytes": "0a61080d109e87" + "ab" * 150}
+}).encode()
+
+
+def parse_stdlib():
+    body = json.loads(FRAME_BODY)
+    untrusted_data = body.get("untrustedData", {})
+    return untrusted_data.get("fid"), untrusted_data.get("buttonIndex", 1), body.get("trustedData", {}).get("messageBytes")
+
+
+def parse_typed():
+    """What read_frame_payload does"""
+    payload = FramePayload.model_validate(loads(FRAME_BODY))
+    return payload.untrusted_data.fid, payload.untrusted_data.button_index, payload.trusted_data.message_bytes
+
+
+def parse_typed_json():
+    payload = FramePayload.model_validate_json(FRAME_BODY)
+    return payload.untrusted_data.fid, payload.untrusted_data.button_index, payload.trusted_data.message_bytes
+
+
+def payloads():
+    personalities = [
+        {"type": personality_type, "profile": PersonalityAnalyzer.get_personality_profile(personality_type)}
+        for personality_type in PersonalityAnalyzer.PERSONALITY_PROFILES
+    ]
+    return {
+        "personalities": {"count": len(personalities), "personalities": personalities},
+        "leaderboard": {"level": "type", "pairs": top_pairs(type_pair_rows(), 64)},
+        "health": {"status": "healthy", "service": "CryptoMatch", "version": "2.0.0", "environment": "development"}
+    }
+
+
+def per_call_us(fn, rounds: int) -> float:
+    return min(timeit.repeat(fn, number=rounds, repeat=3)) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if orjson is not None else 'no (stdlib fallback)'}")
+    assert parse_stdlib() == parse_typed() == parse_typed_json()
+    stdlib_us = per_call_us(parse_stdlib, args.rounds)
+    typed_us = per_call_us(parse_typed, args.rounds)
+    typed_json_us = per_call_us(parse_typed_json, args.rounds)
+    print(f"frame parse: json.loads + .get {stdlib_us:.2f} us, fast loads + FramePayload {typed_us:.2f} us "
+          f"({stdlib_us / typed_us:.2f}x, typed also validates), FramePayload.model_validate_json {typed_json_us:.2f} us")
+
+    stdlib_response = JSONResponse.__new__(JSONResponse)
+    fast_response = FastJSONResponse.__new__(FastJSONResponse)
+    for name, content in payloads().items():
+        assert json.loads(stdlib_response.render(content)) == json.loads(fast_response.render(content))
+        rounds = max(1, args.rounds // 10) if name != "health" else args.rounds
+        stdlib_us = per_call_us(lambda: stdlib_response.render(content), rounds)
+        fast_us = per_call_us(lambda: fast_response.render(content), rounds)
+        size = len(fast_response.render(content))
+        print(f"render {name} ({size} bytes): JSONResponse {stdlib_us:.2f} us, FastJSONResponse {fast_us:.2f} us "
+              f"({stdlib_us / fast_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
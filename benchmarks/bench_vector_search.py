@@ -0,0 +1,89 @@
+"""
+Benchmark: brute-force vs IVF cosine search over user feature vectors
+Usage: python benchmarks/bench_vector_search.py --users 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+
+from personality import PersonalityAnalyzer, PersonalityType
+from vector_index import FlatIndex, IVFIndex
+
+
+def synthetic_vectors(users: int, seed: int = 0) -> np.ndarray:
+    """Feature vectors for random users with extra traits/tokens so they differ"""
+    rng = random.Random(seed)
+    types = list(PersonalityType)
+    tokens = [f"TOKEN_{i}" for i in range(500)]
+    traits = [f"trait {i}" for i in range(120)]
+
+    vectors = np.empty((users, PersonalityAnalyzer.FEATURE_DIMS), dtype=np.float32)
+    for i in range(users):
+        analysis = PersonalityAnalyzer.analyze_user({
+            "personality_type": rng.choice(types),
+            "tokens": rng.sample(tokens, rng.randint(0, 6)),
+            "traits": rng.sample(traits, rng.randint(0, 3))
+        })
+        vectors[i] = PersonalityAnalyzer.feature_vector(analysis)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (default ~4*sqrt(users))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    vectors = synthetic_vectors(args.users)
+    print(f"features: {args.users} users x {vectors.shape[1]} dims in {time.perf_counter() - start:.1f}s")
+
+    ids = [str(i) for i in range(args.users)]
+    flat = FlatIndex(vectors.shape[1])
+    start = time.perf_counter()
+    flat.add_many(zip(ids, vectors))
+    print(f"flat build: {time.perf_counter() - start:.1f}s")
+
+    query_ids = random.Random(1).sample(ids, args.queries)
+    queries = [vectors[int(i)] for i in query_ids]
+
+    start = time.perf_counter()
+    truth = [flat.search(q, args.k, exclude=qid) for q, qid in zip(queries, query_ids)]
+    flat_ms = (time.perf_counter() - start) / args.queries * 1000
+    start = time.perf_counter()
+    flat.search_many(queries, args.k, exclude=query_ids)
+    batch_ms = (time.perf_counter() - start) / args.queries * 1000
+    print(f"flat: {flat_ms:.2f} ms/query single, {batch_ms:.2f} ms/query batched, recall 1.000")
+
+    nlist = args.nlist or max(16, int(4 * args.users ** 0.5))
+    ivf = IVFIndex(vectors.shape[1], nlist=nlist)
+    start = time.perf_counter()
+    ivf.train(vectors)
+    ivf.add_many(zip(ids, vectors))
+    print(f"ivf build (nlist={nlist}): {time.perf_counter() - start:.1f}s")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        found = [ivf.search(q, args.k, exclude=qid, nprobe=nprobe) for q, qid in zip(queries, query_ids)]
+        ivf_ms = (time.perf_counter() - start) / args.queries * 1000
+
+        # Ties are common (many users share features), so compare scores rather than ids
+        hits = 0
+        for exact, approx in zip(truth, found):
+            threshold = exact[-1][1] - 1e-6 if exact else 1.0
+            hits += sum(1 for _, score in approx if score >= threshold)
+        recall = hits / max(1, sum(len(exact) for exact in truth))
+        print(f"ivf nprobe={nprobe}: {ivf_ms:.2f} ms/query, recall@{args.k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
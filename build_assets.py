@@ -0,0 +1,167 @@
+"""
+Asset Build
+Copies static assets into static/dist under content-hashed names (icon.3fa2c1d9e0.png),
+recompresses PNGs, writes .gz/.br variants and a manifest.json for assets.AssetManifest
+
+Usage:
+    python build_assets.py
+    python build_assets.py --src static --out static/dist
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, without it only .gz variants are written
+    brotli = None
+
+from assets import DIST_DIR, DIST_URL, MANIFEST_NAME, STATIC_DIR
+
+
+# Entry documents are served by the app itself (home() rewrites their references)
+SKIP_FILES = {"app.html"}
+# Read server-side by the renderer (emoji_atlas), never requested by clients
+SKIP_DIRS = {"emoji"}
+TEXT_SUFFIXES = {".css", ".js", ".json", ".svg", ".txt", ".html"}
+COMPRESS_SUFFIXES = TEXT_SUFFIXES | {".ico", ".wasm"}
+
+# Farcaster Mini App limits: icon 1024x1024, splash 200x200, embed image 1200 wide
+PNG_MAX_SIZE: Dict[str, Tuple[int, int]] = {
+    "icon.png": (1024, 1024),
+    "splash.png": (200, 200),
+    "preview.png": (1200, 800)
+}
+DEFAULT_PNG_MAX_SIZE = (1200, 1200)
+
+
+def fingerprint(name: str, data: bytes, length: int = 10) -> str:
+    """icon.png -> icon.<sha256 prefix>.png"""
+    stem, suffix = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:length]}{suffix}"
+
+
+def optimize_png(data: bytes, max_size: Tuple[int, int] = DEFAULT_PNG_MAX_SIZE) -> bytes:
+    """Downscale to max_size and re-encode losslessly (palette when <= 256 colors); keeps the smaller"""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if image.width > max_size[0] or image.height > max_size[1]:
+        image.thumbnail(max_size, Image.LANCZOS)
+        data = b""  # resized, the original bytes no longer apply
+
+    candidates = []
+    if image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        image = image.convert("RGBA")
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", optimize=True)
+    candidates.append(buffer.getvalue())
+
+    colors = image.getcolors(256) if image.mode in ("RGB", "L") else None
+    if colors:
+        # Exact palette: every pixel keeps its color
+        palette_image = Image.new("P", image.size)
+        lookup = {color: index for index, (_, color) in enumerate(colors)}
+        flat = []
+        for _, color in colors:
+            flat.extend(color if isinstance(color, tuple) else (color, color, color))
+        palette_image.putpalette(flat)
+        palette_image.putdata([lookup[pixel] for pixel in image.getdata()])
+        buffer = io.BytesIO()
+        palette_image.save(buffer, "PNG", optimize=True)
+        candidates.append(buffer.getvalue())
+
+    if data:
+        candidates.append(data)
+    return min(candidates, key=len)
+
+
+def compressed_variants(data: bytes) -> Dict[str, bytes]:
+    """gzip/brotli encodings of data, only those that actually save bytes"""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data)}
+
+
+def _source_files(src: str, out: str) -> List[str]:
+    """Asset names relative to src, skipping dot-directories and the output directory"""
+    names = []
+    out = os.path.abspath(out)
+    for root, dirs, files in os.walk(src):
+        dirs[:] = sorted(
+            d for d in dirs
+            if not d.startswith(".") and d not in SKIP_DIRS and os.path.abspath(os.path.join(root, d)) != out
+        )
+        for filename in sorted(files):
+            name = os.path.relpath(os.path.join(root, filename), src).replace(os.sep, "/")
+            if filename.startswith(".") or name in SKIP_FILES:
+                continue
+            names.append(name)
+    return names
+
+
+def build(src: str = STATIC_DIR, out: str = DIST_DIR, min_size: int = 256) -> Dict[str, str]:
+    """Build the fingerprinted asset tree, returns {source name: hashed name}"""
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+
+    names = _source_files(src, out)
+    # Binary assets first so text assets can reference their hashed names
+    names.sort(key=lambda name: os.path.splitext(name)[1] in TEXT_SUFFIXES)
+
+    files: Dict[str, str] = {}
+    for name in names:
+        with open(os.path.join(src, name), "rb") as f:
+            data = f.read()
+        original_size = len(data)
+        suffix = os.path.splitext(name)[1].lower()
+
+        if suffix == ".png":
+            data = optimize_png(data, PNG_MAX_SIZE.get(os.path.basename(name), DEFAULT_PNG_MAX_SIZE))
+        elif suffix in TEXT_SUFFIXES:
+            text = data.decode("utf-8")
+            for source, hashed in files.items():
+                text = text.replace(f"/static/{source}", f"{DIST_URL}/{hashed}")
+            data = text.encode("utf-8")
+
+        hashed = fingerprint(name, data)
+        target = os.path.join(out, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+        files[name] = hashed
+
+        sizes = [f"{original_size} -> {len(data)} bytes"]
+        if suffix in COMPRESS_SUFFIXES and len(data) >= min_size:
+            for variant, body in compressed_variants(data).items():
+                with open(target + variant, "wb") as f:
+                    f.write(body)
+                sizes.append(f"{variant} {len(body)}")
+        print(f"{name} -> {hashed} ({', '.join(sizes)})")
+
+    with open(os.path.join(out, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=2, sort_keys=True)
+    return files
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets")
+    parser.add_argument("--src", default=STATIC_DIR)
+    parser.add_argument("--out", default=DIST_DIR)
+    parser.add_argument("--min-size", type=int, default=256, help="smallest file worth compressing")
+    args = parser.parse_args(argv)
+
+    files = build(args.src, args.out, args.min_size)
+    print(f"Built {len(files)} assets into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
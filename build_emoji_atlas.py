@@ -0,0 +1,125 @@
+"""
+Build the emoji sprite atlas used by the image renderer
+
+Collects every emoji the app can draw (personality emojis, level text, comedy grammar,
+templates) and packs them into static/emoji/atlas.png plus atlas.json. Sprites come from a
+directory of codepoint-named PNGs (Twemoji's assets/72x72, CC-BY 4.0 — keep its attribution)
+or from a color emoji font such as NotoColorEmoji.ttf:
+
+    python build_emoji_atlas.py --source twemoji/assets/72x72
+    python build_emoji_atlas.py --font /usr/share/fonts/truetype/noto/NotoColorEmoji.ttf
+"""
+from typing import Dict, Iterable, List, Optional
+import argparse
+import glob
+import json
+import os
+import sys
+
+from PIL import Image, ImageDraw, ImageFont
+
+from emoji_atlas import ATLAS_DIR, ATLAS_IMAGE, ATLAS_INDEX, ZWJ, emoji_key, emoji_sequences
+
+
+CELL = 72
+COLUMNS = 16
+BITMAP_FONT_SIZE = 109  # CBDT color fonts (Noto) only rasterize at their strike size
+
+
+def twemoji_names(sequence: str) -> List[str]:
+    """Candidate file stems: Twemoji drops FE0F except inside ZWJ sequences"""
+    full = "-".join(f"{ord(char):x}" for char in sequence)
+    stripped = "-".join(f"{ord(char):x}" for char in emoji_key(sequence))
+    return [full, stripped] if ZWJ in sequence and full != stripped else [stripped, full]
+
+
+def collect_sequences(root: str = ".", extra: str = "") -> List[str]:
+    """Emoji used in the app's Python sources (plus `extra`), sorted and de-duplicated by key"""
+    found: Dict[str, str] = {}
+    paths = sorted(glob.glob(os.path.join(root, "*.py")))
+    texts = [extra]
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    for text in texts:
+        for sequence in emoji_sequences(text):
+            found.setdefault(emoji_key(sequence), sequence)
+    return [found[key] for key in sorted(found)]
+
+
+def _fit(img: Image.Image, cell: int) -> Image.Image:
+    """Trim transparent borders and scale into a square cell, centered"""
+    img = img.convert("RGBA")
+    bbox = img.getbbox()
+    if bbox:
+        img = img.crop(bbox)
+    scale = cell / max(img.width, img.height)
+    img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+    out = Image.new("RGBA", (cell, cell), (0, 0, 0, 0))
+    out.paste(img, ((cell - img.width) // 2, (cell - img.height) // 2))
+    return out
+
+
+def load_from_directory(sequence: str, source: str) -> Optional[Image.Image]:
+    for name in twemoji_names(sequence):
+        path = os.path.join(source, f"{name}.png")
+        if os.path.exists(path):
+            with Image.open(path) as img:
+                return img.convert("RGBA")
+    return None
+
+
+def load_from_font(sequence: str, font) -> Optional[Image.Image]:
+    canvas = Image.new("RGBA", (BITMAP_FONT_SIZE * 3, BITMAP_FONT_SIZE * 2), (0, 0, 0, 0))
+    ImageDraw.Draw(canvas).text((0, 0), sequence, font=font, embedded_color=True)
+    if canvas.getbbox() is None:
+        return None
+    return canvas
+
+
+def build(sequences: Iterable[str], out: str, source: Optional[str] = None, font_path: Optional[str] = None, cell: int = CELL):
+    """Pack sprites into the atlas; returns (packed keys, missing sequences)"""
+    font = ImageFont.truetype(font_path, BITMAP_FONT_SIZE) if font_path else None
+    sprites: Dict[str, Image.Image] = {}
+    missing: List[str] = []
+    for sequence in sequences:
+        img = load_from_directory(sequence, source) if source else load_from_font(sequence, font)
+        if img is None:
+            missing.append(sequence)
+        else:
+            sprites[emoji_key(sequence)] = _fit(img, cell)
+
+    rows = max(1, -(-len(sprites) // COLUMNS))
+    sheet = Image.new("RGBA", (COLUMNS * cell, rows * cell), (0, 0, 0, 0))
+    index = {}
+    for slot, (key, sprite) in enumerate(sorted(sprites.items())):
+        sheet.paste(sprite, ((slot % COLUMNS) * cell, (slot // COLUMNS) * cell))
+        index[key] = slot
+
+    os.makedirs(out, exist_ok=True)
+    sheet.save(os.path.join(out, ATLAS_IMAGE), optimize=True)
+    with open(os.path.join(out, ATLAS_INDEX), "w", encoding="utf-8") as f:
+        json.dump({"cell": cell, "columns": COLUMNS, "emoji": index}, f, ensure_ascii=False, indent=0, sort_keys=True)
+    return sorted(sprites), missing
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--source", help="directory of codepoint-named PNGs (e.g. twemoji/assets/72x72)")
+    group.add_argument("--font", help="color emoji font (e.g. NotoColorEmoji.ttf)")
+    parser.add_argument("--out", default=ATLAS_DIR, help="output directory")
+    parser.add_argument("--extra", default="", help="additional emoji to include")
+    parser.add_argument("--cell", type=int, default=CELL, help="sprite cell size in pixels")
+    args = parser.parse_args(argv)
+
+    sequences = collect_sequences(os.path.dirname(os.path.abspath(__file__)), args.extra)
+    packed, missing = build(sequences, args.out, args.source, args.font, args.cell)
+    print(f"Packed {len(packed)} emoji into {os.path.join(args.out, ATLAS_IMAGE)}")
+    if missing:
+        print(f"Missing {len(missing)}: {' '.join(missing)}")
+    return 0 if packed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
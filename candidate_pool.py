@@ -0,0 +1,157 @@
+"""
+Candidate Pool
+Users that can be matched, stored as compact feature records
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from personality import PersonalityAnalyzer, PersonalityType
+from vocabulary import trait_vocab, token_vocab
+
+
+class Candidate:
+    """A matchable user: personality type plus trait/token bitmasks"""
+
+    __slots__ = ("fid", "name", "personality_type", "trait_mask", "token_mask", "confidence")
+
+    def __init__(
+        self,
+        fid: str,
+        name: str,
+        personality_type: PersonalityType,
+        trait_mask: int,
+        token_mask: int,
+        confidence: int = 90
+    ):
+        self.fid = fid
+        self.name = name
+        self.personality_type = personality_type
+        self.trait_mask = trait_mask
+        self.token_mask = token_mask
+        self.confidence = confidence
+
+    def __repr__(self) -> str:
+        return f"Candidate(fid={self.fid!r}, personality_type={self.personality_type.value!r})"
+
+    @classmethod
+    def from_analysis(cls, fid: str, name: str, analysis: Dict) -> "Candidate":
+        """Build from a PersonalityAnalyzer.analyze_user() result"""
+        return cls(
+            fid=str(fid),
+            name=name,
+            personality_type=analysis["personality_type"],
+            trait_mask=analysis["trait_mask"],
+            token_mask=analysis["token_mask"],
+            confidence=analysis.get("metadata", {}).get("confidence", 90)
+        )
+
+    @property
+    def feature_key(self) -> Tuple[PersonalityType, int, int]:
+        """Users with the same feature key score identically against everyone"""
+        return (self.personality_type, self.trait_mask, self.token_mask)
+
+    def to_analysis(self) -> Dict:
+        """Analysis dict understood by MatchmakingEngine"""
+        return {
+            "personality_type": self.personality_type,
+            "profile": PersonalityAnalyzer.get_personality_profile(self.personality_type),
+            "trait_mask": self.trait_mask,
+            "token_mask": self.token_mask,
+            "metadata": {"confidence": self.confidence}
+        }
+
+    def to_dict(self) -> Dict:
+        """Serialize with symbol names so records survive vocabulary changes"""
+        return {
+            "fid": self.fid,
+            "name": self.name,
+            "personality_type": self.personality_type.value,
+            "traits": trait_vocab.symbols(self.trait_mask),
+            "tokens": token_vocab.symbols(self.token_mask),
+            "confidence": self.confidence
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Candidate":
+        return cls(
+            fid=str(data["fid"]),
+            name=data.get("name", f"User #{data['fid']}"),
+            personality_type=PersonalityType(data["personality_type"]),
+            trait_mask=trait_vocab.mask(data.get("traits", [])),
+            token_mask=token_vocab.mask(data.get("tokens", [])),
+            confidence=data.get("confidence", 90)
+        )
+
+
+def _listed(value) -> List[str]:
+    """List fields arrive as lists (NDJSON, Parquet) or ';'-separated strings (CSV)"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(";") if part.strip()]
+    return [str(part) for part in value]
+
+
+def analyze_records(records: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    Raw import records (fid, name, casts or personality_type/traits/tokens) to
+    Candidate.to_dict() records, plus the number rejected
+    Returns symbol names rather than masks, so it can run in worker processes
+    (every process assigns its own vocabulary bits)
+    """
+    analyzed = []
+    rejected = 0
+    for record in records:
+        try:
+            fid = str(record["fid"]).strip()
+            if not fid:
+                raise ValueError("empty fid")
+            casts = record.get("casts")
+            analysis = PersonalityAnalyzer.analyze_user({
+                "personality_type": record.get("personality_type") or None,
+                "traits": _listed(record.get("traits")),
+                "tokens": _listed(record.get("tokens")),
+                "casts": casts.splitlines() if isinstance(casts, str) else casts,
+                "confidence": int(record["confidence"]) if record.get("confidence") else None
+            })
+            analyzed.append(Candidate.from_analysis(fid, record.get("name") or f"User #{fid}", analysis).to_dict())
+        except (KeyError, ValueError, TypeError):
+            rejected += 1
+    return analyzed, rejected
+
+
+class CandidatePool:
+    """All matchable users, keyed by fid"""
+
+    def __init__(self):
+        self._candidates: Dict[str, Candidate] = {}
+
+    def __len__(self) -> int:
+        return len(self._candidates)
+
+    def __contains__(self, fid: str) -> bool:
+        return fid in self._candidates
+
+    def __iter__(self) -> Iterator[Candidate]:
+        return iter(self._candidates.values())
+
+    def items(self):
+        return self._candidates.items()
+
+    def get(self, fid: str) -> Optional[Candidate]:
+        return self._candidates.get(fid)
+
+    def add(self, candidate: Candidate) -> Optional[Candidate]:
+        """Add or replace a candidate, returns the record it replaced"""
+        previous = self._candidates.get(candidate.fid)
+        self._candidates[candidate.fid] = candidate
+        return previous
+
+    def remove(self, fid: str) -> Optional[Candidate]:
+        return self._candidates.pop(fid, None)
+
+    def to_list(self) -> List[Dict]:
+        return [candidate.to_dict() for candidate in self._candidates.values()]
+
+
+# Singleton instance
+candidate_pool = CandidatePool()
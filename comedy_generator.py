@@ -2,21 +2,144 @@
 AI-Powered Comedy Generator for Crypto Dating
 Uses OpenAI GPT to generate funny, personalized match descriptions
 """
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import json
 import random
 from openai import AsyncOpenAI
 from config import settings
+from comedy_grammar import comedy_grammar
+from metrics import metrics
+
+
+# Comedy quality modes, cheapest last (see overload.py)
+COMEDY_AI = "ai"              # fresh GPT line
+COMEDY_CACHED = "cached"      # recent GPT line for the same personality pair and level
+COMEDY_TEMPLATE = "template"  # local grammar (comedy_grammar.py), no API call
+
+LEVEL_RANGES = {"high_match": "80-100%", "medium_match": "60-79%", "low_match": "0-59%"}
+
+# Batched lines outside these lengths are discarded
+MIN_LINE_LENGTH = 10
+MAX_LINE_LENGTH = 240
+
+
+def _clean_lines(value, limit: int) -> Tuple[List[str], int]:
+    """Usable strings from a parsed JSON list (at most `limit`) and how many entries were discarded"""
+    if not isinstance(value, list):
+        return [], 1
+    lines: List[str] = []
+    rejected = 0
+    for item in value:
+        text = " ".join(item.split()) if isinstance(item, str) else ""
+        if MIN_LINE_LENGTH <= len(text) <= MAX_LINE_LENGTH and text not in lines and len(lines) < limit:
+            lines.append(text)
+        else:
+            rejected += 1
+    return lines, rejected
+
+
+def _complete_entries(content: str) -> List:
+    """Entries of the "pairs" array that were fully written before a completion was cut off"""
+    key = content.find('"pairs"')
+    position = content.find("[", key) if key >= 0 else -1
+    if position < 0:
+        return []
+    decoder = json.JSONDecoder()
+    entries = []
+    position += 1
+    while True:
+        while position < len(content) and content[position] in " \t\r\n,":
+            position += 1
+        try:
+            entry, position = decoder.raw_decode(content, position)
+        except ValueError:
+            return entries
+        entries.append(entry)
+
+
+def parse_batch(
+    content: str,
+    count: int,
+    lines_per_pair: int,
+    truncated: bool = False
+) -> Tuple[Dict[int, Tuple[List[str], List[str]]], int]:
+    """
+    Validate a batched completion: {"pairs": [{"id": n, "comedy": [...], "date_ideas": [...]}]}
+    Returns {pair id: (comedy lines, date ideas)} for pairs 1..count and the number of discarded entries;
+    a truncated completion (finish_reason "length") keeps the entries that were written completely
+    """
+    content = content.strip()
+    if content.startswith("```"):  # models sometimes fence JSON even in JSON mode
+        content = content.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(content)
+    except ValueError:
+        if not truncated:
+            raise
+        data = {"pairs": _complete_entries(content)}
+    pairs = data.get("pairs") if isinstance(data, dict) else None
+    if not isinstance(pairs, list):
+        raise ValueError("completion has no pairs list")
+    
+    parsed: Dict[int, Tuple[List[str], List[str]]] = {}
+    rejected = 0
+    for entry in pairs:
+        pair_id = entry.get("id") if isinstance(entry, dict) else None
+        if not isinstance(pair_id, int) or not 1 <= pair_id <= count or pair_id in parsed:
+            rejected += 1
+            continue
+        lines, bad_lines = _clean_lines(entry.get("comedy"), lines_per_pair)
+        ideas, bad_ideas = _clean_lines(entry.get("date_ideas", []), lines_per_pair)
+        rejected += bad_lines + bad_ideas
+        if lines or ideas:
+            parsed[pair_id] = (lines, ideas)
+    return parsed, rejected
 
 
 class ComedyGenerator:
     """Generates funny, personalized match descriptions"""
     
-    def __init__(self):
-        try:
-            self.client = AsyncOpenAI(api_key=settings.openai_api_key) if settings.openai_api_key else None
-        except Exception:
-            self.client = None
+    def __init__(
+        self,
+        client=None,
+        source: str = "ai",
+        batch_pairs: int = 8,
+        batch_interval: float = 2.0,
+        batch_model: str = "gpt-4-turbo"
+    ):
+        if client is None:
+            try:
+                client = AsyncOpenAI(api_key=settings.openai_api_key) if settings.openai_api_key else None
+            except Exception:
+                client = None
+        self.client = client
+        self.source = source
         self.fallback_templates = self._load_fallback_templates()
+        # Recent AI lines per (title, title, level), served instead of new calls under load
+        self._ai_lines: "OrderedDict[Tuple[str, str, str], List[str]]" = OrderedDict()
+        self.max_cached_pairs = 512
+        self.lines_per_pair = 4
+        # Batch mode: AI date ideas per (title, title), times each pair was served since its last fill,
+        # and pairs waiting for the filler with the profiles their prompt needs (misses before refreshes)
+        self._date_ideas: "OrderedDict[Tuple[str, str], List[str]]" = OrderedDict()
+        self._served: Dict[Tuple[str, str, str], int] = {}
+        self._wanted: "OrderedDict[Tuple[str, str, str], Tuple[Dict, Dict]]" = OrderedDict()
+        self._refresh: "OrderedDict[Tuple[str, str, str], Tuple[Dict, Dict]]" = OrderedDict()
+        self.batch_pairs = batch_pairs
+        self._batch_size = batch_pairs  # halved after a completion hits max_tokens, regrown after full ones
+        self.batch_interval = batch_interval
+        self.batch_model = batch_model
+        self.max_backoff = 300.0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = metrics.counter(
+            "comedy_batch_total",
+            "Batched comedy completions and lines by outcome (completions, failed, truncated, accepted, rejected)",
+            ("outcome",)
+        )
+        self.batch_tokens = metrics.counter("comedy_batch_tokens_total", "Tokens used by batched comedy completions")
     
     def _load_fallback_templates(self) -> Dict:
         """Fallback comedy templates when OpenAI is not available"""
@@ -49,21 +172,237 @@ class ComedyGenerator:
         personality1: Dict,
         personality2: Dict,
         compatibility_score: int,
-        match_level: str
+        match_level: str,
+        mode: str = COMEDY_AI
     ) -> str:
         """
         Generate personalized funny match description
         Uses OpenAI if available, falls back to templates
+        COMEDY_CACHED reuses an earlier AI line for the pair, COMEDY_TEMPLATE skips the AI
         """
-        # Try OpenAI first
-        if self.client:
+        key = (personality1.get("title", ""), personality2.get("title", ""), match_level)
+        
+        if self.source == "batch" and mode != COMEDY_TEMPLATE:
+            # Never waits on the API: serve a batched line or queue the pair for the filler
+            lines = self._ai_lines.get(key)
+            if lines:
+                self._ai_lines.move_to_end(key)
+                self._note_served(key, personality1, personality2)
+                return random.choice(lines)
+            self._want(key, personality1, personality2, urgent=True)
+        
+        if mode == COMEDY_CACHED:
+            lines = self._ai_lines.get(key)
+            if lines:
+                self._ai_lines.move_to_end(key)
+                return random.choice(lines)
+        
+        # Try OpenAI first (COMEDY_SOURCE=grammar keeps every line local)
+        if self.client and mode == COMEDY_AI and self.source == "ai":
             try:
-                return await self._generate_with_ai(personality1, personality2, compatibility_score, match_level)
+                text = await self._generate_with_ai(personality1, personality2, compatibility_score, match_level)
+                self._remember(key, text)
+                return text
             except Exception as e:
                 print(f"OpenAI error: {e}, falling back to templates")
         
         # Fallback to templates
-        return self._generate_from_template(match_level)
+        return self._generate_from_template(match_level, personality1, personality2, compatibility_score)
+    
+    def dump_lines(self) -> bytes:
+        """Cached AI lines and date ideas, least recently used pair first (snapshot section)"""
+        return json.dumps({
+            "lines": [[*key, lines] for key, lines in self._ai_lines.items()],
+            "date_ideas": [[*key, ideas] for key, ideas in self._date_ideas.items()]
+        }).encode()
+    
+    def restore_lines(self, data: bytes) -> int:
+        state = json.loads(data)
+        for title1, title2, level, lines in state["lines"]:
+            for text in lines:
+                self._remember((title1, title2, level), text)
+        for title1, title2, ideas in state["date_ideas"]:
+            self._remember_ideas((title1, title2), ideas)
+        return len(self._ai_lines)
+    
+    def _remember(self, key: Tuple[str, str, str], text: str):
+        """Keep the last few AI lines per pair (bounded LRU over pairs)"""
+        lines = self._ai_lines.setdefault(key, [])
+        lines.append(text)
+        del lines[:-self.lines_per_pair]
+        self._ai_lines.move_to_end(key)
+        while len(self._ai_lines) > self.max_cached_pairs:
+            evicted, _ = self._ai_lines.popitem(last=False)
+            self._served.pop(evicted, None)
+    
+    def _remember_ideas(self, key: Tuple[str, str], ideas: List[str]):
+        self._date_ideas[key] = ideas[-self.lines_per_pair:]
+        self._date_ideas.move_to_end(key)
+        while len(self._date_ideas) > self.max_cached_pairs:
+            self._date_ideas.popitem(last=False)
+    
+    @property
+    def pending_pairs(self) -> int:
+        """Pairs queued for the batch filler"""
+        return len(self._wanted) + len(self._refresh)
+    
+    def _want(self, key: Tuple[str, str, str], personality1: Dict, personality2: Dict, urgent: bool = False):
+        """Queue a pair for the batch filler; urgent pairs (nothing cached yet) are filled first"""
+        if self.client is None or key in self._wanted:
+            return
+        if urgent:
+            self._refresh.pop(key, None)
+        elif key in self._refresh:
+            return
+        queue = self._wanted if urgent else self._refresh
+        queue[key] = (personality1, personality2)
+        while len(queue) > self.max_cached_pairs:
+            queue.popitem(last=False)
+        if self._wake is not None:
+            self._wake.set()
+    
+    def _note_served(self, key: Tuple[str, str, str], personality1: Dict, personality2: Dict):
+        """Refill a pair once each of its lines has been served about once"""
+        served = self._served.get(key, 0) + 1
+        self._served[key] = served
+        if served == self.lines_per_pair:
+            self._want(key, personality1, personality2)
+    
+    def _batch_prompt(self, pairs: List[Tuple[Tuple[str, str, str], Tuple[Dict, Dict]]]) -> str:
+        """One prompt for several pairs; each distinct personality is described once"""
+        profiles: Dict[str, Dict] = {}
+        for _, (personality1, personality2) in pairs:
+            profiles.setdefault(personality1["title"], personality1)
+            profiles.setdefault(personality2["title"], personality2)
+        
+        def sentence(text: str) -> str:
+            return text if text.endswith((".", "!", "?")) else f"{text}."
+        
+        personalities = "\n".join(
+            f"- {title}: {sentence(profile.get('description', ''))} Traits: {', '.join(profile.get('traits', []))}. "
+            f"Tokens: {', '.join(profile.get('tokens', []))}."
+            for title, profile in profiles.items()
+        )
+        requests = "\n".join(
+            f"{pair_id}. {title1} + {title2}, {level} ({LEVEL_RANGES.get(level, 'any')} compatible)"
+            for pair_id, ((title1, title2, level), _) in enumerate(pairs, start=1)
+        )
+        n = self.lines_per_pair
+        return f"""You are a hilarious crypto dating expert writing match descriptions for two crypto users.
+
+Personalities:
+{personalities}
+
+Matches:
+{requests}
+
+For EACH match write {n} different funny 1-2 sentence match descriptions and {n} funny first date ideas.
+Requirements:
+- Use crypto slang (HODL, wen moon, diamond hands, paper hands, NGMI, WAGMI, degen, etc.)
+- Be funny and slightly sarcastic, reference their specific traits and tokens
+- Fit the match level; don't mention a percentage
+- Each line under 200 characters, max 3 emojis
+
+Reply with JSON only: {{"pairs": [{{"id": 1, "comedy": ["...", ...], "date_ideas": ["...", ...]}}, ...]}}"""
+    
+    async def fill_batch(self) -> int:
+        """
+        Generate lines for up to batch_pairs queued pairs in one completion
+        Returns the number of comedy lines cached; malformed entries are discarded.
+        A reply cut off at max_tokens keeps its complete pairs; the rest go back to the
+        front of the queue and later completions ask for half as many pairs
+        """
+        pairs = []
+        for queue in (self._wanted, self._refresh):
+            while queue and len(pairs) < self._batch_size:
+                pairs.append(queue.popitem(last=False))
+        if not pairs:
+            return 0
+        
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.batch_model,
+                messages=[
+                    {"role": "system", "content": "You are a witty crypto dating expert who makes people laugh. You reply in JSON."},
+                    {"role": "user", "content": self._batch_prompt(pairs)}
+                ],
+                max_tokens=min(4096, 120 * self.lines_per_pair * 2 * len(pairs)),
+                temperature=0.9,
+                response_format={"type": "json_object"}
+            )
+            choice = response.choices[0]
+            truncated = getattr(choice, "finish_reason", None) == "length"
+            parsed, rejected = parse_batch(choice.message.content, len(pairs), self.lines_per_pair, truncated)
+        except Exception:
+            for key, profiles in pairs:  # retried with the next batch
+                self._wanted.setdefault(key, profiles)
+            raise
+        
+        self.batches.inc("completions")
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.batch_tokens.inc(amount=usage.total_tokens)
+        
+        accepted = 0
+        for pair_id, ((title1, title2, level), _) in enumerate(pairs, start=1):
+            lines, ideas = parsed.get(pair_id, ([], []))
+            for text in lines:
+                self._remember((title1, title2, level), text)
+            if (title1, title2, level) in self._ai_lines:
+                self._served[(title1, title2, level)] = 0
+            if ideas:
+                self._remember_ideas((title1, title2), ideas)
+            accepted += len(lines) + len(ideas)
+        self.batches.inc("accepted", amount=accepted)
+        self.batches.inc("rejected", amount=rejected)
+        
+        if truncated:
+            self.batches.inc("truncated")
+            self._batch_size = max(1, len(pairs) // 2)
+            # A lone pair that still doesn't fit isn't retried until it's requested again
+            if len(pairs) > 1:
+                for pair_id, (key, profiles) in reversed(list(enumerate(pairs, start=1))):
+                    if pair_id not in parsed:
+                        self._wanted[key] = profiles
+                        self._wanted.move_to_end(key, last=False)
+        else:
+            self._batch_size = min(self.batch_pairs, self._batch_size * 2)
+        return sum(len(parsed[pair_id][0]) for pair_id in parsed)
+    
+    async def _run(self):
+        backoff = self.batch_interval
+        while True:
+            await self._wake.wait()
+            # Let demand accumulate so one completion covers several pairs
+            await asyncio.sleep(self.batch_interval)
+            self._wake.clear()
+            try:
+                await self.fill_batch()
+                backoff = self.batch_interval
+            except Exception as e:
+                self.batches.inc("failed")
+                print(f"Batched comedy failed: {e}, retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            if self.pending_pairs:
+                self._wake.set()
+    
+    def start(self):
+        """Start the batch filler (call from a running loop); only runs with COMEDY_SOURCE=batch"""
+        if self.source == "batch" and self.client is not None and (self._task is None or self._task.done()):
+            self._wake = asyncio.Event()
+            if self.pending_pairs:
+                self._wake.set()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
     
     async def _generate_with_ai(
         self,
@@ -109,13 +448,27 @@ Generate ONE funny match description:"""
         
         return response.choices[0].message.content.strip()
     
-    def _generate_from_template(self, match_level: str) -> str:
-        """Generate from fallback templates"""
+    def _generate_from_template(
+        self,
+        match_level: str,
+        personality1: Optional[Dict] = None,
+        personality2: Optional[Dict] = None,
+        score: Optional[int] = None
+    ) -> str:
+        """Personality-specific line from the comedy grammar, static templates without profiles"""
+        if personality1 and personality2 and score is not None:
+            try:
+                return comedy_grammar.generate(personality1, personality2, score, match_level)
+            except Exception as e:
+                print(f"Comedy grammar error: {e}, using static templates")
         templates = self.fallback_templates.get(match_level, self.fallback_templates["medium_match"])
         return random.choice(templates)
     
     async def generate_date_idea(self, personality1: Dict, personality2: Dict) -> str:
-        """Generate funny date idea"""
+        """Generate funny date idea (batched AI ideas for the pair when there are any)"""
+        ideas = self._date_ideas.get((personality1.get("title", ""), personality2.get("title", "")))
+        if ideas and self.source == "batch":
+            return random.choice(ideas)
         
         date_ideas = [
             "💡 First Date Idea: Watch crypto charts together during a market dump and see who panics first! 📉",
@@ -157,4 +510,12 @@ Generate ONE funny match description:"""
 
 
 # Singleton instance
-comedy_generator = ComedyGenerator()
+comedy_generator = ComedyGenerator(
+    source=settings.comedy_source,
+    batch_pairs=settings.comedy_batch_pairs,
+    batch_interval=settings.comedy_batch_interval,
+    batch_model=settings.comedy_batch_model
+)
+metrics.register_callback(
+    "comedy_batch_pending", "Personality pairs waiting for the batched comedy filler", lambda: comedy_generator.pending_pairs
+)
@@ -0,0 +1,257 @@
+"""
+Comedy Grammar
+Local, personality-aware match lines: a template grammar compiled once, expanded with slots
+filled from the two personality profiles (names, traits, tokens, taglines, shared tokens)
+"""
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
+import random
+import re
+
+
+# <rule> expands a rule, {slot} inserts a profile value. Alternatives that use a slot the pair
+# doesn't have (no common token) are left out for that pair. Lines stay under ~200 characters
+# with at most three emojis, like the AI prompt asks for. "<level>_same" rules serve pairs of
+# one personality type, where name2/tagline2 would just repeat name1/tagline1.
+GRAMMAR: Dict[str, List[str]] = {
+    "high_match": [
+        "<hype> {name1} + {name2} = {score}%. <bond> <high_verdict> <high_close>",
+        "<hype> \"{trait1}\" meets \"{trait2}\" and it just works. <bond> <high_close>",
+        "<hype> {score}%?! <bond> <high_verdict>",
+        "<hype> {name1} says \"{tagline1}\" and {name2} just nods. <high_verdict> <high_close>"
+    ],
+    "medium_match": [
+        "<mid_open> {name1} and {name2} at {score}%. <mid_bond> <mid_close>",
+        "<mid_open> Bio check: \"{trait1}\" meets \"{trait2}\". <mid_verdict> <mid_close>",
+        "<mid_open> {score}% compatible: <mid_bond> <mid_verdict>",
+        "<mid_open> {name1} brings the {token1}, {name2} brings the {token2}. <mid_verdict>"
+    ],
+    "low_match": [
+        "<chaos_open> {name1} vs {name2}: {score}%. <low_clash> <low_close>",
+        "<chaos_open> One bio says \"{trait1}\", the other says \"{trait2}\". <low_verdict> <low_close>",
+        "<chaos_open> {name1}: \"{tagline1}\" {name2}: \"{tagline2}\" <low_verdict>",
+        "<chaos_open> {score}%. <low_clash> <low_verdict>"
+    ],
+    "high_match_same": [
+        "<hype> Mirror match at {score}%. <same_bond> <high_verdict> <high_close>",
+        "<hype> \"{trait1}\" meets \"{trait2}\", same species. <same_bond> <high_close>",
+        "<hype> {score}%?! <same_bond> <high_verdict>",
+        "<hype> Two of you saying \"{tagline1}\" in stereo. <high_verdict> <high_close>"
+    ],
+    "medium_match_same": [
+        "<mid_open> Two of a kind at {score}%. <mid_bond> <mid_close>",
+        "<mid_open> Same type, different bags: {token1} vs {token2}. <mid_verdict> <mid_close>",
+        "<mid_open> {score}% compatible: <same_bond> <mid_verdict>",
+        "<mid_open> One {name1} brings the {token1}, the other brings the {token2}. <mid_verdict>"
+    ],
+    "low_match_same": [
+        "<chaos_open> Same type, only {score}%. <same_clash> <low_close>",
+        "<chaos_open> You both live by \"{tagline1}\" and still can't agree. <low_verdict> <low_close>",
+        "<chaos_open> One {name1} swears by {token1}, the other by {token2}. <low_verdict>",
+        "<chaos_open> {score}%. <same_clash> <low_verdict>"
+    ],
+
+    "hype": ["🔥 THIS IS IT!", "🚀 MOON MISSION CONFIRMED!", "💎 DIAMOND HANDS DETECTED!", "⚡ ELECTRIC CONNECTION!", "✨ COSMIC MATCH!"],
+    "bond": [
+        "You both HODL {common}, which is basically a prenup.",
+        "Shared {common} bags, shared dreams.",
+        "Two wallets, one {common} position.",
+        "Same {common} bags, same 3am chart checks.",
+        "Your portfolios are so aligned even Satoshi would approve.",
+        "Buying the dip together is a love language."
+    ],
+    "high_verdict": ["WAGMI, together.", "Paper hands could never.", "This is the bull run of relationships.", "Certified soulmates, no rug in sight."],
+    "high_close": ["💕", "🌙", "💎", "🎯"],
+
+    "mid_open": ["👍 SOLID VIBES!", "💫 INTERESTING POTENTIAL!", "🤝 GOOD CHEMISTRY!", "📊 COMPATIBLE ENERGY!"],
+    "mid_bond": [
+        "At least you both hold {common}.",
+        "The {common} overlap is doing heavy lifting.",
+        "{token1} meets {token2}, diversification is romantic.",
+        "Different chains, same destination."
+    ],
+    "mid_verdict": ["Stop-losses exist for a reason.", "With a little compromise, you'll scale together.", "Layer-2 love: slower, cheaper, works.", "DYOR on each other first."],
+    "mid_close": ["📈", "💚", "🔍", "🎲"],
+
+    "chaos_open": ["⚡ CHAOS ENERGY!", "🎭 EXTREME OPPOSITES!", "🌗 YIN AND YANG!", "🎪 CRYPTO CIRCUS!"],
+    "low_clash": [
+        "{token1} maxi meets {token2} enjoyer.",
+        "One checks whitepapers, one checks {token2} memes.",
+        "The only thing you share is {common}, and even that's a coin flip.",
+        "Your risk tolerances need a mediator."
+    ],
+    "low_verdict": ["It's not a red flag, it's a LEARNING OPPORTUNITY.", "Could be educational. Could be rekt.", "NGMI? Maybe. Entertaining? Definitely.", "Opposites attract, liquidity doesn't."],
+    "low_close": ["😅", "🤡", "🔄", "📚"],
+
+    "same_bond": [
+        "Same type, same {common} bags.",
+        "Finally someone who gets the {common} thesis.",
+        "It's like dating your own wallet.",
+        "Double the conviction, zero explaining."
+    ],
+    "same_clash": [
+        "You'd front-run each other's {common} entries.",
+        "Two captains, one ship.",
+        "Too much of the same energy for one wallet.",
+        "You'd fight over who's the original."
+    ]
+}
+
+_PART = re.compile(r"<(\w+)>|\{(\w+)\}")
+# First letter of the line or of a sentence (after . ! ?), past any emoji or quotes
+_SENTENCE_START = re.compile(r"(^|[.!?]\s+)(\W*?)([a-z])")
+
+Part = Union[str, Tuple[int, str]]  # literal text, (RULE, name) or (SLOT, name)
+RULE, SLOT = 0, 1
+
+
+class CompiledGrammar:
+    """
+    Rules parsed once into part tuples; each alternative records the optional slots it
+    needs (directly or through every alternative of a rule it uses), so expansion only
+    picks alternatives the pair can fill
+    """
+
+    def __init__(self, rules: Dict[str, List[str]], optional_slots: Sequence[str] = ("common",)):
+        self.optional_slots = frozenset(optional_slots)
+        self.rules: Dict[str, Tuple[Tuple[Part, ...], ...]] = {
+            name: tuple(self._parse(text) for text in alternatives)
+            for name, alternatives in rules.items()
+        }
+        for name, alternatives in self.rules.items():
+            for parts in alternatives:
+                for part in parts:
+                    if isinstance(part, tuple) and part[0] == RULE and part[1] not in self.rules:
+                        raise ValueError(f"Rule {name!r} references unknown rule {part[1]!r}")
+        self.needs = self._resolve_needs()
+        self._eligible: Dict[Tuple[str, FrozenSet[str]], Tuple[Tuple[Part, ...], ...]] = {}
+
+    @staticmethod
+    def _parse(text: str) -> Tuple[Part, ...]:
+        parts: List[Part] = []
+        position = 0
+        for match in _PART.finditer(text):
+            if match.start() > position:
+                parts.append(text[position:match.start()])
+            parts.append((RULE, match.group(1)) if match.group(1) else (SLOT, match.group(2)))
+            position = match.end()
+        if position < len(text):
+            parts.append(text[position:])
+        return tuple(parts)
+
+    def _resolve_needs(self) -> Dict[str, List[FrozenSet[str]]]:
+        """Optional slots each alternative needs; a rule needs a slot if all its alternatives do"""
+        needs = {name: [frozenset()] * len(alternatives) for name, alternatives in self.rules.items()}
+        changed = True
+        while changed:
+            changed = False
+            rule_needs = {
+                name: frozenset.intersection(*alt_needs) if alt_needs else frozenset()
+                for name, alt_needs in needs.items()
+            }
+            for name, alternatives in self.rules.items():
+                for index, parts in enumerate(alternatives):
+                    required = set()
+                    for part in parts:
+                        if isinstance(part, tuple):
+                            if part[0] == SLOT and part[1] in self.optional_slots:
+                                required.add(part[1])
+                            elif part[0] == RULE:
+                                required |= rule_needs[part[1]]
+                    if frozenset(required) != needs[name][index]:
+                        needs[name][index] = frozenset(required)
+                        changed = True
+        return needs
+
+    def _choices(self, rule: str, missing: FrozenSet[str]) -> Tuple[Tuple[Part, ...], ...]:
+        key = (rule, missing)
+        choices = self._eligible.get(key)
+        if choices is None:
+            choices = tuple(
+                parts for parts, needed in zip(self.rules[rule], self.needs[rule])
+                if not needed & missing
+            ) or self.rules[rule]
+            self._eligible[key] = choices
+        return choices
+
+    def expand(self, rule: str, slots: Dict[str, str], rng: random.Random) -> str:
+        missing = frozenset(slot for slot in self.optional_slots if not slots.get(slot))
+        out: List[str] = []
+        self._expand(rule, slots, missing, rng, out)
+        return "".join(out)
+
+    def _expand(self, rule: str, slots: Dict[str, str], missing: FrozenSet[str], rng: random.Random, out: List[str]):
+        for part in rng.choice(self._choices(rule, missing)):
+            if isinstance(part, str):
+                out.append(part)
+            elif part[0] == RULE:
+                self._expand(part[1], slots, missing, rng, out)
+            else:
+                out.append(slots.get(part[1], ""))
+
+
+def _capitalize(line: str) -> str:
+    """Upper-case sentence starts; slot values and rules after "." may begin lowercase"""
+    return _SENTENCE_START.sub(lambda m: m.group(1) + m.group(2) + m.group(3).upper(), line)
+
+
+def _name(title: str) -> str:
+    """Profile title without its trailing emoji ("Bitcoin Maximalist 🟠" -> "Bitcoin Maximalist")"""
+    head, _, tail = title.rpartition(" ")
+    return head if head and not tail.isascii() else title
+
+
+class ComedyGrammar:
+    """Personality-specific match lines in microseconds, deterministic for a given seed"""
+
+    def __init__(self, rules: Optional[Dict[str, List[str]]] = None, max_length: int = 200):
+        self.grammar = CompiledGrammar(rules or GRAMMAR)
+        self.max_length = max_length
+        self._rng = random.Random()
+
+    def slots(self, personality1: Dict, personality2: Dict, score: int, rng: random.Random) -> Dict[str, str]:
+        tokens1 = personality1.get("tokens") or ["ETH"]
+        tokens2 = personality2.get("tokens") or ["ETH"]
+        common = sorted(set(tokens1) & set(tokens2))
+        token1 = rng.choice(tokens1)
+        others = [token for token in tokens2 if token != token1]
+        trait1 = rng.choice(personality1.get("traits") or ["Degen"])
+        traits2 = personality2.get("traits") or ["Degen"]
+        return {
+            "name1": _name(personality1.get("title", "Anon")),
+            "name2": _name(personality2.get("title", "Anon")),
+            "trait1": trait1,
+            "trait2": rng.choice([trait for trait in traits2 if trait != trait1] or traits2),
+            "token1": token1,
+            "token2": rng.choice(others or tokens2),  # "BTC meets BTC" reads like a bug
+            "tagline1": personality1.get("tagline", "WAGMI"),
+            "tagline2": personality2.get("tagline", "WAGMI"),
+            "common": rng.choice(common) if common else "",
+            "score": str(score)
+        }
+
+    def generate(
+        self,
+        personality1: Dict,
+        personality2: Dict,
+        score: int,
+        match_level: str,
+        seed: Optional[int] = None
+    ) -> str:
+        """One line for the pair (at most max_length characters); the same seed and inputs give the same line"""
+        rng = random.Random(seed) if seed is not None else self._rng
+        rule = match_level if match_level in self.grammar.rules else "medium_match"
+        slots = self.slots(personality1, personality2, score, rng)
+        if slots["name1"] == slots["name2"] and f"{rule}_same" in self.grammar.rules:
+            rule = f"{rule}_same"
+        line = ""
+        for _ in range(4):  # long taglines can overflow, redraw a few times
+            line = _capitalize(" ".join(self.grammar.expand(rule, slots, rng).split()))
+            if len(line) <= self.max_length:
+                return line
+        # Still too long: cut at a word boundary rather than overflow the image
+        head = line[:self.max_length - 1]
+        return (head.rsplit(" ", 1)[0] if " " in head else head) + "…"
+
+
+# Singleton instance
+comedy_grammar = ComedyGrammar()
@@ -19,11 +19,76 @@ class Settings(BaseSettings):
     
     # Farcaster
     farcaster_hub_url: str = os.getenv("FARCASTER_HUB_URL", "https://hub.farcaster.xyz")
+    frame_verification: str = os.getenv("FRAME_VERIFICATION", "off")  # off | log | enforce
+    frame_max_age: int = int(os.getenv("FRAME_MAX_AGE", "600"))  # seconds
+    signer_cache_ttl: int = int(os.getenv("SIGNER_CACHE_TTL", "300"))  # seconds
+    max_frame_body: int = int(os.getenv("MAX_FRAME_BODY", "16384"))  # bytes, frame POSTs are ~1KB
     
     # Rate Limiting
-    rate_limit_per_user: int = int(os.getenv("RATE_LIMIT_PER_USER", "100"))
+    rate_limit_per_user: int = int(os.getenv("RATE_LIMIT_PER_USER", "100"))  # requests per window
+    rate_limit_window: int = int(os.getenv("RATE_LIMIT_WINDOW", "3600"))  # seconds
+    rate_limit_burst: int = int(os.getenv("RATE_LIMIT_BURST", "10"))
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | redis
+    trusted_proxy_hops: int = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))  # proxies appending X-Forwarded-For, 0 = none
     cache_ttl: int = int(os.getenv("CACHE_TTL", "86400"))
     
+    # Match comedy: "ai" (OpenAI when a key is set, grammar otherwise), "grammar" (always local, microseconds)
+    # or "batch" (AI lines from a cache filled in the background, several pairs per completion)
+    comedy_source: str = os.getenv("COMEDY_SOURCE", "ai")
+    comedy_batch_pairs: int = int(os.getenv("COMEDY_BATCH_PAIRS", "8"))  # personality pairs per completion
+    comedy_batch_interval: float = float(os.getenv("COMEDY_BATCH_INTERVAL", "2.0"))  # seconds to gather pairs
+    comedy_batch_model: str = os.getenv("COMEDY_BATCH_MODEL", "gpt-4-turbo")  # needs JSON mode
+    
+    # Progressive frames: return frame HTML at once and render the image in the background
+    progressive_frames: bool = os.getenv("PROGRESSIVE_FRAMES", "false").lower() == "true"
+    render_deadline: float = float(os.getenv("RENDER_DEADLINE", "3.0"))
+    
+    # Duplicate /match posts within this many seconds of a finished match reuse its result
+    match_reuse_window: float = float(os.getenv("MATCH_REUSE_WINDOW", "2.0"))
+    
+    # Speculative prefetch of each user's next match (full tier only, bounded concurrency)
+    # Off by default: each prefetch pays for an AI comedy call that may never be shown
+    prefetch: bool = os.getenv("PREFETCH", "false").lower() == "true"
+    prefetch_budget: int = int(os.getenv("PREFETCH_BUDGET", "8"))  # concurrent prefetches across users
+    prefetch_ttl: float = float(os.getenv("PREFETCH_TTL", "300"))  # seconds a prefetched match stays servable
+    prefetch_render: bool = os.getenv("PREFETCH_RENDER", "true").lower() == "true"  # also render its image
+    
+    # Overload control: step comedy/image quality down when any limit is reached
+    overload_control: bool = os.getenv("OVERLOAD_CONTROL", "true").lower() == "true"
+    overload_lag_high: float = float(os.getenv("OVERLOAD_LAG_HIGH", "0.1"))  # seconds of event-loop lag
+    overload_inflight_high: int = int(os.getenv("OVERLOAD_INFLIGHT_HIGH", "64"))  # concurrent /match requests
+    overload_backlog_high: int = int(os.getenv("OVERLOAD_BACKLOG_HIGH", "16"))  # pending renders
+    overload_recover_seconds: float = float(os.getenv("OVERLOAD_RECOVER_SECONDS", "5.0"))
+    
+    # Match analytics: off | sqlite | postgres (DATABASE_URL), written in batches off the request path
+    analytics_sink: str = os.getenv("ANALYTICS_SINK", "off")
+    database_url: Optional[str] = os.getenv("DATABASE_URL")
+    analytics_sqlite_path: str = os.getenv("ANALYTICS_SQLITE_PATH", "analytics.db")
+    analytics_buffer: int = int(os.getenv("ANALYTICS_BUFFER", "10000"))  # events held before dropping
+    analytics_batch_size: int = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+    analytics_flush_interval: float = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "1.0"))
+    
+    # Precomputed match lists
+    match_top_k: int = int(os.getenv("MATCH_TOP_K", "20"))
+    match_index_path: Optional[str] = os.getenv("MATCH_INDEX_PATH")
+    max_unverified_users: int = int(os.getenv("MAX_UNVERIFIED_USERS", "10000"))  # unsigned fids kept in the lists
+    match_retrieval_buckets: int = int(os.getenv("MATCH_RETRIEVAL_BUCKETS", "256"))  # vector shortlist above this, -1 = never
+    
+    # Per-user match history (recent matches kept per fid; earlier ones are still skipped via a Bloom filter)
+    match_history_size: int = int(os.getenv("MATCH_HISTORY_SIZE", "50"))
+    match_history_path: Optional[str] = os.getenv("MATCH_HISTORY_PATH")
+    
+    # Warm-cache snapshot (match results, comedy lines, images, match lists) for fast restarts
+    snapshot_path: Optional[str] = os.getenv("SNAPSHOT_PATH")
+    snapshot_interval: float = float(os.getenv("SNAPSHOT_INTERVAL", "300"))  # seconds
+    
+    # Signs /share links so only clicks on links we served are counted (random per process when unset)
+    share_secret: Optional[str] = os.getenv("SHARE_SECRET")
+    
+    # Debug endpoints (disabled unless a token is set)
+    debug_token: Optional[str] = os.getenv("DEBUG_TOKEN")
+    batch_json_max_body: int = int(os.getenv("BATCH_JSON_MAX_BODY", "1048576"))  # bytes, larger batches use NDJSON/CSV
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
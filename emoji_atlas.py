@@ -0,0 +1,208 @@
+"""
+Emoji Atlas
+Color emoji for rendered images: one sprite sheet built by build_emoji_atlas.py, loaded once,
+and a text layout that splits strings into text and emoji runs and pastes cached sprites
+"""
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+
+from PIL import Image, ImageDraw
+
+
+ATLAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "emoji")
+ATLAS_IMAGE = "atlas.png"
+ATLAS_INDEX = "atlas.json"
+
+VS16 = "\ufe0f"  # emoji presentation selector
+ZWJ = "\u200d"   # joins emoji into one sequence (👨‍💻)
+
+
+def is_emoji_char(char: str) -> bool:
+    """Code points that start or continue an emoji sequence"""
+    cp = ord(char)
+    return (
+        0x1F000 <= cp <= 0x1FAFF      # pictographs, emoticons, transport, flags, ...
+        or 0x2300 <= cp <= 0x23FF     # misc technical (⌛ ⏳ ⏰)
+        or 0x2600 <= cp <= 0x27BF     # misc symbols, dingbats (⚡ ✨ ☕)
+        or 0x2B00 <= cp <= 0x2BFF     # arrows, ⭐
+        or 0x2190 <= cp <= 0x21FF
+        or 0x1F3FB <= cp <= 0x1F3FF   # skin tones
+        or char in (VS16, ZWJ, "\u20e3", "\u00a9", "\u00ae", "\u203c", "\u2049", "\u2122")
+    )
+
+
+def emoji_key(sequence: str) -> str:
+    """Atlas key: the sequence without presentation selectors (Twemoji naming drops them too)"""
+    return sequence.replace(VS16, "")
+
+
+def emoji_sequences(text: str) -> List[str]:
+    """Emoji sequences in text (greedy: a base plus selectors, skin tones and ZWJ joins)"""
+    sequences = []
+    i = 0
+    while i < len(text):
+        if not is_emoji_char(text[i]) or text[i] in (VS16, ZWJ, "\u20e3"):
+            i += 1
+            continue
+        j = i + 1
+        while j < len(text) and (text[j] in (VS16, "\u20e3") or 0x1F3FB <= ord(text[j]) <= 0x1F3FF or (
+            text[j] == ZWJ and j + 1 < len(text) and is_emoji_char(text[j + 1])
+        ) or (text[j - 1] == ZWJ and is_emoji_char(text[j])) or (
+            # regional indicator pairs are flags
+            0x1F1E6 <= ord(text[j]) <= 0x1F1FF and 0x1F1E6 <= ord(text[j - 1]) <= 0x1F1FF and j - i == 1
+        )):
+            j += 1
+        sequences.append(text[i:j])
+        i = j
+    return sequences
+
+
+class EmojiAtlas:
+    """
+    Sprite sheet of emoji cells plus an index of sequence -> cell
+    Loaded lazily once per process; per-size sprites are cached (bounded)
+    """
+
+    def __init__(self, directory: str = ATLAS_DIR, max_sprites: int = 512):
+        self.directory = directory
+        self.max_sprites = max_sprites
+        self._sheet: Optional[Image.Image] = None
+        self._cells: Dict[str, Tuple[int, int, int, int]] = {}
+        self._longest = 0
+        self._loaded = False
+        self._lock = threading.Lock()  # render threads may load it concurrently
+        self._sprites: Dict[Tuple[str, int], Image.Image] = {}
+
+    def load(self) -> bool:
+        """Read the sheet and index (once); False when no atlas has been built"""
+        if self._loaded:
+            return self._sheet is not None
+        with self._lock:
+            if not self._loaded:
+                try:
+                    with open(os.path.join(self.directory, ATLAS_INDEX), "r", encoding="utf-8") as f:
+                        index = json.load(f)
+                    sheet = Image.open(os.path.join(self.directory, ATLAS_IMAGE))
+                    sheet.load()
+                    cell, columns = index["cell"], index["columns"]
+                    self._cells = {
+                        key: ((slot % columns) * cell, (slot // columns) * cell, cell, cell)
+                        for key, slot in index["emoji"].items()
+                    }
+                    self._longest = max((len(key) for key in self._cells), default=0)
+                    self._sheet = sheet.convert("RGBA")
+                except (OSError, ValueError, KeyError) as e:
+                    if not isinstance(e, FileNotFoundError):
+                        print(f"Ignoring emoji atlas in {self.directory}: {e}")
+                    self._sheet = None
+                    self._cells = {}
+                self._loaded = True
+        return self._sheet is not None
+
+    @property
+    def version(self) -> str:
+        """Short digest of the atlas index ("none" without one); renders depend on it"""
+        try:
+            with open(os.path.join(self.directory, ATLAS_INDEX), "rb") as f:
+                return hashlib.blake2b(f.read(), digest_size=4).hexdigest()
+        except OSError:
+            return "none"
+
+    def __contains__(self, sequence: str) -> bool:
+        self.load()
+        return emoji_key(sequence) in self._cells
+
+    def __len__(self) -> int:
+        self.load()
+        return len(self._cells)
+
+    def split_runs(self, text: str) -> List[Tuple[bool, str]]:
+        """
+        [(is_emoji, text)] runs; emoji runs hold one atlas key each
+        With an atlas, emoji it doesn't have are left out (astral ones would draw as tofu) and
+        selector/joiner characters are dropped; BMP symbols stay text (DejaVu has many).
+        Without one the whole text is a single text run, drawn by the font as before
+        """
+        if not self.load():
+            return [(False, text)] if text else []
+        runs: List[Tuple[bool, str]] = []
+        buffer: List[str] = []
+        i = 0
+        while i < len(text):
+            char = text[i]
+            if not is_emoji_char(char):
+                buffer.append(char)
+                i += 1
+                continue
+
+            matched = None
+            for length in range(min(len(text) - i, self._longest * 2), 0, -1):
+                key = emoji_key(text[i:i + length])
+                if key and key in self._cells:
+                    matched = key
+                    i += length
+                    break
+            if matched is not None:
+                while i < len(text) and text[i] == VS16:
+                    i += 1
+                if buffer:
+                    runs.append((False, "".join(buffer)))
+                    buffer = []
+                runs.append((True, matched))
+                continue
+
+            if char not in (VS16, ZWJ) and ord(char) < 0x10000:
+                buffer.append(char)
+            i += 1
+        if buffer:
+            runs.append((False, "".join(buffer)))
+        return runs
+
+    @staticmethod
+    def emoji_size(font) -> Tuple[int, int]:
+        """(sprite size, advance) for emoji set in `font`"""
+        size = int(getattr(font, "size", 11))
+        return size, size + max(1, size // 8)
+
+    def sprite(self, key: str, size: int) -> Image.Image:
+        sprite = self._sprites.get((key, size))
+        if sprite is None:
+            x, y, w, h = self._cells[key]
+            sprite = self._sheet.crop((x, y, x + w, y + h)).resize((size, size), Image.LANCZOS)
+            if len(self._sprites) >= self.max_sprites:
+                self._sprites.clear()
+            self._sprites[(key, size)] = sprite
+        return sprite
+
+    def text_width(self, text: str, font) -> int:
+        """Advance width of text with emoji runs at their sprite advance"""
+        _, advance = self.emoji_size(font)
+        width = 0.0
+        for is_emoji, run in self.split_runs(text):
+            width += advance if is_emoji else font.getlength(run)
+        return int(round(width))
+
+    def draw_text(self, img: Image.Image, draw: ImageDraw.ImageDraw, xy: Tuple[int, int], text: str, font, fill):
+        """draw.text((x, y), ...) with color emoji pasted in place (same top-left anchoring)"""
+        x, y = xy
+        size, advance = self.emoji_size(font)
+        for is_emoji, run in self.split_runs(text):
+            if not is_emoji:
+                draw.text((x, y), run, fill=fill, font=font)
+                x += font.getlength(run)
+                continue
+            try:
+                ascent, descent = font.getmetrics()
+            except AttributeError:
+                ascent, descent = size, 0
+            top = y + (ascent + descent - size) // 2
+            sprite = self.sprite(run, size)
+            img.paste(sprite, (int(round(x + (advance - size) / 2)), int(top)), sprite)
+            x += advance
+
+
+# Singleton instance
+emoji_atlas = EmojiAtlas()
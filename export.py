@@ -0,0 +1,257 @@
+"""
+Compatibility Export
+Streams pairwise compatibility (personality-type and user level) as CSV/NDJSON chunks,
+plus bounded-heap "top pairs" leaderboards
+
+Usage:
+    python export.py matrix --level type --format csv
+    python export.py matrix --level user --format ndjson -o pairs.ndjson
+    python export.py leaderboard --level user -n 50
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from itertools import islice, product
+import argparse
+import csv
+import heapq
+import io
+import json
+import sys
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, only needed for --format parquet
+    pa = None
+    pq = None
+
+from candidate_pool import Candidate, CandidatePool
+from matchmaking import matchmaking_engine
+from personality import PersonalityType
+
+
+FACTOR_COLUMNS = ["personality_base", "token_overlap", "risk_tolerance", "trait_similarity"]
+TYPE_COLUMNS = ["personality1", "personality2"] + FACTOR_COLUMNS + ["score", "common_tokens"]
+USER_COLUMNS = ["fid1", "fid2", "personality1", "personality2"] + FACTOR_COLUMNS + ["score", "common_tokens"]
+
+FORMATS = ("csv", "ndjson")
+
+
+def _pair_values(analysis1: Dict, analysis2: Dict) -> Dict:
+    """Factor scores, rank score and common tokens for one pair (flat, Parquet-friendly)"""
+    scores, common_tokens, score = matchmaking_engine.pair_factors(analysis1, analysis2)
+    values = {key: round(float(scores[key]), 2) for key in FACTOR_COLUMNS}
+    values["score"] = round(score, 2)
+    values["common_tokens"] = " ".join(common_tokens)
+    return values
+
+
+def type_pair_rows() -> Iterator[Dict]:
+    """
+    One row per ordered personality-type pair (self pairs included)
+    Ordered because the base matrix is one-sided for some pairs (missing entries default to 50)
+    """
+    for personality1, personality2 in product(list(PersonalityType), repeat=2):
+        row = {"personality1": personality1.value, "personality2": personality2.value}
+        row.update(_pair_values(
+            {"personality_type": personality1},
+            {"personality_type": personality2}
+        ))
+        yield row
+
+
+def _group_by_bucket(candidates: Iterable[Candidate]) -> Dict[Tuple, List[Candidate]]:
+    buckets: Dict[Tuple, List[Candidate]] = {}
+    for candidate in candidates:
+        buckets.setdefault(candidate.feature_key, []).append(candidate)
+    return buckets
+
+
+class _BucketScores:
+    """Pair values per feature-bucket pair, bounded so huge pools can't grow it without limit"""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._values: Dict[Tuple, Dict] = {}
+
+    def get(self, candidate1: Candidate, candidate2: Candidate) -> Dict:
+        key = (candidate1.feature_key, candidate2.feature_key)
+        values = self._values.get(key)
+        if values is None:
+            if len(self._values) >= self.max_entries:
+                self._values.clear()
+            values = _pair_values(candidate1.to_analysis(), candidate2.to_analysis())
+            self._values[key] = values
+        return values
+
+
+def _user_row(candidate1: Candidate, candidate2: Candidate, values: Dict) -> Dict:
+    row = {
+        "fid1": candidate1.fid,
+        "fid2": candidate2.fid,
+        "personality1": candidate1.personality_type.value,
+        "personality2": candidate2.personality_type.value
+    }
+    row.update(values)
+    return row
+
+
+def user_pair_rows(pool: CandidatePool) -> Iterator[Dict]:
+    """
+    One row per ordered user pair in the pool (fid1's view of fid2), generated lazily
+    Users in the same feature bucket score identically, so each bucket pair is scored once
+    """
+    candidates = list(pool)  # snapshot, the pool may change while a long export streams
+    scores = _BucketScores()
+    for candidate1 in candidates:
+        for candidate2 in candidates:
+            if candidate2 is not candidate1:
+                yield _user_row(candidate1, candidate2, scores.get(candidate1, candidate2))
+
+
+def top_pairs(rows: Iterable[Dict], n: int, key: str = "score") -> List[Dict]:
+    """Best n rows by `key` using a bounded min-heap (O(n) memory); earlier rows win ties"""
+    heap: List[Tuple[float, int, Dict]] = []
+    for index, row in enumerate(rows):
+        entry = (row[key], -index, row)
+        if len(heap) < n:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    return [row for _, _, row in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+def top_user_pairs(pool: CandidatePool, n: int) -> List[Dict]:
+    """
+    Leaderboard of the n best user pairs without scoring every user pair:
+    bucket pairs go through a bounded heap, then only the winners are expanded
+    """
+    buckets = _group_by_bucket(list(pool))
+    keys = list(buckets)
+    scores = _BucketScores()
+
+    def bucket_pairs():
+        for key1 in keys:
+            members1 = buckets[key1]
+            for key2 in keys:
+                members2 = buckets[key2]
+                if key1 == key2 and len(members1) < 2:
+                    continue
+                yield {"score": scores.get(members1[0], members2[0])["score"], "buckets": (key1, key2)}
+
+    # Every bucket pair holds at least one user pair, so n bucket pairs always suffice
+    rows: List[Dict] = []
+    for entry in top_pairs(bucket_pairs(), n):
+        key1, key2 = entry["buckets"]
+        members1, members2 = buckets[key1], buckets[key2]
+        pairs = (
+            (candidate1, candidate2)
+            for candidate1 in members1 for candidate2 in members2
+            if candidate2 is not candidate1
+        )
+        for candidate1, candidate2 in pairs:
+            rows.append(_user_row(candidate1, candidate2, scores.get(candidate1, candidate2)))
+            if len(rows) >= n:
+                return rows
+    return rows
+
+
+def csv_chunks(rows: Iterable[Dict], columns: Sequence[str], chunk_rows: int = 1000) -> Iterator[str]:
+    """CSV text in chunks of chunk_rows lines, header first"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(rows: Iterable[Dict], chunk_rows: int = 1000) -> Iterator[str]:
+    """NDJSON text in chunks of chunk_rows lines"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row))
+        if len(lines) >= chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_chunks(rows: Iterable[Dict], columns: Sequence[str], fmt: str, chunk_rows: int = 1000) -> Iterator[str]:
+    if fmt == "csv":
+        return csv_chunks(rows, columns, chunk_rows)
+    if fmt == "ndjson":
+        return ndjson_chunks(rows, chunk_rows)
+    raise ValueError(f"Unsupported format: {fmt} (expected one of {', '.join(FORMATS)})")
+
+
+def write_parquet(rows: Iterable[Dict], columns: Sequence[str], path: str, chunk_rows: int = 50_000):
+    """Write rows as Parquet, one row group per chunk (requires pyarrow)"""
+    if pq is None:
+        raise RuntimeError("pyarrow is not installed")
+    writer = None
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                break
+            table = pa.Table.from_pydict({column: [row[column] for row in chunk] for column in columns})
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export compatibility data")
+    parser.add_argument("command", choices=["matrix", "leaderboard"])
+    parser.add_argument("--level", choices=["type", "user"], default="type")
+    parser.add_argument("--format", choices=FORMATS + ("parquet",), default="csv")
+    parser.add_argument("-n", type=int, default=20, help="leaderboard size")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--index", help="match index file with the user pool (default: MATCH_INDEX_PATH)")
+    args = parser.parse_args(argv)
+
+    columns = TYPE_COLUMNS
+    pool = None
+    if args.level == "user":
+        from config import settings
+        from match_index import match_index
+
+        path = args.index or settings.match_index_path
+        if not path or not match_index.load(path):
+            parser.error("user level needs a saved match index (--index or MATCH_INDEX_PATH)")
+        pool = match_index.pool
+        columns = USER_COLUMNS
+
+    if args.command == "leaderboard":
+        rows = iter(top_user_pairs(pool, args.n) if pool is not None else top_pairs(type_pair_rows(), args.n))
+    else:
+        rows = user_pair_rows(pool) if pool is not None else type_pair_rows()
+
+    if args.format == "parquet":
+        if not args.output:
+            parser.error("--format parquet needs --output")
+        write_parquet(rows, columns, args.output)
+        return
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in export_chunks(rows, columns, args.format):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
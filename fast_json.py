@@ -0,0 +1,34 @@
+"""
+Fast JSON
+orjson-backed serialization with a stdlib fallback, and the response class JSON endpoints use
+"""
+from typing import Any
+import json
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, stdlib json is used without it
+    orjson = None
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    loads = json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it's installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
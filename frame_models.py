@@ -0,0 +1,73 @@
+"""
+Frame Payload Models
+Typed Farcaster frame POST bodies, decoded with orjson (when installed) and validated by pydantic-core
+"""
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from fast_json import loads
+
+
+class CastId(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    fid: int
+    hash: str
+
+
+class UntrustedData(BaseModel):
+    """Client-reported frame action, only trustworthy once trustedData is verified"""
+
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+
+    fid: Optional[int] = None
+    url: Optional[str] = None
+    message_hash: Optional[str] = Field(None, alias="messageHash")
+    timestamp: Optional[int] = None
+    network: Optional[int] = None
+    button_index: int = Field(1, alias="buttonIndex")
+    input_text: Optional[str] = Field(None, alias="inputText")
+    state: Optional[str] = None
+    cast_id: Optional[CastId] = Field(None, alias="castId")
+
+
+class TrustedData(BaseModel):
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+
+    message_bytes: str = Field(alias="messageBytes")
+
+
+class FramePayload(BaseModel):
+    """Frame POST body"""
+
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+
+    untrusted_data: UntrustedData = Field(default_factory=UntrustedData, alias="untrustedData")
+    trusted_data: Optional[TrustedData] = Field(None, alias="trustedData")
+
+
+class FramePayloadError(ValueError):
+    """The frame body is too large or doesn't match FramePayload"""
+
+
+async def read_frame_payload(request: Request, max_bytes: int) -> FramePayload:
+    """Read and validate a frame body, giving up as soon as it exceeds max_bytes"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail="Frame payload too large")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail="Frame payload too large")
+
+    # orjson + model_validate beats model_validate_json here (hex-heavy bodies, see benchmarks/bench_json.py)
+    try:
+        return FramePayload.model_validate(loads(bytes(body) or b"{}"))
+    except ValidationError as e:
+        raise FramePayloadError(f"Invalid frame payload ({e.error_count()} errors)")
+    except ValueError as e:
+        raise FramePayloadError(f"Invalid frame payload: {e}")
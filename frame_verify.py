@@ -0,0 +1,497 @@
+"""
+Frame Message Verification
+Checks trustedData.messageBytes locally (blake3 hash + ed25519 signature) and that the
+signer key is active for the fid, with signer lookups cached and signature checks batched
+"""
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import time
+
+from config import settings
+
+try:
+    from nacl.exceptions import BadSignatureError
+    from nacl.signing import VerifyKey
+except ImportError:  # PyNaCl is optional, verification is unavailable without it
+    VerifyKey = None
+    BadSignatureError = Exception
+
+try:
+    from blake3 import blake3
+except ImportError:  # blake3 is optional, verification is unavailable without it
+    blake3 = None
+
+try:
+    import httpx
+except ImportError:  # httpx is only needed for hub signer lookups
+    httpx = None
+
+
+FARCASTER_EPOCH = 1609459200  # 2021-01-01 UTC, message timestamps count from here
+MESSAGE_TYPE_FRAME_ACTION = 13
+HASH_SCHEME_BLAKE3 = 1
+SIGNATURE_SCHEME_ED25519 = 1
+HASH_LENGTH = 20
+NETWORK_MAINNET = 1
+
+
+class FrameVerificationError(ValueError):
+    """The frame message is malformed, badly signed, stale or from an unknown signer"""
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(buf):
+            raise FrameVerificationError("Truncated varint")
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise FrameVerificationError("Varint too long")
+
+
+def _fields(buf: bytes) -> Iterator[Tuple[int, int, object]]:
+    """Minimal protobuf reader: (field number, wire type, int or bytes value)"""
+    pos = 0
+    while pos < len(buf):
+        tag, pos = _read_varint(buf, pos)
+        field, wire_type = tag >> 3, tag & 7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            if pos + length > len(buf):
+                raise FrameVerificationError("Truncated field")
+            value, pos = buf[pos:pos + length], pos + length
+        elif wire_type == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire_type == 5:
+            value, pos = buf[pos:pos + 4], pos + 4
+        else:
+            raise FrameVerificationError(f"Unsupported wire type {wire_type}")
+        yield field, wire_type, value
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(field: int, value) -> bytes:
+    if isinstance(value, int):
+        return _varint(field << 3) + _varint(value)
+    return _varint(field << 3 | 2) + _varint(len(value)) + value
+
+
+class FrameMessage:
+    """Decoded Farcaster frame action message"""
+
+    __slots__ = (
+        "fid", "timestamp", "message_type", "network", "url", "button_index",
+        "input_text", "state", "cast_fid", "cast_hash",
+        "data_bytes", "hash", "hash_scheme", "signature", "signature_scheme", "signer"
+    )
+
+    def __init__(self):
+        self.fid = 0
+        self.timestamp = 0
+        self.message_type = 0
+        self.network = 0
+        self.url = b""
+        self.button_index = 0
+        self.input_text = b""
+        self.state = b""
+        self.cast_fid = 0
+        self.cast_hash = b""
+        self.data_bytes = b""
+        self.hash = b""
+        self.hash_scheme = 0
+        self.signature = b""
+        self.signature_scheme = 0
+        self.signer = b""
+
+    @property
+    def unix_timestamp(self) -> int:
+        return self.timestamp + FARCASTER_EPOCH
+
+    @classmethod
+    def parse(cls, message_bytes: bytes) -> "FrameMessage":
+        message = cls()
+        data = b""
+        for field, _, value in _fields(message_bytes):
+            if field == 1:
+                data = value
+            elif field == 2:
+                message.hash = value
+            elif field == 3:
+                message.hash_scheme = value
+            elif field == 4:
+                message.signature = value
+            elif field == 5:
+                message.signature_scheme = value
+            elif field == 6:
+                message.signer = value
+            elif field == 7:
+                message.data_bytes = value
+
+        # Signatures cover the original data encoding; data_bytes carries it when set
+        message.data_bytes = message.data_bytes or data
+        for field, _, value in _fields(message.data_bytes):
+            if field == 1:
+                message.message_type = value
+            elif field == 2:
+                message.fid = value
+            elif field == 3:
+                message.timestamp = value
+            elif field == 4:
+                message.network = value
+            elif field == 16:
+                message._parse_frame_action(value)
+        return message
+
+    def _parse_frame_action(self, body: bytes):
+        for field, _, value in _fields(body):
+            if field == 1:
+                self.url = value
+            elif field == 2:
+                self.button_index = value
+            elif field == 3:
+                for cast_field, _, cast_value in _fields(value):
+                    if cast_field == 1:
+                        self.cast_fid = cast_value
+                    elif cast_field == 2:
+                        self.cast_hash = cast_value
+            elif field == 4:
+                self.input_text = value
+            elif field == 5:
+                self.state = value
+
+
+def sign_frame_action(
+    signing_key,
+    fid: int,
+    button_index: int = 1,
+    url: str = "",
+    timestamp: Optional[int] = None,
+    network: int = NETWORK_MAINNET
+) -> bytes:
+    """
+    Build a signed frame action message (nacl SigningKey)
+    For local testing against a stand-in signer source
+    """
+    if blake3 is None:
+        raise RuntimeError("blake3 is not installed")
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    body = _field(1, url.encode()) + _field(2, button_index)
+    data = (
+        _field(1, MESSAGE_TYPE_FRAME_ACTION)
+        + _field(2, fid)
+        + _field(3, timestamp - FARCASTER_EPOCH)
+        + _field(4, network)
+        + _field(16, body)
+    )
+    digest = blake3(data).digest(length=HASH_LENGTH)
+    signature = signing_key.sign(digest).signature
+    return (
+        _field(1, data)
+        + _field(2, digest)
+        + _field(3, HASH_SCHEME_BLAKE3)
+        + _field(4, signature)
+        + _field(5, SIGNATURE_SCHEME_ED25519)
+        + _field(6, bytes(signing_key.verify_key))
+    )
+
+
+def _url_matches(url: bytes, base_url: str) -> bool:
+    """The frame URL is base_url itself or a path/query below it (not app.com.evil.net)"""
+    base = base_url.rstrip("/").encode()
+    return url == base or url.startswith(base + b"/") or url.startswith(base + b"?")
+
+
+def check_message(message_bytes: bytes, network: int = NETWORK_MAINNET, base_url: Optional[str] = None) -> FrameMessage:
+    """
+    Parse and check hash + signature (CPU only, no signer lookup)
+    Messages for another network, or for a frame outside base_url (when given), are
+    rejected: a signature from a testnet or another app's frame must not replay here
+    """
+    if VerifyKey is None or blake3 is None:
+        raise FrameVerificationError("Frame verification needs the pynacl and blake3 packages")
+
+    message = FrameMessage.parse(message_bytes)
+    if message.message_type != MESSAGE_TYPE_FRAME_ACTION:
+        raise FrameVerificationError("Not a frame action message")
+    if message.hash_scheme != HASH_SCHEME_BLAKE3 or message.signature_scheme != SIGNATURE_SCHEME_ED25519:
+        raise FrameVerificationError("Unsupported hash or signature scheme")
+    if blake3(message.data_bytes).digest(length=HASH_LENGTH) != message.hash:
+        raise FrameVerificationError("Hash mismatch")
+    try:
+        VerifyKey(message.signer).verify(message.hash, message.signature)
+    except (BadSignatureError, ValueError, TypeError):
+        raise FrameVerificationError("Invalid signature")
+    if message.network != network:
+        raise FrameVerificationError(f"Wrong network {message.network}")
+    if base_url is not None and not _url_matches(message.url, base_url):
+        raise FrameVerificationError("Frame URL is not on this app")
+    return message
+
+
+class HubSignerSource:
+    """Active signer keys per fid from a Farcaster hub's HTTP API, over one pooled client"""
+
+    def __init__(self, hub_url: str, timeout: float = 3.0, max_connections: int = 20):
+        if httpx is None:
+            raise RuntimeError("httpx package is not installed")
+        self.hub_url = hub_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.hub_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    async def signer_keys(self, fid: int) -> FrozenSet[bytes]:
+        response = await self.client.get("/v1/onChainSignersByFid", params={"fid": fid})
+        if response.status_code == 404:
+            return frozenset()
+        response.raise_for_status()
+        keys = set()
+        for event in response.json().get("events", []):
+            key = event.get("signerEventBody", {}).get("key", "")
+            if key:
+                keys.add(bytes.fromhex(key[2:] if key.startswith("0x") else key))
+        return frozenset(keys)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class StaticSignerSource:
+    """Local stand-in for a hub: fixed fid -> signer keys"""
+
+    def __init__(self, signers: Optional[Dict[int, List[bytes]]] = None):
+        self.signers = {int(fid): frozenset(keys) for fid, keys in (signers or {}).items()}
+
+    def add(self, fid: int, key: bytes):
+        self.signers[int(fid)] = self.signers.get(int(fid), frozenset()) | {key}
+
+    async def signer_keys(self, fid: int) -> FrozenSet[bytes]:
+        return self.signers.get(int(fid), frozenset())
+
+    async def close(self):
+        pass
+
+
+class SignerCache:
+    """TTL cache of signer keys per fid; concurrent misses for one fid share a single lookup"""
+
+    def __init__(self, source, ttl: float = 300, max_entries: int = 50_000, clock: Callable[[], float] = time.monotonic):
+        self.source = source
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[int, Tuple[float, FrozenSet[bytes]]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, fid: int) -> FrozenSet[bytes]:
+        entry = self._entries.get(fid)
+        if entry is not None and entry[0] > self.clock():
+            self._entries.move_to_end(fid)
+            self.hits += 1
+            return entry[1]
+
+        pending = self._inflight.get(fid)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[fid] = future
+        try:
+            keys = await self.source.signer_keys(fid)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here, waiters re-raise it
+            raise
+        else:
+            future.set_result(keys)
+            self._entries[fid] = (self.clock() + self.ttl, keys)
+            self._entries.move_to_end(fid)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return keys
+        finally:
+            del self._inflight[fid]
+
+    def invalidate(self, fid: int):
+        self._entries.pop(fid, None)
+
+
+class FrameVerifier:
+    """
+    Verifies frame POST bodies
+    Requests arriving together are checked as one batch in a worker thread,
+    so signature math never runs on the event loop
+    """
+
+    def __init__(
+        self,
+        source,
+        signer_ttl: float = 300,
+        max_age: float = 600,
+        batch_size: int = 64,
+        batch_window: float = 0.002,
+        network: int = NETWORK_MAINNET,
+        base_url: Optional[str] = None
+    ):
+        self.signers = SignerCache(source, ttl=signer_ttl)
+        self.max_age = max_age
+        self.network = network
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._pending: List[Tuple[bytes, asyncio.Future]] = []
+        self._flush_handle = None
+        self._flushes = set()  # strong refs to running flush tasks
+        self.verified = 0
+        self.rejected = 0
+        self.batches = 0
+
+    def _check_batch(self, raws: List[bytes]) -> List:
+        results = []
+        for raw in raws:
+            try:
+                results.append(check_message(raw, self.network, self.base_url))
+            except FrameVerificationError as e:
+                results.append(e)
+        return results
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        self._flush_handle = None
+        if not batch:
+            return
+        self.batches += 1
+        try:
+            results = await asyncio.to_thread(self._check_batch, [raw for raw, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _start_flush(self):
+        task = asyncio.get_running_loop().create_task(self._flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    def _schedule_flush(self):
+        if len(self._pending) >= self.batch_size:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._start_flush)
+
+    async def check(self, message_bytes: bytes) -> FrameMessage:
+        """Hash + signature check, batched with other concurrent requests"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((message_bytes, future))
+        self._schedule_flush()
+        return await future
+
+    async def verify(self, body: Dict) -> FrameMessage:
+        """Verified frame message for a raw frame POST body, raises FrameVerificationError"""
+        try:
+            message_hex = body["trustedData"]["messageBytes"]
+        except (KeyError, TypeError):
+            message_hex = None
+        return await self.verify_hex(message_hex)
+
+    async def verify_hex(self, message_hex: Optional[str]) -> FrameMessage:
+        """Verified frame message for hex-encoded trustedData.messageBytes"""
+        try:
+            message_bytes = bytes.fromhex(message_hex)
+        except (TypeError, ValueError):
+            self.rejected += 1
+            raise FrameVerificationError("Missing or malformed trustedData.messageBytes")
+
+        try:
+            message = await self.check(message_bytes)
+            if self.max_age and abs(time.time() - message.unix_timestamp) > self.max_age:
+                raise FrameVerificationError("Message is too old")
+            try:
+                keys = await self.signers.get(message.fid)
+            except Exception as e:
+                raise FrameVerificationError(f"Signer lookup failed: {e}")
+            if message.signer not in keys:
+                raise FrameVerificationError("Signer is not active for this fid")
+        except FrameVerificationError:
+            self.rejected += 1
+            raise
+
+        self.verified += 1
+        return message
+
+    def stats(self) -> Dict:
+        return {
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "signer_cache_hits": self.signers.hits,
+            "signer_cache_misses": self.signers.misses
+        }
+
+    async def close(self):
+        await self.signers.source.close()
+
+
+def create_frame_verifier(
+    hub_url: str,
+    signer_ttl: float = 300,
+    max_age: float = 600,
+    base_url: Optional[str] = None
+) -> FrameVerifier:
+    """Verifier backed by the configured hub (or a local hub stand-in at that URL)"""
+    return FrameVerifier(HubSignerSource(hub_url), signer_ttl=signer_ttl, max_age=max_age, base_url=base_url)
+
+
+# Singleton instance
+frame_verifier = create_frame_verifier(
+    settings.farcaster_hub_url,
+    signer_ttl=settings.signer_cache_ttl,
+    max_age=settings.frame_max_age,
+    base_url=settings.base_url
+)
@@ -2,17 +2,143 @@
 Dynamic Image Generator for Match Results
 Creates beautiful, shareable match result images
 """
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-from typing import Dict, Tuple
+from PIL import Image, ImageDraw, ImageFont, ImageFilter, features
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import io
 import base64
+import hashlib
 import random
+import threading
+
+from emoji_atlas import emoji_atlas
+from snapshot import iter_blobs, pack_blobs
+
+
+FONT_BOLD = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+FONT_REGULAR = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+# Match image quality modes, cheapest last (see overload.py)
+IMAGE_FULL = "full"        # full Pillow render with the comedy line
+IMAGE_ATLAS = "atlas"      # composite of cached level backgrounds and text sprites
+IMAGE_STATIC = "static"    # one prerendered image per match level
+
+# Bump when rendered images change look, so snapshots of old renders are discarded
+RENDER_VERSION = 2
+
+LEVEL_TEXT = {
+    "high_match": "🔥 PERFECT MATCH 🔥",
+    "medium_match": "💫 GOOD VIBES 💫",
+    "low_match": "⚡ OPPOSITES ATTRACT ⚡"
+}
+
+# Sizes derived from a master render on demand; other aspect ratios are letterboxed, never cropped
+IMAGE_VARIANTS = {
+    "full": (1200, 630),    # og:image / fc:frame:image
+    "half": (600, 315),     # thumbnails
+    "square": (630, 630)    # mini-app cards
+}
+
+# Variant encodings: extension -> (Pillow format, media type, save options)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png", {}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 85, "progressive": True}),
+}
+if features.check("webp"):
+    IMAGE_FORMATS["webp"] = ("WEBP", "image/webp", {"quality": 80, "method": 2})
+
+# Advertised for variants (smallest encoding this Pillow build supports)
+VARIANT_FORMAT = "webp" if "webp" in IMAGE_FORMATS else "jpg"
+
+# Bars on the details chart, in display order
+BREAKDOWN_BARS = (
+    ("personality_base", "Personality"),
+    ("token_overlap", "Tokens"),
+    ("risk_tolerance", "Risk"),
+    ("trait_similarity", "Traits"),
+    ("community_vibe", "Community")
+)
+
+
+class ImageStore:
+    """Bounded LRU store of rendered image bytes keyed by content hash"""
+    
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._images: "OrderedDict[str, bytes]" = OrderedDict()
+        self._variants: Dict[str, Dict[Tuple[str, str], bytes]] = {}
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._images
+    
+    def __len__(self) -> int:
+        return len(self._images)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._images.get(key)
+        if data is not None:
+            self._images.move_to_end(key)
+        return data
+    
+    def put(self, key: str, data: bytes):
+        if self._images.get(key, data) != data:
+            self._variants.pop(key, None)
+        self._images[key] = data
+        self._images.move_to_end(key)
+        while len(self._images) > self.max_entries:
+            evicted, _ = self._images.popitem(last=False)
+            self._variants.pop(evicted, None)
+    
+    def get_variant(self, key: str, variant: str, fmt: str) -> Optional[bytes]:
+        variants = self._variants.get(key)
+        return variants.get((variant, fmt)) if variants else None
+    
+    def put_variant(self, key: str, variant: str, fmt: str, data: bytes):
+        """Memoize a variant under its master's key; it is evicted together with the master"""
+        if key in self._images:
+            self._variants.setdefault(key, {})[(variant, fmt)] = data
+    
+    @property
+    def variants(self) -> Dict[str, Dict[Tuple[str, str], bytes]]:
+        return self._variants
+    
+    def items(self):
+        return self._images.items()
+    
+    def capture(self) -> List[Tuple[str, bytes]]:
+        """All images, least recently used first (references only, pack later)"""
+        return list(self._images.items())
+    
+    def dump(self) -> bytes:
+        """All images, least recently used first (snapshot section)"""
+        return pack_blobs(self.capture())
+    
+    def restore(self, data: bytes) -> int:
+        count = 0
+        for key, png in iter_blobs(data):
+            if key not in self._images:
+                self.put(key, bytes(png))
+                count += 1
+        return count
 
 
 class MatchImageGenerator:
     """Generates match result images"""
     
-    def __init__(self):
+    def __init__(self, store: Optional[ImageStore] = None, render_workers: int = 2):
+        self.store = store if store is not None else ImageStore()
+        # Pillow releases the GIL while encoding, so a small thread pool keeps renders off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=render_workers, thread_name_prefix="render")
+        self._gradients: Dict[str, Image.Image] = {}
+        self._placeholders: Dict[str, bytes] = {}
+        self._placeholder_variants: Dict[Tuple[str, str, str], bytes] = {}
+        self._atlas_bases: Dict[str, Image.Image] = {}
+        self._sprites: "OrderedDict[Tuple, Tuple[Image.Image, int, int]]" = OrderedDict()
+        self._static: Dict[str, bytes] = {}
+        self._fonts = threading.local()  # FreeType faces aren't safe to share between render threads
+        self._rendering: Dict[str, asyncio.Future] = {}  # key -> in-flight render
         self.width = 1200
         self.height = 630  # Optimal for social media
         self.colors = {
@@ -42,7 +168,15 @@ class MatchImageGenerator:
         return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
     
     def create_gradient_background(self, match_level: str) -> Image.Image:
-        """Create gradient background"""
+        """Create gradient background (rendered once per level, then copied)"""
+        cached = self._gradients.get(match_level)
+        if cached is None:
+            cached = self._render_gradient(match_level)
+            self._gradients[match_level] = cached
+        return cached.copy()
+    
+    def _render_gradient(self, match_level: str) -> Image.Image:
+        """Draw the vertical gradient for a match level"""
         img = Image.new('RGB', (self.width, self.height))
         draw = ImageDraw.Draw(img)
         
@@ -59,6 +193,21 @@ class MatchImageGenerator:
         
         return img
     
+    def font(self, path: str, size: int) -> ImageFont.ImageFont:
+        """TrueType font loaded once per (path, size) and thread, default bitmap font if it's missing"""
+        fonts = getattr(self._fonts, "cache", None)
+        if fonts is None:
+            fonts = self._fonts.cache = {}
+        key = (path, size)
+        font = fonts.get(key)
+        if font is None:
+            try:
+                font = ImageFont.truetype(path, size)
+            except OSError:
+                font = ImageFont.load_default()
+            fonts[key] = font
+        return font
+    
     def add_glow_effect(self, img: Image.Image) -> Image.Image:
         """Add soft glow effect"""
         return img.filter(ImageFilter.GaussianBlur(radius=2))
@@ -75,21 +224,386 @@ class MatchImageGenerator:
         Generate match result image
         Returns base64 encoded image
         """
+        png = self.render_match_png(personality1, personality2, compatibility_score, match_level, comedy_text)
+        img_base64 = base64.b64encode(png).decode()
+        
+        return f"data:image/png;base64,{img_base64}"
+    
+    @staticmethod
+    def match_image_key(
+        personality1: Dict,
+        personality2: Dict,
+        compatibility_score: int,
+        match_level: str,
+        comedy_text: str
+    ) -> str:
+        """Content key for a match image (identical inputs render identical images)"""
+        content = "\x1f".join([
+            personality1.get("title", ""),
+            personality2.get("title", ""),
+            str(compatibility_score),
+            match_level,
+            comedy_text
+        ])
+        return hashlib.sha256(content.encode()).hexdigest()[:20]
+    
+    def store_match_image(
+        self,
+        personality1: Dict,
+        personality2: Dict,
+        compatibility_score: int,
+        match_level: str,
+        comedy_text: str
+    ) -> str:
+        """
+        Render a match image into the image store
+        Returns the content key; already-rendered images are not rendered again
+        """
+        key = self.match_image_key(personality1, personality2, compatibility_score, match_level, comedy_text)
+        if key not in self.store:
+            png = self.render_match_png(personality1, personality2, compatibility_score, match_level, comedy_text)
+            self.store.put(key, png)
+        return key
+    
+    async def store_match_image_async(
+        self,
+        personality1: Dict,
+        personality2: Dict,
+        compatibility_score: int,
+        match_level: str,
+        comedy_text: str,
+        mode: str = IMAGE_FULL
+    ) -> str:
+        """
+        Render a match image on the render pool, returns the content key
+        Cheaper modes (IMAGE_ATLAS, IMAGE_STATIC) are used while the server is overloaded
+        """
+        if mode == IMAGE_STATIC:
+            key = f"static-{match_level}"
+            return await self._store_async(key, self.static_match_png, match_level)
+        if mode == IMAGE_ATLAS:
+            key = "a" + self.match_image_key(personality1, personality2, compatibility_score, match_level, "")[:19]
+            return await self._store_async(
+                key, self.composite_match_png, personality1, personality2, compatibility_score, match_level
+            )
+        key = self.match_image_key(personality1, personality2, compatibility_score, match_level, comedy_text)
+        return await self._store_async(
+            key,
+            self.render_match_png,
+            personality1,
+            personality2,
+            compatibility_score,
+            match_level,
+            comedy_text
+        )
+    
+    @property
+    def pending_renders(self) -> int:
+        """Renders queued or running on the render pool"""
+        return len(self._rendering)
+    
+    def _shared_render(self, job: str, keep: Callable[[bytes], None], render, *args) -> asyncio.Future:
+        """
+        The in-flight render for job, started on the render pool if there is none
+        Results are kept by a done callback, so a render outlives any one waiter's cancellation
+        (callers await it through asyncio.shield)
+        """
+        pending = self._rendering.get(job)
+        if pending is None:
+            pending = asyncio.get_running_loop().run_in_executor(self.executor, render, *args)
+            self._rendering[job] = pending
+            
+            def finished(future: asyncio.Future):
+                del self._rendering[job]
+                if not future.cancelled() and future.exception() is None:
+                    keep(future.result())
+            
+            pending.add_done_callback(finished)
+        return pending
+    
+    async def _store_async(self, key: str, render, *args) -> str:
+        """Render into the store on the render pool; concurrent requests for one key share the render"""
+        if key in self.store:
+            return key
+        pending = self._shared_render(key, lambda png: self.store.put(key, png), render, *args)
+        await asyncio.shield(pending)
+        return key
+    
+    @staticmethod
+    def derive_variant(master: bytes, variant: str, fmt: str) -> bytes:
+        """Fit a master PNG into a variant (letterboxed, nothing is cut off), encoded as fmt"""
+        width, height = IMAGE_VARIANTS[variant]
+        pil_format, _, options = IMAGE_FORMATS[fmt]
+        img = Image.open(io.BytesIO(master))
+        
+        scale = min(width / img.width, height / img.height)
+        fit = (round(img.width * scale), round(img.height * scale))
+        if img.size != fit:
+            factor = img.width // fit[0]
+            if factor > 1 and img.width == fit[0] * factor and img.height == fit[1] * factor:
+                img = img.reduce(factor)  # box filter over whole pixels, cheapest exact downscale
+            else:
+                img = img.resize(fit, Image.BILINEAR, reducing_gap=2.0)
+        
+        if fit != (width, height):
+            # Extend the edge rows/columns into the bars so the background carries on past the render
+            canvas = Image.new(img.mode, (width, height))
+            left, top = (width - fit[0]) // 2, (height - fit[1]) // 2
+            right, bottom = width - fit[0] - left, height - fit[1] - top
+            if top:
+                canvas.paste(img.crop((0, 0, fit[0], 1)).resize((fit[0], top)), (left, 0))
+            if bottom:
+                canvas.paste(img.crop((0, fit[1] - 1, fit[0], fit[1])).resize((fit[0], bottom)), (left, top + fit[1]))
+            if left:
+                canvas.paste(img.crop((0, 0, 1, fit[1])).resize((left, fit[1])), (0, top))
+            if right:
+                canvas.paste(img.crop((fit[0] - 1, 0, fit[0], fit[1])).resize((right, fit[1])), (left + fit[0], top))
+            canvas.paste(img, (left, top))
+            img = canvas
+        
+        if pil_format == "JPEG" and img.mode != "RGB":
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, format=pil_format, **options)
+        return buffer.getvalue()
+    
+    def variant(self, key: str, variant: str = "full", fmt: str = "png") -> Optional[bytes]:
+        """A stored image as variant/fmt, derived once and memoized; None if the master isn't stored"""
+        master = self.store.get(key)
+        if master is None or (variant == "full" and fmt == "png"):
+            return master
+        data = self.store.get_variant(key, variant, fmt)
+        if data is None:
+            data = self.derive_variant(master, variant, fmt)
+            self.store.put_variant(key, variant, fmt, data)
+        return data
+    
+    async def variant_async(self, key: str, variant: str = "full", fmt: str = "png") -> Optional[bytes]:
+        """variant() on the render pool; concurrent requests for one variant share the work"""
+        master = self.store.get(key)
+        if master is None or (variant == "full" and fmt == "png"):
+            return master
+        data = self.store.get_variant(key, variant, fmt)
+        if data is not None:
+            return data
+        
+        pending = self._shared_render(
+            f"{key}/{variant}.{fmt}",
+            lambda data: self.store.put_variant(key, variant, fmt, data),
+            self.derive_variant, master, variant, fmt
+        )
+        return await asyncio.shield(pending)
+    
+    def placeholder_variant(self, variant: str, fmt: str, match_level: str = "medium_match") -> bytes:
+        """The placeholder as variant/fmt, derived once per level"""
+        cache_key = (match_level, variant, fmt)
+        data = self._placeholder_variants.get(cache_key)
+        if data is None:
+            data = self.derive_variant(self.placeholder_png(match_level), variant, fmt)
+            self._placeholder_variants[cache_key] = data
+        return data
+    
+    @staticmethod
+    def breakdown_image_key(breakdown: Dict[str, float], match_level: str) -> str:
+        """Content key for a breakdown chart (bars are drawn at whole-percent precision)"""
+        content = "\x1f".join(
+            [match_level] + [str(int(round(breakdown.get(key, 0)))) for key, _ in BREAKDOWN_BARS]
+        )
+        return "b" + hashlib.sha256(content.encode()).hexdigest()[:19]
+    
+    def store_breakdown_image(self, breakdown: Dict[str, float], match_level: str) -> str:
+        """Render a breakdown chart into the image store (once per distinct breakdown)"""
+        key = self.breakdown_image_key(breakdown, match_level)
+        if key not in self.store:
+            self.store.put(key, self.render_breakdown_png(breakdown, match_level))
+        return key
+    
+    async def store_breakdown_image_async(self, breakdown: Dict[str, float], match_level: str) -> str:
+        """Render a breakdown chart on the render pool, returns the content key"""
+        key = self.breakdown_image_key(breakdown, match_level)
+        return await self._store_async(key, self.render_breakdown_png, breakdown, match_level)
+    
+    def render_breakdown_png(self, breakdown: Dict[str, float], match_level: str) -> bytes:
+        """Horizontal bar chart of the compatibility factors as PNG bytes"""
+        img = self.create_gradient_background(match_level)
+        draw = ImageDraw.Draw(img)
+        
+        title_font = self.font(FONT_BOLD, 56)
+        label_font = self.font(FONT_REGULAR, 36)
+        value_font = self.font(FONT_BOLD, 36)
+        
+        colors = self.colors.get(match_level, self.colors["medium_match"])
+        text_color = self.hex_to_rgb(colors["text"])
+        accent_color = self.hex_to_rgb(colors["accent"])
+        
+        title_text = "Compatibility Breakdown"
+        title_bbox = draw.textbbox((0, 0), title_text, font=title_font)
+        draw.text(((self.width - (title_bbox[2] - title_bbox[0])) // 2, 40), title_text, fill=text_color, font=title_font)
+        
+        bar_left, bar_right, bar_height = 360, 1000, 44
+        y = 150
+        for key, label in BREAKDOWN_BARS:
+            value = max(0, min(100, int(round(breakdown.get(key, 0)))))
+            label_bbox = draw.textbbox((0, 0), label, font=label_font)
+            label_y = y + (bar_height - (label_bbox[3] - label_bbox[1])) // 2 - label_bbox[1]
+            draw.text((80, label_y), label, fill=text_color, font=label_font)
+            
+            draw.rounded_rectangle((bar_left, y, bar_right, y + bar_height), radius=bar_height // 2, outline=text_color, width=3)
+            filled = bar_left + (bar_right - bar_left) * value // 100
+            if filled - bar_left >= bar_height:
+                draw.rounded_rectangle((bar_left, y, filled, y + bar_height), radius=bar_height // 2, fill=accent_color)
+            
+            draw.text((bar_right + 30, label_y), f"{value}%", fill=text_color, font=value_font)
+            y += 90
+        
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG', optimize=True)
+        return buffer.getvalue()
+    
+    def placeholder_png(self, match_level: str = "medium_match") -> bytes:
+        """Cheap "still rendering" image, encoded once per level"""
+        png = self._placeholders.get(match_level)
+        if png is None:
+            img = self.create_gradient_background(match_level)
+            draw = ImageDraw.Draw(img)
+            font = self.font(FONT_BOLD, 64)
+            
+            colors = self.colors.get(match_level, self.colors["medium_match"])
+            text = "Finding your match..."
+            bbox = draw.textbbox((0, 0), text, font=font)
+            x = (self.width - (bbox[2] - bbox[0])) // 2
+            y = (self.height - (bbox[3] - bbox[1])) // 2
+            draw.text((x, y), text, fill=self.hex_to_rgb(colors["text"]), font=font)
+            
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG')
+            png = buffer.getvalue()
+            self._placeholders[match_level] = png
+        return png
+    
+    def capture_prerendered(self) -> List[Tuple[str, bytes]]:
+        """Per-level static and placeholder images as (key, png) pairs"""
+        return (
+            [(f"static:{level}", png) for level, png in self._static.items()]
+            + [(f"placeholder:{level}", png) for level, png in self._placeholders.items()]
+        )
+    
+    def dump_prerendered(self) -> bytes:
+        """Encoded per-level static and placeholder images (snapshot section)"""
+        return pack_blobs(self.capture_prerendered())
+    
+    def restore_prerendered(self, data: bytes) -> int:
+        count = 0
+        for key, png in iter_blobs(data):
+            kind, _, level = key.partition(":")
+            target = self._static if kind == "static" else self._placeholders
+            target.setdefault(level, bytes(png))
+            count += 1
+        return count
+    
+    def _atlas_base(self, match_level: str) -> Image.Image:
+        """Background with the parts every match image of a level shares (title, level, heart)"""
+        base = self._atlas_bases.get(match_level)
+        if base is None:
+            base = self.create_gradient_background(match_level)
+            draw = ImageDraw.Draw(base)
+            colors = self.colors.get(match_level, self.colors["medium_match"])
+            text_color = self.hex_to_rgb(colors["text"])
+            
+            for text, font, y in (
+                ("💕 CRYPTO MATCH 💕", self.font(FONT_BOLD, 72), 50),
+                (LEVEL_TEXT.get(match_level, "💕 MATCH 💕"), self.font(FONT_REGULAR, 48), 280)
+            ):
+                self._draw_centered(base, draw, text, font, y, text_color)
+            emoji_atlas.draw_text(base, draw, (self.width // 2 - 30, 420), "💕", self.font(FONT_REGULAR, 48), self.hex_to_rgb(colors["accent"]))
+            self._atlas_bases[match_level] = base
+        return base
+    
+    def _sprite(self, text: str, size: int, fill: Tuple[int, int, int], glow: Optional[Tuple[int, int, int]] = None):
+        """
+        Transparent text sprite, rendered once and reused (bounded LRU)
+        Returns (sprite, dx, dy): paste at (x + dx, y + dy) to match draw.text((x, y), ...)
+        """
+        key = (text, size, fill, glow)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            font = self.font(FONT_BOLD if glow else FONT_REGULAR, size)
+            ascent, descent = font.getmetrics() if hasattr(font, "getmetrics") else (size, 0)
+            pad = 3
+            img = Image.new("RGBA", (emoji_atlas.text_width(text, font) + 2 * pad, ascent + descent + 2 * pad), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(img)
+            if glow:
+                for offset in [(2, 2), (-2, -2), (2, -2), (-2, 2)]:
+                    emoji_atlas.draw_text(img, draw, (pad + offset[0], pad + offset[1]), text, font, glow)
+            emoji_atlas.draw_text(img, draw, (pad, pad), text, font, fill)
+            sprite = (img, -pad, -pad)
+            self._sprites[key] = sprite
+            while len(self._sprites) > 1024:
+                self._sprites.popitem(last=False)
+        return sprite
+    
+    def _draw_centered(self, img: Image.Image, draw: ImageDraw.ImageDraw, text: str, font, y: int, fill):
+        """Draw a line horizontally centered, emoji included (see emoji_atlas)"""
+        x = (self.width - emoji_atlas.text_width(text, font)) // 2
+        emoji_atlas.draw_text(img, draw, (x, y), text, font, fill)
+    
+    def _paste_centered(self, img: Image.Image, sprite, y: int):
+        sprite_img, dx, dy = sprite
+        x = (self.width - (sprite_img.width - 2 * 3)) // 2
+        img.paste(sprite_img, (x + dx, y + dy), sprite_img)
+    
+    def composite_match_png(
+        self,
+        personality1: Dict,
+        personality2: Dict,
+        compatibility_score: int,
+        match_level: str
+    ) -> bytes:
+        """
+        Match image assembled from cached pieces: level background plus score and
+        personality sprites, no comedy line, fast PNG encode
+        """
+        img = self._atlas_base(match_level).copy()
+        colors = self.colors.get(match_level, self.colors["medium_match"])
+        text_color = self.hex_to_rgb(colors["text"])
+        accent_color = self.hex_to_rgb(colors["accent"])
+        
+        self._paste_centered(img, self._sprite(f"{compatibility_score}%", 72, text_color, accent_color), 180)
+        self._paste_centered(img, self._sprite(f"{personality1['emoji']} {personality1['title']}", 36, text_color), 380)
+        self._paste_centered(img, self._sprite(f"{personality2['emoji']} {personality2['title']}", 36, text_color), 460)
+        
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG', compress_level=1)
+        return buffer.getvalue()
+    
+    def static_match_png(self, match_level: str = "medium_match") -> bytes:
+        """Prerendered match image for a level (shared by every match), encoded once"""
+        png = self._static.get(match_level)
+        if png is None:
+            buffer = io.BytesIO()
+            self._atlas_base(match_level).save(buffer, format='PNG', optimize=True)
+            png = buffer.getvalue()
+            self._static[match_level] = png
+        return png
+    
+    def render_match_png(
+        self,
+        personality1: Dict,
+        personality2: Dict,
+        compatibility_score: int,
+        match_level: str,
+        comedy_text: str
+    ) -> bytes:
+        """Render match result image as PNG bytes"""
         # Create base image
         img = self.create_gradient_background(match_level)
         draw = ImageDraw.Draw(img)
         
-        # Try to load fonts (fallback to default if not available)
-        try:
-            title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 72)
-            subtitle_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 48)
-            body_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 36)
-            small_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 28)
-        except:
-            title_font = ImageFont.load_default()
-            subtitle_font = ImageFont.load_default()
-            body_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
+        # Fonts are loaded once and shared by all renders (default font if not available)
+        title_font = self.font(FONT_BOLD, 72)
+        subtitle_font = self.font(FONT_REGULAR, 48)
+        body_font = self.font(FONT_REGULAR, 36)
+        small_font = self.font(FONT_REGULAR, 28)
         
         # Get colors
         colors = self.colors.get(match_level, self.colors["medium_match"])
@@ -97,11 +611,7 @@ class MatchImageGenerator:
         accent_color = self.hex_to_rgb(colors["accent"])
         
         # Title
-        title_text = "💕 CRYPTO MATCH 💕"
-        title_bbox = draw.textbbox((0, 0), title_text, font=title_font)
-        title_width = title_bbox[2] - title_bbox[0]
-        title_x = (self.width - title_width) // 2
-        draw.text((title_x, 50), title_text, fill=text_color, font=title_font)
+        self._draw_centered(img, draw, "💕 CRYPTO MATCH 💕", title_font, 50, text_color)
         
         # Score - BIG and centered
         score_text = f"{compatibility_score}%"
@@ -115,50 +625,25 @@ class MatchImageGenerator:
         draw.text((score_x, 180), score_text, fill=text_color, font=title_font)
         
         # Match level emoji
-        level_emoji = {
-            "high_match": "🔥 PERFECT MATCH 🔥",
-            "medium_match": "💫 GOOD VIBES 💫",
-            "low_match": "⚡ OPPOSITES ATTRACT ⚡"
-        }
-        level_text = level_emoji.get(match_level, "💕 MATCH 💕")
-        level_bbox = draw.textbbox((0, 0), level_text, font=subtitle_font)
-        level_width = level_bbox[2] - level_bbox[0]
-        level_x = (self.width - level_width) // 2
-        draw.text((level_x, 280), level_text, fill=text_color, font=subtitle_font)
-        
-        # Personalities
-        p1_text = f"{personality1['emoji']} {personality1['title']}"
-        p2_text = f"{personality2['emoji']} {personality2['title']}"
+        self._draw_centered(img, draw, LEVEL_TEXT.get(match_level, "💕 MATCH 💕"), subtitle_font, 280, text_color)
         
-        p1_bbox = draw.textbbox((0, 0), p1_text, font=body_font)
-        p1_width = p1_bbox[2] - p1_bbox[0]
-        p1_x = (self.width - p1_width) // 2
-        
-        p2_bbox = draw.textbbox((0, 0), p2_text, font=body_font)
-        p2_width = p2_bbox[2] - p2_bbox[0]
-        p2_x = (self.width - p2_width) // 2
-        
-        draw.text((p1_x, 380), p1_text, fill=text_color, font=body_font)
-        draw.text((self.width // 2 - 30, 420), "💕", fill=accent_color, font=subtitle_font)
-        draw.text((p2_x, 460), p2_text, fill=text_color, font=body_font)
+        # Personalities (emoji come from the sprite atlas, DejaVu has no color glyphs)
+        self._draw_centered(img, draw, f"{personality1['emoji']} {personality1['title']}", body_font, 380, text_color)
+        emoji_atlas.draw_text(img, draw, (self.width // 2 - 30, 420), "💕", subtitle_font, accent_color)
+        self._draw_centered(img, draw, f"{personality2['emoji']} {personality2['title']}", body_font, 460, text_color)
         
         # Comedy text (wrapped)
         comedy_wrapped = self._wrap_text(comedy_text, body_font, self.width - 100)
         y_offset = 530
         for line in comedy_wrapped[:2]:  # Max 2 lines
-            line_bbox = draw.textbbox((0, 0), line, font=small_font)
-            line_width = line_bbox[2] - line_bbox[0]
-            line_x = (self.width - line_width) // 2
-            draw.text((line_x, y_offset), line, fill=text_color, font=small_font)
+            self._draw_centered(img, draw, line, small_font, y_offset, text_color)
             y_offset += 35
         
-        # Convert to base64
+        # Encode PNG
         buffer = io.BytesIO()
         img.save(buffer, format='PNG', optimize=True)
-        buffer.seek(0)
-        img_base64 = base64.b64encode(buffer.getvalue()).decode()
         
-        return f"data:image/png;base64,{img_base64}"
+        return buffer.getvalue()
     
     def _wrap_text(self, text: str, font, max_width: int) -> list:
         """Wrap text to fit within max_width"""
@@ -166,13 +651,10 @@ class MatchImageGenerator:
         lines = []
         current_line = []
         
-        draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
-        
         for word in words:
             current_line.append(word)
             test_line = ' '.join(current_line)
-            bbox = draw.textbbox((0, 0), test_line, font=font)
-            width = bbox[2] - bbox[0]
+            width = emoji_atlas.text_width(test_line, font)
             
             if width > max_width:
                 if len(current_line) > 1:
@@ -0,0 +1,311 @@
+"""
+Bulk User Import
+Streams user records from CSV, NDJSON or Parquet into the candidate pool and match index.
+Records are analyzed in worker processes and joined in batches; progress is checkpointed
+so an interrupted import resumes where it stopped
+
+Usage:
+    python import_users.py users.ndjson
+    python import_users.py users.csv --workers 8 --batch-size 2000 --index match_index.json
+    python import_users.py users.parquet --restart
+
+Records: fid (required), name, and either casts (a list, or newline-separated in CSV) or
+personality_type / traits / tokens (lists, or ';'-separated in CSV); optional confidence
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import argparse
+import csv
+import json
+import os
+import signal
+import sys
+import time
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, only Parquet input needs it
+    pq = None
+
+from candidate_pool import Candidate, analyze_records
+from config import settings
+
+
+FORMATS = ("csv", "ndjson", "parquet")
+
+Reader = Callable[[str, int], Iterator[Tuple[int, Optional[Dict]]]]
+
+
+def read_ndjson(path: str, start: int = 0) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """(byte offset after the record, record); unparseable lines yield None"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            position = f.tell()
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield position, record if isinstance(record, dict) else None
+
+
+def read_csv(path: str, start: int = 0) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """(byte offset after the row, row as a dict keyed by the header)"""
+    with open(path, "rb") as f:
+        def lines():
+            # readline (not iteration) keeps f.tell() exact; csv pulls extra lines for quoted newlines
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                yield line.decode("utf-8-sig")
+
+        reader = csv.reader(lines())
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.strip() for name in header]
+        if start:
+            f.seek(start)
+        for row in reader:
+            if row:
+                yield f.tell(), dict(zip(header, row))
+
+
+def read_parquet(path: str, start: int = 0, batch_size: int = 4096) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """(rows read so far, record); whole row groups before `start` are skipped unread"""
+    if pq is None:
+        raise RuntimeError("Parquet input needs pyarrow (pip install pyarrow)")
+    parquet = pq.ParquetFile(path)
+    position = 0
+    for group in range(parquet.num_row_groups):
+        rows = parquet.metadata.row_group(group).num_rows
+        if position + rows <= start:
+            position += rows
+            continue
+        for batch in parquet.iter_batches(batch_size=batch_size, row_groups=[group]):
+            for record in batch.to_pylist():
+                position += 1
+                if position > start:
+                    yield position, record
+
+
+READERS: Dict[str, Reader] = {"csv": read_csv, "ndjson": read_ndjson, "parquet": read_parquet}
+
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("jsonl", "json", "ndjson"):
+        return "ndjson"
+    if extension in ("parquet", "pq"):
+        return "parquet"
+    if extension in ("csv", "tsv"):
+        return "csv"
+    raise ValueError(f"Can't tell the format of {path}, pass --format")
+
+
+def source_total(path: str, fmt: str) -> int:
+    """Progress denominator: rows for Parquet, bytes otherwise"""
+    if fmt == "parquet" and pq is not None:
+        return pq.ParquetFile(path).metadata.num_rows
+    return os.path.getsize(path)
+
+
+def _ignore_interrupt():
+    """Workers leave Ctrl-C to the parent, which checkpoints and shuts them down"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class UserImporter:
+    """
+    Streams records through analysis workers into a TopKMatchIndex
+    At most `workers * 2` batches are in flight, so memory doesn't depend on file size;
+    batches are joined in file order, so the checkpoint position only moves forward
+    """
+
+    def __init__(
+        self,
+        index,
+        index_path: str,
+        workers: int = os.cpu_count() or 1,
+        batch_size: int = 1000,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: float = 30.0,
+        report_interval: float = 5.0
+    ):
+        self.index = index
+        self.index_path = index_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.report_interval = report_interval
+        self.position = 0
+        self.imported = 0
+        self.rejected = 0
+
+    def _load_checkpoint(self, path: str, fmt: str) -> int:
+        """Resume position for this source (0 if there's nothing to resume)"""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except ValueError as e:
+            print(f"Ignoring checkpoint {self.checkpoint_path}: {e}")
+            return 0
+        if state.get("source") != os.path.abspath(path) or state.get("format") != fmt:
+            print(f"Checkpoint {self.checkpoint_path} is for another source, starting over")
+            return 0
+        if fmt != "parquet" and state.get("position", 0) > os.path.getsize(path):
+            print(f"{path} shrank since the checkpoint, starting over")
+            return 0
+        self.imported = state.get("imported", 0)
+        self.rejected = state.get("rejected", 0)
+        return state.get("position", 0)
+
+    def checkpoint(self, path: str, fmt: str, done: bool = False):
+        """Save the index, then the position it covers (a crash in between only replays records)"""
+        self.index.save(self.index_path)
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "source": os.path.abspath(path),
+                "format": fmt,
+                "position": self.position,
+                "imported": self.imported,
+                "rejected": self.rejected,
+                "done": done,
+                "updated_at": time.time()
+            }, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _submit(self, pool: Optional[ProcessPoolExecutor], records: List[Optional[Dict]]) -> Future:
+        if pool is not None:
+            return pool.submit(analyze_records, records)
+        future: Future = Future()
+        future.set_result(analyze_records(records))
+        return future
+
+    def _apply(self, future: Future, position: int):
+        analyzed, rejected = future.result()
+        self.index.join_many(Candidate.from_dict(record) for record in analyzed)
+        self.imported += len(analyzed)
+        self.rejected += rejected
+        self.position = position
+
+    def run(self, path: str, fmt: Optional[str] = None, restart: bool = False) -> Dict:
+        fmt = fmt or detect_format(path)
+        reader = READERS[fmt]
+        total = source_total(path, fmt)
+        start = 0 if restart else self._load_checkpoint(path, fmt)
+        if os.path.exists(self.index_path) and (start or not restart):
+            self.index.load(self.index_path)
+        self.position = start
+        if start:
+            print(f"Resuming {path} at {start:,}/{total:,} ({self.imported:,} imported so far)")
+
+        started = time.monotonic()
+        session_start = self.imported
+        last_report = last_checkpoint = started
+        pending: deque = deque()
+        pool = ProcessPoolExecutor(self.workers, initializer=_ignore_interrupt) if self.workers > 0 else None
+        try:
+            chunk: List[Optional[Dict]] = []
+            position = start
+            records = reader(path, start)
+            while True:
+                for position, record in records:
+                    chunk.append(record)
+                    if len(chunk) >= self.batch_size:
+                        break
+                if not chunk:
+                    break
+                pending.append((self._submit(pool, chunk), position))
+                chunk = []
+
+                # Bounded read-ahead: join the oldest batch before reading more
+                while pending and (len(pending) >= max(1, self.workers) * 2 or pending[0][0].done()):
+                    self._apply(*pending.popleft())
+
+                now = time.monotonic()
+                if now - last_report >= self.report_interval:
+                    self._report(now - started, self.imported - session_start, total)
+                    last_report = now
+                if now - last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint(path, fmt)
+                    last_checkpoint = now
+
+            while pending:
+                self._apply(*pending.popleft())
+        except KeyboardInterrupt:
+            print(f"Interrupted, checkpointing at {self.position:,}")
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = None
+            self.checkpoint(path, fmt)
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.checkpoint(path, fmt, done=True)
+        elapsed = time.monotonic() - started
+        self._report(elapsed, self.imported - session_start, total)
+        return {
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "candidates": len(self.index),
+            "seconds": round(elapsed, 2),
+            "records_per_second": round((self.imported - session_start) / elapsed, 1) if elapsed else 0.0
+        }
+
+    def _report(self, elapsed: float, imported: int, total: int):
+        rate = imported / elapsed if elapsed else 0.0
+        done = f" ({100 * self.position / total:.1f}%)" if total else ""
+        print(f"  {self.imported:,} imported, {self.rejected:,} rejected, {rate:,.0f} records/s{done}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream users from CSV/NDJSON/Parquet into the match index")
+    parser.add_argument("source")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--index", default=settings.match_index_path or "match_index.json",
+                        help="match index file to extend (the server loads MATCH_INDEX_PATH)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="analysis processes (0 = inline)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", help="default: <source>.checkpoint")
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0, help="seconds between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and index")
+    args = parser.parse_args(argv)
+
+    from match_index import match_index  # pulls in the matchmaking engine, keep --help fast
+
+    importer = UserImporter(
+        match_index,
+        args.index,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint or f"{args.source}.checkpoint",
+        checkpoint_interval=args.checkpoint_interval
+    )
+    try:
+        stats = importer.run(args.source, args.format, args.restart)
+    except KeyboardInterrupt:
+        return 130
+    print(f"Imported {stats['imported']:,} users ({stats['rejected']:,} rejected) into {args.index}: "
+          f"{stats['candidates']:,} candidates, {stats['records_per_second']:,.0f} records/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,23 +3,57 @@ CryptoMatch - AI-Powered Crypto Dating for Farcaster
 Production-ready Farcaster Frame v2 implementation
 """
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+from functools import lru_cache
+import asyncio
+import hashlib
+import hmac
 import random
+import secrets
+import threading
+import time
+from urllib.parse import quote
 
 from config import settings
 from personality import PersonalityAnalyzer
 from matchmaking import matchmaking_engine
 from comedy_generator import comedy_generator
+from image_generator import IMAGE_FORMATS, IMAGE_VARIANTS, RENDER_VERSION, image_generator
+from render_jobs import render_jobs
+from rate_limit import create_rate_limiter, frame_key
+from frame_verify import FrameVerificationError, frame_verifier
+from frame_models import FramePayload, FramePayloadError, read_frame_payload
+from fast_json import FastJSONResponse, dumps as json_dumps, loads as json_loads
+from single_flight import SingleFlight
+from overload import TIERS, overload_controller
+from prefetch import match_prefetcher
+from analytics import event_recorder
+from metrics import metrics
+from candidate_pool import candidate_pool
+from match_index import match_index
+from match_history import match_history
+from batch import RequestStreamingResponse, batch_scorer, pairs_from_lines, pairs_from_list
+from export import (
+    TYPE_COLUMNS, USER_COLUMNS, FORMATS,
+    export_chunks, type_pair_rows, user_pair_rows, top_pairs, top_user_pairs
+)
+from profiler import profiler
+from memory_stats import memory_accountant
+from snapshot import pack_blobs, snapshots
+from match_result import MatchResult
+from emoji_atlas import emoji_atlas
+from assets import DIST_DIR, PrecompressedStaticFiles, assets
 
 # Initialize FastAPI app
 app = FastAPI(
     title="CryptoMatch",
     description="AI-Powered Crypto Dating for Farcaster",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware
@@ -31,6 +65,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Fingerprinted assets from build_assets.py (immutable, precompressed); mounted before /static
+if os.path.exists(DIST_DIR):
+    app.mount("/static/dist", PrecompressedStaticFiles(directory=DIST_DIR), name="static-dist")
+
 # Mount static files if directory exists
 if os.path.exists("static"):
     app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -38,6 +76,56 @@ if os.path.exists("static"):
 # In-memory cache for demo (use Redis in production)
 user_cache = {}
 
+# Memory accounting (profiles are shared class data, not per-result cost)
+memory_accountant.register("user_cache", user_cache)
+memory_accountant.register("image_store", image_generator.store)
+memory_accountant.register("image_variants", image_generator.store.variants)
+memory_accountant.register("match_lists", match_index.lists)
+memory_accountant.ignore_shared(PersonalityAnalyzer.PERSONALITY_PROFILES)
+
+
+def dump_user_cache() -> bytes:
+    """Cached match results whose image is still stored (progressive partials would 404)"""
+    return json_dumps([
+        [key, result.to_record()]
+        for key, result in user_cache.items()
+        if not result.image_key or result.image_key in image_generator.store
+    ])
+
+
+def restore_user_cache(data: bytes) -> int:
+    records = json_loads(data)
+    for key, record in records:
+        user_cache.setdefault(key, MatchResult.from_record(record))
+    return len(records)
+
+
+# Warm state for restarts (images depend on the renderer and the emoji atlas)
+renders = f"r{RENDER_VERSION}-{emoji_atlas.version}"
+snapshots.register(
+    "images", renders, image_generator.store.capture, image_generator.store.restore, encode=pack_blobs
+)
+snapshots.register(
+    "prerendered", renders, image_generator.capture_prerendered, image_generator.restore_prerendered,
+    encode=pack_blobs
+)
+snapshots.register("user_cache", f"m{MatchResult.VERSION}", dump_user_cache, restore_user_cache, compress=True)
+snapshots.register("comedy", "2", comedy_generator.dump_lines, comedy_generator.restore_lines, compress=True)
+if not settings.match_index_path:  # MATCH_INDEX_PATH keeps its own file
+    snapshots.register(
+        "match_index", f"i{match_index.VERSION}",
+        lambda: json_dumps(match_index.to_dict()),
+        lambda data: match_index.load_dict(json_loads(data)) or len(match_index),
+        compress=True
+    )
+if not settings.match_history_path:
+    snapshots.register(
+        "match_history", f"h{match_history.VERSION}",
+        lambda: json_dumps(match_history.to_dict()),
+        lambda data: match_history.load_dict(json_loads(data)) or len(match_history),
+        compress=True
+    )
+
 
 def generate_frame_html(
     image_url: str,
@@ -146,6 +234,174 @@ def generate_frame_html(
     return html
 
 
+@lru_cache(maxsize=1)
+def rate_limited_frame() -> bytes:
+    """Pre-built frame for over-limit requests (no LLM or render work)"""
+    return generate_frame_html(
+        image_url=assets.absolute_url("error.png"),
+        buttons=[{"label": "🔄 Try Again", "action": "post"}],
+        post_url=f"{settings.base_url}/match",
+        title="Slow down! ⏳",
+        description="😅 Too many matches too fast! Take a breath and try again in a minute."
+    ).encode()
+
+
+# Rate limiting for frame POSTs
+rate_limiter = create_rate_limiter(
+    backend=settings.rate_limit_backend,
+    capacity=settings.rate_limit_burst,
+    refill_per_second=settings.rate_limit_per_user / settings.rate_limit_window,
+    redis_url=settings.redis_url
+)
+
+
+async def frame_rate_limited(request: Request, fid: Optional[str], verified: bool) -> Optional[HTMLResponse]:
+    """
+    Over-limit frame for this request, or None
+    Runs after frame_identity so a forged untrustedData.fid can't pick (or drain) a bucket
+    """
+    key = frame_key(
+        fid, verified, request.scope,
+        trust_unverified=settings.frame_verification == "off",
+        trusted_hops=settings.trusted_proxy_hops
+    )
+    if await rate_limiter.allow(key):
+        return None
+    return HTMLResponse(content=rate_limited_frame(), headers={"x-ratelimit-limited": "1"})
+
+
+# Duplicate /match posts (same fid and button) share one pipeline run
+match_flight = SingleFlight("match", reuse_window=settings.match_reuse_window)
+
+# Scrape-time metrics for state kept elsewhere
+metrics.register_callback("user_cache_entries", "Cached match results", lambda: len(user_cache))
+metrics.register_callback("image_store_entries", "Rendered images held in memory", lambda: len(image_generator.store))
+metrics.register_callback("candidates", "Users in the candidate pool", lambda: len(candidate_pool))
+metrics.register_callback("match_index_guests", "Unverified users in the match lists", lambda: len(match_index.guests))
+metrics.register_callback("match_lists_shortlisted_total", "Match lists built from a vector-search shortlist", lambda: match_index.shortlisted, "counter")
+metrics.register_callback("render_jobs_inflight", "Background renders in flight", lambda: len(render_jobs))
+metrics.register_callback("match_inflight", "Match computations in flight", lambda: len(match_flight))
+metrics.register_callback("rate_limit_allowed_total", "Frame POSTs allowed by the rate limiter", lambda: rate_limiter.allowed, "counter")
+metrics.register_callback("rate_limit_limited_total", "Frame POSTs rejected by the rate limiter", lambda: rate_limiter.limited, "counter")
+metrics.register_callback("frames_verified_total", "Frame messages that passed verification", lambda: frame_verifier.verified, "counter")
+metrics.register_callback("frames_rejected_total", "Frame messages that failed verification", lambda: frame_verifier.rejected, "counter")
+metrics.register_callback("signer_cache_misses_total", "Hub signer lookups", lambda: frame_verifier.signers.misses, "counter")
+
+
+@app.on_event("startup")
+async def load_snapshot():
+    """Restore warm caches from the last snapshot before taking traffic"""
+    restored = snapshots.load()
+    if restored:
+        print(f"Restored snapshot from {settings.snapshot_path}: {restored}")
+    snapshots.start()
+
+
+@app.on_event("shutdown")
+async def save_snapshot():
+    """Write a final snapshot for the next worker"""
+    await snapshots.stop()
+
+
+@app.on_event("startup")
+async def load_match_index():
+    """Reload precomputed match lists saved by a previous worker"""
+    if settings.match_index_path and match_index.load(settings.match_index_path):
+        print(f"Loaded {len(match_index)} candidates from {settings.match_index_path}")
+
+
+@app.on_event("shutdown")
+async def save_match_index():
+    """Persist precomputed match lists for the next worker"""
+    if settings.match_index_path:
+        match_index.save(settings.match_index_path)
+
+
+@app.on_event("startup")
+async def load_match_history():
+    """Reload per-user match histories saved by a previous worker"""
+    if settings.match_history_path and match_history.load(settings.match_history_path):
+        print(f"Loaded match history for {len(match_history)} users from {settings.match_history_path}")
+
+
+@app.on_event("shutdown")
+async def save_match_history():
+    """Persist match histories so repeats stay skipped across restarts"""
+    if settings.match_history_path:
+        match_history.save(settings.match_history_path)
+
+
+@app.on_event("startup")
+async def start_overload_monitor():
+    """Sample event-loop lag for the overload controller"""
+    overload_controller.start()
+
+
+@app.on_event("shutdown")
+async def stop_overload_monitor():
+    await overload_controller.stop()
+
+
+@app.on_event("startup")
+async def start_comedy_filler():
+    """Fill the comedy cache in batches (COMEDY_SOURCE=batch)"""
+    comedy_generator.start()
+
+
+@app.on_event("shutdown")
+async def stop_comedy_filler():
+    await comedy_generator.stop()
+
+
+@app.on_event("shutdown")
+async def stop_prefetcher():
+    """Cancel speculative prefetches still running"""
+    await match_prefetcher.stop()
+
+
+@app.on_event("startup")
+async def start_event_recorder():
+    """Background flusher for analytics events"""
+    event_recorder.start()
+
+
+@app.on_event("shutdown")
+async def stop_event_recorder():
+    """Write buffered analytics events before the worker exits"""
+    await event_recorder.stop()
+
+
+@app.on_event("shutdown")
+async def close_frame_verifier():
+    """Close the pooled hub client"""
+    await frame_verifier.close()
+
+
+async def frame_identity(payload: FramePayload) -> Tuple[Optional[str], int, bool]:
+    """
+    (fid, button index, verified) for a frame POST
+    FRAME_VERIFICATION=off trusts untrustedData, log falls back to it, enforce raises
+    """
+    untrusted_data = payload.untrusted_data
+    fid = str(untrusted_data.fid) if untrusted_data.fid is not None else None
+    button_index = untrusted_data.button_index
+    
+    if settings.frame_verification == "off":
+        return fid, button_index, False
+    
+    try:
+        message = await frame_verifier.verify_hex(
+            payload.trusted_data.message_bytes if payload.trusted_data else None
+        )
+    except FrameVerificationError as e:
+        if settings.frame_verification == "enforce":
+            raise
+        print(f"Unverified frame message from fid {fid}: {e}")
+        return fid, button_index, False
+    
+    return str(message.fid), message.button_index, True
+
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Serve the Mini App HTML"""
@@ -170,7 +426,7 @@ async def home(request: Request):
             continue
     
     if html_content:
-        return HTMLResponse(content=html_content)
+        return HTMLResponse(content=assets.rewrite(html_content))
     
     # Fallback: inline HTML with SDK
     return HTMLResponse(content="""<!DOCTYPE html>
@@ -318,12 +574,18 @@ async def find_match(request: Request):
     
     try:
         # Parse Farcaster Frame POST data
-        body = await request.json()
+        payload = await read_frame_payload(request, settings.max_frame_body)
         
-        # Extract user FID (Farcaster ID)
-        untrusted_data = body.get("untrustedData", {})
-        user_fid = untrusted_data.get("fid", f"user_{random.randint(1000, 9999)}")
-        button_index = untrusted_data.get("buttonIndex", 1)
+        # Extract user FID (Farcaster ID), verified when FRAME_VERIFICATION is on
+        try:
+            fid, button_index, verified = await frame_identity(payload)
+        except FrameVerificationError:
+            return await error_frame("Couldn't verify your Farcaster message. Please try again!")
+        limited = await frame_rate_limited(request, fid, verified)
+        if limited is not None:
+            return limited
+        has_fid = fid is not None
+        user_fid = fid if has_fid else f"user_{random.randint(1000, 9999)}"
         
         # Handle "About" button
         if button_index == 2:
@@ -333,21 +595,50 @@ async def find_match(request: Request):
         cache_key = f"match_{user_fid}"
         
         # Generate new match
-        match_result = await matchmaking_engine.generate_match_result(
-            user_fid=str(user_fid),
-            match_fid=f"match_{random.randint(1000, 9999)}",
-            user_name="You",
-            match_name=f"User #{random.randint(100, 999)}"
-        )
+        progressive = settings.progressive_frames or request.query_params.get("progressive") == "1"
+        
+        async def compute_match():
+            # Served straight from the slot when the next match was prefetched
+            match_result = await match_prefetcher.take(str(user_fid)) if has_fid else None
+            if match_result is not None:
+                match_index.consume(str(user_fid), match_result.match_fid)
+                if not match_result.image_key:
+                    match_result = await matchmaking_engine.render_result(match_result, tier)
+                match_result = match_result.replace(created_at=time.time())
+            else:
+                match_args = build_match_args(str(user_fid), has_fid, verified=verified)
+                match_args["tier"] = tier
+                
+                if progressive:
+                    # Score now, comedy + image finish in the background
+                    match_result, job = matchmaking_engine.start_match_result(**match_args)
+                    job.add_done_callback(
+                        lambda task, partial=match_result: store_finished_result(cache_key, partial, task)
+                    )
+                else:
+                    match_result = await matchmaking_engine.generate_match_result(**match_args)
+            
+            # Cache result (anonymous requests can't come back for details, don't let them fill the cache)
+            if has_fid:
+                user_cache[cache_key] = match_result
+                match_history.record_result(match_result)
+                # Most users press "Find Another Match": get the next one ready while they read
+                match_prefetcher.schedule(str(user_fid), lambda: prefetch_next_match(str(user_fid)))
+            event_recorder.record_match("match", match_result, tier.name)
+            return match_result
         
-        # Cache result
-        user_cache[cache_key] = match_result
+        # Under load the pipeline steps down to cached/template comedy and cheaper images
+        with overload_controller.request() as tier:
+            if has_fid:
+                # Double-posted buttons await the same result instead of re-running the pipeline
+                match_result = await match_flight.run((str(user_fid), button_index, progressive), compute_match)
+            else:
+                match_result = await compute_match()
         
-        # Get compatibility data
-        compatibility = match_result["compatibility"]
+        # Generated image is served from the image store
+        result_image = match_result.image_url
         
-        # Use generated image
-        result_image = compatibility["image_url"]
+        share_text = match_result.share_text or f"💕 {match_result.total_score}% crypto match! Find YOUR crypto match: "
         
         # Create result frame buttons
         buttons = [
@@ -358,7 +649,11 @@ async def find_match(request: Request):
             {
                 "label": "🚀 Share Result",
                 "action": "link",
-                "target": f"https://warpcast.com/~/compose?text={match_result['share_text']}&embeds[]={settings.base_url}"
+                # Known users share through /share so the click is counted
+                "target": (
+                    f"{settings.base_url}/share/{quote(str(user_fid))}?t={share_token(str(user_fid), match_result.match_fid)}"
+                    if has_fid else compose_url(share_text)
+                )
             },
             {
                 "label": "📊 View Details",
@@ -366,42 +661,128 @@ async def find_match(request: Request):
             }
         ]
         
-        description = f"💕 {compatibility['total_score']}% Match! {compatibility['comedy']}"
+        description = f"💕 {match_result.total_score}% Match! {match_result.comedy or match_result.match_profile['tagline']}"
         
         html = generate_frame_html(
             image_url=result_image,
             buttons=buttons,
             post_url=f"{settings.base_url}/match",
-            title=f"CryptoMatch Result: {compatibility['total_score']}% Compatible! 🎯",
+            title=f"CryptoMatch Result: {match_result.total_score}% Compatible! 🎯",
             description=description
         )
         
         return HTMLResponse(content=html)
         
+    except HTTPException:
+        raise
+    except FramePayloadError:
+        return await error_frame("Couldn't read that frame action. Please try again!")
     except Exception as e:
         print(f"Error in find_match: {e}")
         return await error_frame(str(e))
 
 
+def compose_url(share_text: str) -> str:
+    """Warpcast composer prefilled with the share text and the app embed"""
+    return f"https://warpcast.com/~/compose?text={quote(share_text)}&embeds[]={quote(settings.base_url, safe=':/')}"
+
+
+SHARE_SECRET = (settings.share_secret or secrets.token_hex(16)).encode()
+
+
+def share_token(fid: str, match_fid: str) -> str:
+    """Signature of a share link issued with a result frame"""
+    return hmac.new(SHARE_SECRET, f"{fid}\x1f{match_fid}".encode(), hashlib.sha256).hexdigest()[:16]
+
+
+@app.get("/share/{fid}")
+async def share_match(fid: str, t: str = ""):
+    """Count a share click (only for links we issued), then send the user on to the Warpcast composer"""
+    match_result = user_cache.get(f"match_{fid}")
+    if match_result is None:
+        return RedirectResponse(compose_url("💕 Find YOUR crypto match: "))
+    if hmac.compare_digest(t.encode(), share_token(fid, match_result.match_fid).encode()):
+        event_recorder.record_match("share_click", match_result)
+    share_text = match_result.share_text or f"💕 {match_result.total_score}% crypto match! Find YOUR crypto match: "
+    return RedirectResponse(compose_url(share_text))
+
+
+def build_match_args(user_fid: str, has_fid: bool = True, advance: bool = True, verified: bool = False) -> Dict:
+    """
+    Pick the next match from the user's precomputed list
+    Falls back to a random stranger while the candidate pool is empty;
+    advance=False leaves the user's cursor alone (prefetches commit only when served);
+    unverified fids join the index as guests, which are capped
+    """
+    user = match_index.ensure_user(user_fid, verified=verified) if has_fid else None
+    # Skip candidates the user has already been shown
+    match_fid = match_index.next_match(
+        user_fid, skip=match_history.skipper(user_fid), advance=advance
+    ) if user else None
+    match = candidate_pool.get(match_fid) if match_fid else None
+    
+    if match is None:
+        return dict(
+            user_fid=user_fid,
+            match_fid=f"match_{random.randint(1000, 9999)}",
+            user_name="You",
+            match_name=f"User #{random.randint(100, 999)}",
+            user_analysis=user.to_analysis() if user else None
+        )
+    
+    return dict(
+        user_fid=user_fid,
+        match_fid=match.fid,
+        user_name="You",
+        match_name=match.name,
+        user_analysis=user.to_analysis(),
+        match_analysis=match.to_analysis()
+    )
+
+
+async def prefetch_next_match(user_fid: str):
+    """The user's next match at the full tier (image too unless PREFETCH_RENDER=false)"""
+    # Peek only: a prefetch that's never served must not use up a candidate
+    match_args = build_match_args(user_fid, advance=False)
+    return await matchmaking_engine.generate_match_result(
+        **match_args, tier=TIERS[0], render=settings.prefetch_render
+    )
+
+
+def store_finished_result(cache_key: str, partial, task: asyncio.Task):
+    """Swap a progressive result for the finished one, unless a newer match replaced it"""
+    if task.cancelled() or task.exception() is not None:
+        return
+    if user_cache.get(cache_key) is partial:
+        user_cache[cache_key] = task.result()
+
+
 @app.post("/details")
 async def show_details(request: Request):
     """Show detailed match breakdown"""
     
     try:
-        body = await request.json()
-        untrusted_data = body.get("untrustedData", {})
-        user_fid = untrusted_data.get("fid", "unknown")
+        payload = await read_frame_payload(request, settings.max_frame_body)
+        try:
+            user_fid, _, verified = await frame_identity(payload)
+        except FrameVerificationError:
+            return await error_frame("Couldn't verify your Farcaster message. Please try again!")
+        limited = await frame_rate_limited(request, user_fid, verified)
+        if limited is not None:
+            return limited
         
-        cache_key = f"match_{user_fid}"
+        cache_key = f"match_{user_fid or 'unknown'}"
         match_result = user_cache.get(cache_key)
         
         if not match_result:
             return await error_frame("No match found. Please try again!")
+        event_recorder.record_match("details", match_result)
         
-        compatibility = match_result["compatibility"]
+        breakdown = match_result.breakdown
         
-        # Create detailed breakdown image (simplified for demo)
-        detail_image = "https://images.unsplash.com/photo-1621504450181-5d356f61d307?w=1200&h=630&fit=crop"
+        # Breakdown chart, rendered once per distinct breakdown and served by content key
+        detail_key = await image_generator.store_breakdown_image_async(breakdown, match_result.match_level)
+        detail_image = f"{settings.base_url}/image/{detail_key}.png"
         
         buttons = [
             {
@@ -416,10 +797,10 @@ async def show_details(request: Request):
         
         description = f"""
         📊 Compatibility Breakdown:
-        • Personality: {int(compatibility['breakdown']['personality_base'])}%
-        • Tokens: {int(compatibility['breakdown']['token_overlap'])}%
-        • Risk: {int(compatibility['breakdown']['risk_tolerance'])}%
-        💡 {compatibility['date_idea']}
+        • Personality: {int(breakdown['personality_base'])}%
+        • Tokens: {int(breakdown['token_overlap'])}%
+        • Risk: {int(breakdown['risk_tolerance'])}%
+        💡 {match_result.date_idea}
         """
         
         html = generate_frame_html(
@@ -432,6 +813,10 @@ async def show_details(request: Request):
         
         return HTMLResponse(content=html)
         
+    except HTTPException:
+        raise
+    except FramePayloadError:
+        return await error_frame("Couldn't read that frame action. Please try again!")
     except Exception as e:
         return await error_frame(str(e))
 
@@ -439,7 +824,7 @@ async def show_details(request: Request):
 async def show_about(request: Request):
     """Show about information"""
     
-    about_image = "https://images.unsplash.com/photo-1605792657660-596af9009e82?w=1200&h=630&fit=crop"
+    about_image = assets.absolute_url("preview.png")
     
     buttons = [
         {
@@ -479,7 +864,7 @@ async def show_about(request: Request):
 async def error_frame(error_message: str = "Something went wrong!"):
     """Generate error frame"""
     
-    error_image = "https://images.unsplash.com/photo-1584438784894-089d6a62b8fa?w=1200&h=630&fit=crop"
+    error_image = assets.absolute_url("error.png")
     
     buttons = [
         {
@@ -499,14 +884,229 @@ async def error_frame(error_message: str = "Something went wrong!"):
     return HTMLResponse(content=html)
 
 
+@app.get("/image/{image_key}.png")
+async def match_image(image_key: str):
+    """Serve a rendered image by its content key (or progressive job key)"""
+    png = image_generator.store.get(image_key)
+    
+    if png is None and image_key in render_jobs:
+        # Progressive frame: wait for the in-flight render, fall back to a placeholder
+        if await render_jobs.wait(image_key, settings.render_deadline):
+            png = image_generator.store.get(image_key)
+        if png is None:
+            return Response(
+                content=image_generator.placeholder_png(),
+                media_type="image/png",
+                headers={"Cache-Control": "no-store"}
+            )
+    
+    if png is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    return Response(
+        content=png,
+        media_type="image/png",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
+@app.get("/image/{variant}/{image_key}.{fmt}")
+async def match_image_variant(variant: str, image_key: str, fmt: str):
+    """Serve a resized/re-encoded rendition of a rendered image, derived once from the master"""
+    if variant not in IMAGE_VARIANTS or fmt not in IMAGE_FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown image variant")
+    media_type = IMAGE_FORMATS[fmt][1]
+    
+    if image_key not in image_generator.store and image_key in render_jobs:
+        if not await render_jobs.wait(image_key, settings.render_deadline) or image_key not in image_generator.store:
+            return Response(
+                content=image_generator.placeholder_variant(variant, fmt),
+                media_type=media_type,
+                headers={"Cache-Control": "no-store"}
+            )
+    
+    data = await image_generator.variant_async(image_key, variant, fmt)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
+@app.get("/api/matches/{fid}")
+async def precomputed_matches(fid: str, limit: int = 10):
+    """Precomputed top-K candidates for a user"""
+    if fid not in match_index:
+        raise HTTPException(status_code=404, detail="Unknown fid")
+    
+    return FastJSONResponse(content={
+        "fid": fid,
+        "matches": [
+            {"fid": match_fid, "name": candidate_pool.get(match_fid).name, "score": round(score, 2)}
+            for match_fid, score in match_index.top(fid, limit)
+        ]
+    })
+
+
+@app.get("/api/history/{fid}")
+async def history(fid: str, offset: int = 0, limit: int = 20):
+    """A user's recent matches, newest first"""
+    limit = max(1, min(limit, 100))
+    items, next_offset, total = match_history.page(fid, offset, limit)
+    for item in items:
+        candidate = candidate_pool.get(item["match_fid"])
+        item["name"] = candidate.name if candidate is not None else None
+    
+    return FastJSONResponse(content={
+        "fid": fid,
+        "total": total,
+        "items": items,
+        "next_offset": next_offset
+    })
+
+
+@app.get("/api/similar/{fid}")
+async def similar_users(fid: str, limit: int = 10):
+    """Users with the most similar trait/token/risk feature vectors"""
+    if fid not in match_index:
+        raise HTTPException(status_code=404, detail="Unknown fid")
+    
+    return FastJSONResponse(content={
+        "fid": fid,
+        "similar": [
+            {"fid": other_fid, "similarity": round(similarity, 4)}
+            for other_fid, similarity in match_index.similar(fid, limit)
+        ]
+    })
+
+
+@app.post("/api/match/batch")
+async def batch_match(
+    request: Request,
+    comedy: bool = False,
+    image: bool = False,
+    concurrency: int = 8
+):
+    """
+    Score many fid pairs, streamed back as NDJSON (one result per line, input order)
+    Body: {"pairs": [[fid1, fid2], ...]} up to BATCH_JSON_MAX_BODY, NDJSON/CSV lines,
+    or a multipart "file" upload
+    """
+    # Operator-only: any fid can be scored, and comedy/image runs spend OpenAI quota and render CPU
+    require_debug_token(request)
+    
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        # A JSON document is parsed whole, so only small batches may use it
+        too_large = HTTPException(status_code=413, detail="JSON batch too large, send NDJSON or CSV lines")
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.batch_json_max_body:
+            raise too_large
+        raw = bytearray()
+        async for chunk in request.stream():
+            raw += chunk
+            if len(raw) > settings.batch_json_max_body:
+                raise too_large
+        try:
+            body = json_loads(bytes(raw) or b"{}")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise HTTPException(status_code=400, detail="Expected {\"pairs\": [...]}")
+        pairs = pairs_from_list(body.get("pairs", []))
+    elif content_type.startswith("multipart/form-data"):
+        # Starlette spools uploads to a temp file, read it back in chunks
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "read"):
+            raise HTTPException(status_code=400, detail="Missing 'file' upload")
+        
+        async def upload_chunks():
+            while True:
+                chunk = await upload.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+        
+        pairs = pairs_from_lines(upload_chunks())
+    else:
+        # NDJSON or CSV lines, parsed as the body arrives while results stream out
+        pairs = pairs_from_lines(request.stream())
+    
+    async def ndjson():
+        try:
+            async for record in batch_scorer.score_pairs(
+                pairs,
+                comedy=comedy,
+                image=image,
+                concurrency=max(1, min(concurrency, 64))
+            ):
+                yield json_dumps(record) + b"\n"
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            # Headers are already sent, report the bad input as the last line
+            yield json_dumps({"error": f"Invalid pair: {e}"}) + b"\n"
+    
+    return RequestStreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.get("/api/export/compatibility")
+async def export_compatibility(request: Request, level: str = "type", format: str = "csv"):
+    """
+    Stream pairwise compatibility as CSV or NDJSON
+    level=type: personality-type matrix, level=user: every user pair in the candidate pool
+    """
+    require_debug_token(request)
+    if level not in ("type", "user") or format not in FORMATS:
+        raise HTTPException(status_code=400, detail="level must be type|user, format must be csv|ndjson")
+    
+    if level == "user":
+        rows, columns = user_pair_rows(candidate_pool), USER_COLUMNS
+    else:
+        rows, columns = type_pair_rows(), TYPE_COLUMNS
+    
+    # Sync generator, so Starlette produces the chunks in a worker thread
+    return StreamingResponse(
+        export_chunks(rows, columns, format),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="compatibility-{level}.{format}"'}
+    )
+
+
+@app.get("/api/leaderboard")
+async def leaderboard(request: Request, level: str = "user", limit: int = 20):
+    """Top compatibility pairs (bounded heap, never materializes the matrix)"""
+    require_debug_token(request)
+    if level not in ("type", "user"):
+        raise HTTPException(status_code=400, detail="level must be type|user")
+    limit = max(1, min(limit, 1000))
+    
+    if level == "user":
+        pairs = await asyncio.to_thread(top_user_pairs, candidate_pool, limit)
+    else:
+        pairs = top_pairs(type_pair_rows(), limit)
+    
+    return FastJSONResponse(content={"level": level, "pairs": pairs})
+
+
+@app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    """Prometheus metrics"""
+    require_debug_token(request)
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return JSONResponse(content={
+    return FastJSONResponse(content={
         "status": "healthy",
         "service": "CryptoMatch",
         "version": "2.0.0",
-        "environment": settings.environment
+        "environment": settings.environment,
+        "tier": overload_controller.tier.name
     })
 
 
@@ -522,12 +1122,86 @@ async def list_personalities():
             "profile": profile
         })
     
-    return JSONResponse(content={
+    return FastJSONResponse(content={
         "count": len(personalities),
         "personalities": personalities
     })
 
 
+def require_debug_token(request: Request):
+    """Reject debug requests unless they carry the configured DEBUG_TOKEN"""
+    if not settings.debug_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    supplied = request.headers.get("x-debug-token", "")
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        supplied = auth[7:]
+    
+    if not hmac.compare_digest(supplied.encode(), settings.debug_token.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 10.0, interval_ms: float = 10.0):
+    """Sample all worker threads for N seconds and return collapsed stacks (flamegraph input)"""
+    require_debug_token(request)
+    
+    # Label the event loop thread so its stacks are easy to find in the flamegraph
+    profiler.label_thread(threading.get_ident(), "event-loop")
+    
+    try:
+        stacks = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return Response(content=profiler.format_collapsed(stacks), media_type="text/plain")
+
+
+@app.get("/debug/memory")
+async def debug_memory(request: Request, top: int = 5):
+    """Approximate memory held by each registered cache/store"""
+    require_debug_token(request)
+    
+    # The walk touches every sampled entry; keep it off the event loop
+    stores = await asyncio.to_thread(memory_accountant.report, top)
+    return FastJSONResponse(content={
+        "stores": stores,
+        "tracemalloc": memory_accountant.status()
+    })
+
+
+@app.post("/debug/memory/snapshot")
+async def debug_memory_snapshot(request: Request, label: Optional[str] = None):
+    """Take a tracemalloc snapshot to diff against later"""
+    require_debug_token(request)
+    
+    label = await asyncio.to_thread(memory_accountant.take_snapshot, label)
+    return FastJSONResponse(content={"label": label, "tracemalloc": memory_accountant.status()})
+
+
+@app.get("/debug/memory/diff")
+async def debug_memory_diff(request: Request, before: str, after: str, top: int = 20):
+    """Allocation growth between two snapshots"""
+    require_debug_token(request)
+    
+    try:
+        stats = await asyncio.to_thread(memory_accountant.diff, before, after, top)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return FastJSONResponse(content={"before": before, "after": after, "top": stats})
+
+
+@app.delete("/debug/memory/snapshot")
+async def debug_memory_stop(request: Request):
+    """Stop tracemalloc and drop snapshots"""
+    require_debug_token(request)
+    
+    memory_accountant.stop_tracing()
+    return FastJSONResponse(content=memory_accountant.status())
+
+
 @app.get("/robots.txt")
 async def robots():
     """Robots.txt for SEO"""
@@ -0,0 +1,213 @@
+"""
+Match History
+Per-user ring of recent matches plus a Bloom filter of everyone already shown,
+so candidate selection can skip repeats in O(1) with fixed memory per user
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+
+from config import settings
+
+
+LEVELS = ("high_match", "medium_match", "low_match")
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)"""
+
+    __slots__ = ("bits", "hashes", "data")
+
+    def __init__(self, bits: int = 2048, hashes: int = 5, data: Optional[bytes] = None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.data[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def clear(self):
+        self.data = bytearray(len(self.data))
+
+
+class UserHistory:
+    """
+    Recent matches (newest last) and a filter of shown match fids
+    The filter is rebuilt from the ring after `filter_capacity` adds, so its false-positive
+    rate stays low (~1% at 200 adds in 2048 bits) and the oldest matches age out
+    """
+
+    __slots__ = ("entries", "seen", "adds", "filter_capacity")
+
+    # version, history size, bloom bytes, hashes, adds since rebuild, entry count
+    HEADER = struct.Struct("<BHHBHH")
+    ENTRY = struct.Struct("<dBB")  # created_at, score, level index (followed by the fid)
+    VERSION = 1
+
+    def __init__(self, size: int = 50, filter_capacity: int = 200, bits: int = 2048, hashes: int = 5):
+        self.entries: deque = deque(maxlen=size)  # (match_fid, score, match_level, created_at)
+        self.seen = BloomFilter(bits, hashes)
+        self.adds = 0
+        self.filter_capacity = filter_capacity
+
+    def add(self, match_fid: str, score: int, match_level: str, created_at: Optional[float] = None):
+        self.entries.append((match_fid, int(score), match_level, created_at or time.time()))
+        if self.adds >= self.filter_capacity:
+            self.seen.clear()
+            for entry in self.entries:
+                self.seen.add(entry[0])
+            self.adds = len(self.entries)
+        else:
+            self.seen.add(match_fid)
+            self.adds += 1
+
+    def __contains__(self, match_fid: str) -> bool:
+        return match_fid in self.seen
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def to_bytes(self) -> bytes:
+        """Compact binary form, the unit written to a shared store"""
+        parts = [self.HEADER.pack(
+            self.VERSION, self.entries.maxlen, len(self.seen.data), self.seen.hashes, self.adds, len(self.entries)
+        ), bytes(self.seen.data)]
+        for match_fid, score, match_level, created_at in self.entries:
+            fid = match_fid.encode()[:255]
+            level = LEVELS.index(match_level) if match_level in LEVELS else 255
+            parts.append(self.ENTRY.pack(created_at, max(0, min(255, score)), level) + bytes([len(fid)]) + fid)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, filter_capacity: int = 200) -> "UserHistory":
+        version, size, bloom_bytes, hashes, adds, count = cls.HEADER.unpack_from(data)
+        if version != cls.VERSION:
+            raise ValueError(f"Unsupported match history version: {version}")
+        offset = cls.HEADER.size
+        history = cls(size, filter_capacity, bloom_bytes * 8, hashes)
+        history.seen = BloomFilter(bloom_bytes * 8, hashes, data[offset:offset + bloom_bytes])
+        offset += bloom_bytes
+        for _ in range(count):
+            created_at, score, level = cls.ENTRY.unpack_from(data, offset)
+            offset += cls.ENTRY.size
+            length = data[offset]
+            match_fid = data[offset + 1:offset + 1 + length].decode()
+            offset += 1 + length
+            history.entries.append((match_fid, score, LEVELS[level] if level < len(LEVELS) else "", created_at))
+        history.adds = adds
+        return history
+
+
+class MatchHistory:
+    """Histories for the most recently active users (LRU-bounded)"""
+
+    VERSION = 1
+
+    def __init__(self, size: int = 50, max_users: int = 100_000, filter_capacity: int = 200):
+        self.size = size
+        self.max_users = max_users
+        self.filter_capacity = filter_capacity
+        self._users: "OrderedDict[str, UserHistory]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get(self, fid: str) -> Optional[UserHistory]:
+        return self._users.get(fid)
+
+    def record(self, fid: str, match_fid: str, score: int, match_level: str, created_at: Optional[float] = None):
+        history = self._users.get(fid)
+        if history is None:
+            history = UserHistory(self.size, self.filter_capacity)
+            self._users[fid] = history
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(fid)
+        history.add(match_fid, score, match_level, created_at)
+
+    def record_result(self, result):
+        """Record a MatchResult under its user"""
+        self.record(result.user_fid, result.match_fid, result.total_score, result.match_level, result.created_at)
+
+    def seen(self, fid: str, match_fid: str) -> bool:
+        """Whether fid was probably shown match_fid already (rare false positives, no false negatives)"""
+        history = self._users.get(fid)
+        return history is not None and match_fid in history
+
+    def skipper(self, fid: str) -> Callable[[str], bool]:
+        """`skip` predicate for TopKMatchIndex.next_match"""
+        history = self._users.get(fid)
+        if history is None:
+            return lambda match_fid: False
+        return history.__contains__
+
+    def page(self, fid: str, offset: int = 0, limit: int = 20) -> Tuple[List[Dict], Optional[int], int]:
+        """Newest-first slice of the history: (items, next offset or None, total)"""
+        history = self._users.get(fid)
+        entries = list(reversed(history.entries)) if history is not None else []
+        offset = max(0, offset)
+        items = [
+            {"match_fid": match_fid, "score": score, "match_level": match_level, "created_at": created_at}
+            for match_fid, score, match_level, created_at in entries[offset:offset + limit]
+        ]
+        next_offset = offset + limit if offset + limit < len(entries) else None
+        return items, next_offset, len(entries)
+
+    def dump(self, fid: str) -> Optional[bytes]:
+        history = self._users.get(fid)
+        return history.to_bytes() if history is not None else None
+
+    def restore(self, fid: str, data: bytes):
+        self._users[fid] = UserHistory.from_bytes(data, self.filter_capacity)
+        self._users.move_to_end(fid)
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": self.VERSION,
+            "users": {fid: base64.b64encode(history.to_bytes()).decode() for fid, history in self._users.items()}
+        }
+
+    def load_dict(self, data: Dict):
+        if data.get("version") != self.VERSION:
+            raise ValueError(f"Unsupported match history version: {data.get('version')}")
+        for fid, encoded in data.get("users", {}).items():
+            self.restore(fid, base64.b64decode(encoded))
+
+    def save(self, path: str):
+        """Write state atomically to a JSON file"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """Load state from a JSON file, returns False if there was nothing usable"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.load_dict(json.load(f))
+        except (ValueError, KeyError, struct.error) as e:
+            print(f"Ignoring match history at {path}: {e}")
+            return False
+        return True
+
+
+# Singleton instance
+match_history = MatchHistory(size=settings.match_history_size)
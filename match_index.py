@@ -0,0 +1,403 @@
+"""
+Precomputed Match Lists
+Keeps a top-K candidate list per feature bucket, updated incrementally as users join and leave
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from bisect import insort
+from collections import OrderedDict
+import json
+import os
+
+from candidate_pool import Candidate, CandidatePool, candidate_pool
+from config import settings
+from matchmaking import matchmaking_engine
+from personality import PersonalityAnalyzer
+from vector_index import FlatIndex
+
+
+class TopKMatchIndex:
+    """
+    Top-K match lists shared by every user in the same feature bucket
+    (same personality type and trait/token masks, so identical scores)
+
+    Joining or leaving only touches the lists the user appears in;
+    next_match() is a cursor step over a ready list
+
+    Users joined from unverified frames are guests: at most max_guests of them
+    are kept, least recently seen leave first, so forged fids can't grow the index
+
+    With vectors and more than retrieval_min buckets, both directions of a join are
+    limited to the buckets a cosine search over bucket embeddings shortlists
+    (retrieval_factor x k): a new list only scores those, and a new user is only offered
+    to their lists (plus lists that aren't full yet) instead of every list
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        pool: CandidatePool,
+        scorer: Callable[[Dict, Dict], float],
+        k: int = 20,
+        vectors: Optional[FlatIndex] = None,
+        max_guests: Optional[int] = None,
+        retrieval_min: Optional[int] = None,
+        retrieval_factor: int = 4,
+        max_scores: int = 100_000
+    ):
+        self.pool = pool
+        self.scorer = scorer
+        self.k = k
+        self.vectors = vectors  # per-user embeddings for similarity retrieval
+        self.buckets: Dict[Tuple, Dict[str, None]] = {}  # bucket -> members (ordered set)
+        self.bucket_of: Dict[str, Tuple] = {}
+        self.lists: Dict[Tuple, List[Tuple[float, str]]] = {}  # bucket -> [(-score, fid)] best first
+        self.listed_in: Dict[str, Set[Tuple]] = {}
+        self.cursors: Dict[str, int] = {}
+        self.max_guests = max_guests
+        self.guests: "OrderedDict[str, None]" = OrderedDict()  # unverified users, oldest first
+        self._reps: Dict[Tuple, Dict] = {}
+        self.max_scores = max_scores
+        self._scores: "OrderedDict[Tuple[Tuple, Tuple], float]" = OrderedDict()  # (a, b) -> score, LRU
+        self._open: Set[Tuple] = set()  # lists with fewer than capacity entries
+        self._bucket_vectors: Dict[Tuple, List[float]] = {}  # same features, same embedding
+        self.retrieval_min = retrieval_min
+        self.retrieval_factor = retrieval_factor
+        self._bucket_index = FlatIndex(vectors.dim) if vectors is not None else None
+        self._bucket_ids: Dict[str, Tuple] = {}
+        self.shortlisted = 0  # lists built from a retrieval shortlist
+
+    @property
+    def capacity(self) -> int:
+        # One spare slot, a bucket's list may contain the asking user
+        return self.k + 1
+
+    def __contains__(self, fid: str) -> bool:
+        return fid in self.bucket_of
+
+    def __len__(self) -> int:
+        return len(self.bucket_of)
+
+    def _score(self, a: Tuple, b: Tuple) -> float:
+        """
+        Score of bucket b from a's side (not symmetric, the base matrix has one-sided entries)
+        Cached per direction in a bounded LRU; a bucket's score only depends on its features,
+        so entries stay valid after the bucket empties and simply age out
+        """
+        key = (a, b)
+        score = self._scores.get(key)
+        if score is None:
+            score = self.scorer(self._reps[a], self._reps[b])
+            self._scores[key] = score
+            if len(self._scores) > self.max_scores:
+                self._scores.popitem(last=False)
+        else:
+            self._scores.move_to_end(key)
+        return score
+
+    def _embed(self, candidate: Candidate):
+        if self.vectors is not None:
+            vector = self._bucket_vectors.get(candidate.feature_key)
+            if vector is None:
+                vector = PersonalityAnalyzer.feature_vector(candidate.to_analysis())
+                self._bucket_vectors[candidate.feature_key] = vector
+            self.vectors.add(candidate.fid, vector)
+
+    def _add_bucket(self, bucket: Tuple, candidate: Candidate):
+        self._reps[bucket] = candidate.to_analysis()
+        if self._bucket_index is not None:
+            self._bucket_ids[repr(bucket)] = bucket
+            self._bucket_index.add(repr(bucket), self._bucket_vectors[bucket])
+
+    def _remove_bucket(self, bucket: Tuple):
+        del self.buckets[bucket]
+        del self._reps[bucket]
+        self._bucket_vectors.pop(bucket, None)
+        if self._bucket_index is not None:
+            self._bucket_ids.pop(repr(bucket), None)
+            self._bucket_index.remove(repr(bucket))
+
+    def _shortlist(self, bucket: Tuple) -> Optional[List[Tuple]]:
+        """Buckets with the most similar embeddings, None while every bucket should be scored"""
+        if (
+            self._bucket_index is None
+            or self.retrieval_min is None
+            or len(self.buckets) <= self.retrieval_min
+        ):
+            return None
+        hits = self._bucket_index.search(self._bucket_vectors[bucket], self.capacity * self.retrieval_factor)
+        shortlist = [self._bucket_ids[hit] for hit, _ in hits]
+        # Too few users behind the shortlist to fill a list: score everyone
+        if sum(len(self.buckets[other]) for other in shortlist) < self.capacity:
+            return None
+        return shortlist
+
+    def _ranked_buckets(self, bucket: Tuple, shortlist: Optional[List[Tuple]] = None) -> List[Tuple]:
+        """Buckets best first from bucket's side, only the shortlisted ones when given"""
+        if shortlist is not None:
+            self.shortlisted += 1
+        candidates = shortlist if shortlist is not None else self.buckets
+        return sorted(candidates, key=lambda other: -self._score(bucket, other))
+
+    def _offer(self, bucket: Tuple, score: float, fid: str):
+        """Insert fid into a bucket's list if it beats the current worst entry"""
+        entries = self.lists[bucket]
+        entry = (-score, fid)
+        if len(entries) >= self.capacity and entry >= entries[-1]:
+            return
+
+        insort(entries, entry)
+        self.listed_in.setdefault(fid, set()).add(bucket)
+        if len(entries) > self.capacity:
+            _, dropped = entries.pop()
+            self._unlist(dropped, bucket)
+        if len(entries) >= self.capacity:
+            self._open.discard(bucket)
+
+    def _unlist(self, fid: str, bucket: Tuple):
+        buckets = self.listed_in.get(fid)
+        if buckets is not None:
+            buckets.discard(bucket)
+            if not buckets:
+                del self.listed_in[fid]
+
+    def _fill(self, bucket: Tuple, shortlist: Optional[List[Tuple]] = None):
+        """(Re)build one bucket's list from the best-scoring buckets"""
+        for _, fid in self.lists.get(bucket, ()):
+            self._unlist(fid, bucket)
+
+        if shortlist is None:
+            shortlist = self._shortlist(bucket)
+        entries = []
+        for other in self._ranked_buckets(bucket, shortlist):
+            score = self._score(bucket, other)
+            for fid in self.buckets[other]:
+                entries.append((-score, fid))
+                if len(entries) >= self.capacity:
+                    break
+            if len(entries) >= self.capacity:
+                break
+
+        entries.sort()
+        self.lists[bucket] = entries
+        for _, fid in entries:
+            self.listed_in.setdefault(fid, set()).add(bucket)
+        self._mark_open(bucket)
+
+    def _mark_open(self, bucket: Tuple):
+        if len(self.lists[bucket]) < self.capacity:
+            self._open.add(bucket)
+        else:
+            self._open.discard(bucket)
+
+    def join(self, candidate: Candidate):
+        """Add (or re-analyze) a user, updating only the lists it can enter"""
+        if candidate.fid in self.bucket_of:
+            self.leave(candidate.fid)
+
+        self.pool.add(candidate)
+        self._embed(candidate)
+        bucket = candidate.feature_key
+        is_new_bucket = bucket not in self.buckets
+        self.buckets.setdefault(bucket, {})[candidate.fid] = None
+        self.bucket_of[candidate.fid] = bucket
+
+        if is_new_bucket:
+            self._add_bucket(bucket, candidate)
+        shortlist = self._shortlist(bucket)
+        if is_new_bucket:
+            self._fill(bucket, shortlist)
+
+        if shortlist is None:
+            others = list(self.lists)
+        else:
+            # Lists the new user can plausibly enter: similar buckets', and any not yet full
+            others = [other for other in dict.fromkeys([*shortlist, *self._open]) if other in self.lists]
+        for other in others:
+            if not (is_new_bucket and other == bucket):
+                self._offer(other, self._score(other, bucket), candidate.fid)
+
+    def ensure_user(self, fid: str, name: Optional[str] = None, verified: bool = True) -> Candidate:
+        """Pool record for fid, analyzing and joining the user on first sight (as a guest if unverified)"""
+        candidate = self.pool.get(fid)
+        if candidate is None or fid not in self.bucket_of:
+            candidate = Candidate.from_analysis(fid, name or f"User #{fid}", PersonalityAnalyzer.analyze_user())
+            self.join(candidate)
+            if not verified:
+                self.guests[fid] = None
+                if self.max_guests is not None and len(self.guests) > self.max_guests:
+                    self.leave(next(iter(self.guests)))
+        elif fid in self.guests:
+            if verified:
+                del self.guests[fid]
+            else:
+                self.guests.move_to_end(fid)
+        return candidate
+
+    def join_many(self, candidates: Iterable[Candidate]):
+        for candidate in candidates:
+            self.join(candidate)
+
+    def leave(self, fid: str):
+        """Remove a user and refill only the lists that contained it"""
+        bucket = self.bucket_of.pop(fid, None)
+        if bucket is None:
+            return
+
+        self.pool.remove(fid)
+        if self.vectors is not None:
+            self.vectors.remove(fid)
+        self.cursors.pop(fid, None)
+        self.guests.pop(fid, None)
+        members = self.buckets[bucket]
+        del members[fid]
+
+        if not members:
+            self._remove_bucket(bucket)
+            for _, listed in self.lists.pop(bucket, ()):
+                self._unlist(listed, bucket)
+            self._open.discard(bucket)
+
+        for affected in self.listed_in.pop(fid, set()):
+            if affected in self.lists:
+                self._fill(affected)
+
+    def next_match(
+        self,
+        fid: str,
+        skip: Optional[Callable[[str], bool]] = None,
+        advance: bool = True
+    ) -> Optional[str]:
+        """
+        Next candidate from the user's ready list (round robin per fid)
+        `skip` can reject candidates, e.g. ones the user has already seen;
+        advance=False only peeks (speculative work commits with consume() once served)
+        """
+        bucket = self.bucket_of.get(fid)
+        entries = self.lists.get(bucket) if bucket is not None else None
+        if not entries:
+            return None
+
+        size = len(entries)
+        cursor = self.cursors.get(fid, 0)
+        fallback = None
+        fallback_step = 0
+        for step in range(size):
+            candidate = entries[(cursor + step) % size][1]
+            if candidate == fid:
+                continue
+            if skip is not None and skip(candidate):
+                if fallback is None:
+                    fallback, fallback_step = candidate, step
+                continue
+            if advance:
+                self.cursors[fid] = (cursor + step + 1) % size
+            return candidate
+
+        # Everyone on the list was skipped: repeat rather than return nothing, and move past
+        # the repeat so later calls rotate through the list (least recently shown first)
+        if fallback is not None and advance:
+            self.cursors[fid] = (cursor + fallback_step + 1) % size
+        return fallback
+
+    def consume(self, fid: str, candidate: str):
+        """Move fid's cursor past a candidate picked with advance=False, now that it was served"""
+        bucket = self.bucket_of.get(fid)
+        entries = self.lists.get(bucket) if bucket is not None else None
+        if not entries:
+            return
+        for position, (_, other) in enumerate(entries):
+            if other == candidate:
+                self.cursors[fid] = (position + 1) % len(entries)
+                return
+
+    def top(self, fid: str, n: Optional[int] = None) -> List[Tuple[str, float]]:
+        """The user's precomputed list as (fid, score) pairs"""
+        bucket = self.bucket_of.get(fid)
+        entries = self.lists.get(bucket, []) if bucket is not None else []
+        result = [(other, -neg_score) for neg_score, other in entries if other != fid]
+        return result[:n or self.k]
+
+    def similar(self, fid: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Users with the most similar feature vectors (cosine), excluding fid itself"""
+        if self.vectors is None or fid not in self.vectors:
+            return []
+        return self.vectors.search(self.vectors.vector(fid), k, exclude=fid)
+
+    def to_dict(self) -> Dict:
+        """Serializable state; lists are keyed by one member fid of their bucket"""
+        return {
+            "version": self.VERSION,
+            "k": self.k,
+            "candidates": self.pool.to_list(),
+            "lists": [
+                [next(iter(self.buckets[bucket])), [[-neg, fid] for neg, fid in entries]]
+                for bucket, entries in self.lists.items()
+                if bucket in self.buckets
+            ],
+            "cursors": self.cursors,
+            "guests": list(self.guests)
+        }
+
+    def load_dict(self, data: Dict):
+        """Restore state saved by to_dict(), recomputing only lists that didn't survive"""
+        if data.get("version") != self.VERSION:
+            raise ValueError(f"Unsupported match index version: {data.get('version')}")
+
+        for record in data.get("candidates", []):
+            candidate = Candidate.from_dict(record)
+            self.pool.add(candidate)
+            self._embed(candidate)
+            bucket = candidate.feature_key
+            if bucket not in self.buckets:
+                self._add_bucket(bucket, candidate)
+            self.buckets.setdefault(bucket, {})[candidate.fid] = None
+            self.bucket_of[candidate.fid] = bucket
+
+        for rep_fid, entries in data.get("lists", []):
+            bucket = self.bucket_of.get(rep_fid)
+            if bucket is None:
+                continue
+            restored = [(-score, fid) for score, fid in entries if fid in self.bucket_of]
+            restored.sort()
+            self.lists[bucket] = restored[:self.capacity]
+            for _, fid in self.lists[bucket]:
+                self.listed_in.setdefault(fid, set()).add(bucket)
+            self._mark_open(bucket)
+
+        for bucket in self.buckets:
+            if bucket not in self.lists:
+                self._fill(bucket)
+
+        self.cursors.update({fid: cursor for fid, cursor in data.get("cursors", {}).items() if fid in self.bucket_of})
+        self.guests.update((fid, None) for fid in data.get("guests", []) if fid in self.bucket_of)
+
+    def save(self, path: str):
+        """Write state atomically to a JSON file"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """Load state from a JSON file, returns False if there was nothing usable"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.load_dict(json.load(f))
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring match index at {path}: {e}")
+            return False
+        return True
+
+
+# Singleton instance
+match_index = TopKMatchIndex(
+    candidate_pool,
+    matchmaking_engine.rank_score,
+    k=settings.match_top_k,
+    vectors=FlatIndex(PersonalityAnalyzer.FEATURE_DIMS),
+    max_guests=settings.max_unverified_users,
+    retrieval_min=settings.match_retrieval_buckets if settings.match_retrieval_buckets >= 0 else None
+)
@@ -0,0 +1,188 @@
+"""
+Compact Match Result Model
+Slotted match result that references shared profiles instead of copying them
+"""
+from typing import Dict, Optional, Tuple
+from datetime import datetime, timezone
+import time
+
+from config import settings
+from image_generator import IMAGE_VARIANTS, VARIANT_FORMAT
+from personality import PersonalityAnalyzer, PersonalityType
+
+
+# Order of the scores tuple, matches MatchmakingEngine.weights
+BREAKDOWN_KEYS = (
+    "personality_base",
+    "token_overlap",
+    "risk_tolerance",
+    "trait_similarity",
+    "community_vibe"
+)
+
+
+class MatchResult:
+    """
+    One generated match
+    Profiles are referenced by PersonalityType and the image by its store key,
+    so a result costs a few hundred bytes; to_dict() rebuilds the full JSON shape
+    """
+
+    __slots__ = (
+        "user_fid", "user_name", "user_type", "user_confidence",
+        "match_fid", "match_name", "match_type", "match_confidence",
+        "total_score", "match_level", "scores", "common_tokens",
+        "comedy", "date_idea", "image_key", "share_text", "created_at"
+    )
+    
+    VERSION = 1  # to_record() layout, bump when __slots__ change
+
+    def __init__(
+        self,
+        user_fid: str,
+        user_name: str,
+        user_type: PersonalityType,
+        user_confidence: int,
+        match_fid: str,
+        match_name: str,
+        match_type: PersonalityType,
+        match_confidence: int,
+        total_score: int,
+        match_level: str,
+        scores: Tuple[float, ...],
+        common_tokens: Tuple[str, ...],
+        comedy: str,
+        date_idea: str,
+        image_key: Optional[str],
+        share_text: str,
+        created_at: Optional[float] = None
+    ):
+        self.user_fid = user_fid
+        self.user_name = user_name
+        self.user_type = user_type
+        self.user_confidence = user_confidence
+        self.match_fid = match_fid
+        self.match_name = match_name
+        self.match_type = match_type
+        self.match_confidence = match_confidence
+        self.total_score = total_score
+        self.match_level = match_level
+        self.scores = scores
+        self.common_tokens = common_tokens
+        self.comedy = comedy
+        self.date_idea = date_idea
+        self.image_key = image_key
+        self.share_text = share_text
+        self.created_at = created_at if created_at is not None else time.time()
+
+    def __repr__(self) -> str:
+        return (
+            f"MatchResult(user_fid={self.user_fid!r}, match_fid={self.match_fid!r}, "
+            f"total_score={self.total_score}, match_level={self.match_level!r})"
+        )
+
+    def replace(self, **changes) -> "MatchResult":
+        """Return a copy with some fields changed"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return MatchResult(**values)
+
+    def to_record(self) -> list:
+        """Compact JSON-able form in __slots__ order (warm-cache snapshots)"""
+        record = [getattr(self, name) for name in self.__slots__]
+        record[2] = self.user_type.value
+        record[6] = self.match_type.value
+        record[10] = list(self.scores)
+        record[11] = list(self.common_tokens)
+        return record
+
+    @classmethod
+    def from_record(cls, record: list) -> "MatchResult":
+        values = dict(zip(cls.__slots__, record))
+        values["user_type"] = PersonalityType(values["user_type"])
+        values["match_type"] = PersonalityType(values["match_type"])
+        values["scores"] = tuple(values["scores"])
+        values["common_tokens"] = tuple(values["common_tokens"])
+        return cls(**values)
+
+    @property
+    def user_profile(self) -> Dict:
+        return PersonalityAnalyzer.get_personality_profile(self.user_type)
+
+    @property
+    def match_profile(self) -> Dict:
+        return PersonalityAnalyzer.get_personality_profile(self.match_type)
+
+    @property
+    def breakdown(self) -> Dict[str, float]:
+        return dict(zip(BREAKDOWN_KEYS, self.scores))
+
+    @property
+    def image_url(self) -> Optional[str]:
+        if not self.image_key:
+            return None
+        return f"{settings.base_url}/image/{self.image_key}.png"
+
+    def image_variant_url(self, variant: str, fmt: str = VARIANT_FORMAT) -> Optional[str]:
+        if not self.image_key:
+            return None
+        return f"{settings.base_url}/image/{variant}/{self.image_key}.{fmt}"
+
+    @property
+    def image_variants(self) -> Dict[str, Optional[str]]:
+        """Smaller renditions of the image, for clients that don't need the full frame size"""
+        return {variant: self.image_variant_url(variant) for variant in IMAGE_VARIANTS if variant != "full"}
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.created_at, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _personality_dict(self, personality_type: PersonalityType, confidence: int) -> Dict:
+        return {
+            "personality_type": personality_type,
+            "profile": PersonalityAnalyzer.get_personality_profile(personality_type),
+            "metadata": {
+                "analyzed_at": self.timestamp[:10],
+                "confidence": confidence
+            }
+        }
+
+    def to_dict(self) -> Dict:
+        """Serialize to the match result JSON shape"""
+        profile1 = self.user_profile
+        profile2 = self.match_profile
+
+        return {
+            "user": {
+                "fid": self.user_fid,
+                "name": self.user_name,
+                "personality": self._personality_dict(self.user_type, self.user_confidence)
+            },
+            "match": {
+                "fid": self.match_fid,
+                "name": self.match_name,
+                "personality": self._personality_dict(self.match_type, self.match_confidence)
+            },
+            "compatibility": {
+                "total_score": self.total_score,
+                "match_level": self.match_level,
+                "breakdown": self.breakdown,
+                "common_tokens": list(self.common_tokens),
+                "comedy": self.comedy,
+                "date_idea": self.date_idea,
+                "image_url": self.image_url,
+                "image_variants": self.image_variants,
+                "personality1": {
+                    "type": self.user_type,
+                    "title": profile1.get("title", "Unknown"),
+                    "emoji": profile1.get("emoji", "💫")
+                },
+                "personality2": {
+                    "type": self.match_type,
+                    "title": profile2.get("title", "Unknown"),
+                    "emoji": profile2.get("emoji", "💫")
+                }
+            },
+            "share_text": self.share_text,
+            "timestamp": self.timestamp
+        }
@@ -2,11 +2,17 @@
 Advanced Matchmaking Algorithm
 Calculates compatibility scores with multiple factors
 """
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from personality import PersonalityAnalyzer, PersonalityType, RiskLevel
 from comedy_generator import comedy_generator
 from image_generator import image_generator
+from match_result import MatchResult, BREAKDOWN_KEYS
+from render_jobs import render_jobs
+from overload import Tier, overload_controller
+from vocabulary import jaccard
+import asyncio
 import random
+import secrets
 
 
 class MatchmakingEngine:
@@ -48,41 +54,60 @@ class MatchmakingEngine:
         
         return scored_matches[:top_n]
     
-    async def calculate_compatibility(
-        self,
-        user1: Dict,
-        user2: Dict
-    ) -> Dict:
+    def pair_factors(self, user1: Dict, user2: Dict) -> Tuple[Dict, List[str], float]:
         """
-        Calculate detailed compatibility between two users
+        Deterministic factor scores, common tokens and their weighted score for a pair
+        The score is rank_score; score_compatibility adds the community vibe on top
         """
-        # Get personality profiles
-        profile1 = user1.get("profile", {})
-        profile2 = user2.get("profile", {})
-        
         personality1 = user1.get("personality_type", PersonalityType.BITCOIN_MAXI)
         personality2 = user2.get("personality_type", PersonalityType.BITCOIN_MAXI)
         
+        # Bitmasks from the analysis, falling back to the profile's
+        masks1 = self.personality_analyzer.get_profile_masks(personality1)
+        masks2 = self.personality_analyzer.get_profile_masks(personality2)
+        trait_mask1 = user1.get("trait_mask", masks1["trait_mask"])
+        trait_mask2 = user2.get("trait_mask", masks2["trait_mask"])
+        
         # Get compatibility factors
         factors = self.personality_analyzer.get_compatibility_factors(
             personality1,
-            personality2
+            personality2,
+            user1.get("token_mask"),
+            user2.get("token_mask")
         )
         
-        # Calculate weighted score
         scores = {
             "personality_base": factors["base_compatibility"],
             "token_overlap": factors["token_compatibility"],
             "risk_tolerance": factors["risk_compatibility"],
-            "trait_similarity": self._calculate_trait_similarity(profile1, profile2),
-            "community_vibe": random.randint(60, 95)  # Placeholder for real community data
+            "trait_similarity": self._calculate_trait_similarity(trait_mask1, trait_mask2)
         }
+        score = sum(scores[key] * self.weights[key] for key in scores)
+        return scores, factors["common_tokens"], score
+    
+    def rank_score(self, user1: Dict, user2: Dict) -> float:
+        """
+        Deterministic score used to rank candidates
+        Leaves out the random community vibe placeholder so rankings are stable
+        """
+        return self.pair_factors(user1, user2)[2]
+    
+    def score_compatibility(
+        self,
+        user1: Dict,
+        user2: Dict
+    ) -> Dict:
+        """
+        Score two users without generating comedy or images
+        """
+        # Get personality profiles
+        profile1 = user1.get("profile", {})
+        profile2 = user2.get("profile", {})
         
-        # Calculate total weighted score
-        total_score = sum(
-            scores[key] * self.weights[key]
-            for key in scores.keys()
-        )
+        # Calculate weighted score
+        scores, common_tokens, total_score = self.pair_factors(user1, user2)
+        scores["community_vibe"] = random.randint(60, 95)  # Placeholder for real community data
+        total_score += scores["community_vibe"] * self.weights["community_vibe"]
         
         # Round to integer
         total_score = int(round(total_score))
@@ -95,6 +120,31 @@ class MatchmakingEngine:
         else:
             match_level = "low_match"
         
+        return {
+            "total_score": total_score,
+            "match_level": match_level,
+            "breakdown": scores,
+            "common_tokens": common_tokens,
+            "personality1": user1.get("personality_type", PersonalityType.BITCOIN_MAXI),
+            "personality2": user2.get("personality_type", PersonalityType.BITCOIN_MAXI),
+            "profile1": profile1,
+            "profile2": profile2
+        }
+    
+    async def calculate_compatibility(
+        self,
+        user1: Dict,
+        user2: Dict
+    ) -> Dict:
+        """
+        Calculate detailed compatibility between two users
+        """
+        score = self.score_compatibility(user1, user2)
+        profile1 = score["profile1"]
+        profile2 = score["profile2"]
+        total_score = score["total_score"]
+        match_level = score["match_level"]
+        
         # Generate comedy and date idea
         comedy = await comedy_generator.generate_match_comedy(
             profile1,
@@ -117,82 +167,177 @@ class MatchmakingEngine:
         return {
             "total_score": total_score,
             "match_level": match_level,
-            "breakdown": scores,
-            "common_tokens": factors["common_tokens"],
+            "breakdown": score["breakdown"],
+            "common_tokens": score["common_tokens"],
             "comedy": comedy,
             "date_idea": date_idea,
             "image_url": image_url,
             "personality1": {
-                "type": personality1,
+                "type": score["personality1"],
                 "title": profile1.get("title", "Unknown"),
                 "emoji": profile1.get("emoji", "💫")
             },
             "personality2": {
-                "type": personality2,
+                "type": score["personality2"],
                 "title": profile2.get("title", "Unknown"),
                 "emoji": profile2.get("emoji", "💫")
             }
         }
     
-    def _calculate_trait_similarity(self, profile1: Dict, profile2: Dict) -> float:
-        """Calculate similarity between personality traits"""
-        traits1 = set(profile1.get("traits", []))
-        traits2 = set(profile2.get("traits", []))
-        
-        if not traits1 or not traits2:
+    def _calculate_trait_similarity(self, trait_mask1: int, trait_mask2: int) -> float:
+        """Calculate similarity between personality trait bitmasks"""
+        if not trait_mask1 or not trait_mask2:
             return 50.0
         
-        # Calculate Jaccard similarity
-        intersection = len(traits1 & traits2)
-        union = len(traits1 | traits2)
-        
-        similarity = (intersection / union) * 100 if union > 0 else 0
-        
-        return similarity
+        # Jaccard similarity via popcount
+        return jaccard(trait_mask1, trait_mask2) * 100
     
-    async def generate_match_result(
+    def _start_result(
         self,
         user_fid: str,
         match_fid: str,
-        user_name: str = "You",
-        match_name: str = "Your Match"
-    ) -> Dict:
+        user_name: str,
+        match_name: str,
+        user_analysis: Optional[Dict] = None,
+        match_analysis: Optional[Dict] = None
+    ) -> Tuple[MatchResult, Dict]:
+        """Analyze and score a pair; comedy, share text and image are filled in later"""
+        # Analyze both users (unless the candidate pool already has them)
+        user_analysis = user_analysis or self.personality_analyzer.analyze_user()
+        match_analysis = match_analysis or self.personality_analyzer.analyze_user()
+        
+        # Calculate compatibility
+        score = self.score_compatibility(user_analysis, match_analysis)
+        
+        result = MatchResult(
+            user_fid=user_fid,
+            user_name=user_name,
+            user_type=user_analysis["personality_type"],
+            user_confidence=user_analysis["metadata"]["confidence"],
+            match_fid=match_fid,
+            match_name=match_name,
+            match_type=match_analysis["personality_type"],
+            match_confidence=match_analysis["metadata"]["confidence"],
+            total_score=score["total_score"],
+            match_level=score["match_level"],
+            scores=tuple(score["breakdown"][key] for key in BREAKDOWN_KEYS),
+            common_tokens=tuple(score["common_tokens"]),
+            comedy="",
+            date_idea="",
+            image_key=None,
+            share_text=""
+        )
+        return result, score
+    
+    async def _finish_result(
+        self,
+        result: MatchResult,
+        score: Dict,
+        tier: Optional[Tier] = None,
+        render: bool = True
+    ) -> MatchResult:
         """
-        Generate complete match result for Frame display
+        Generate comedy, share text and the rendered image for a scored result
+        `tier` picks the comedy/image quality (the overload controller's current tier by default);
+        render=False leaves the image for render_result()
         """
-        # Analyze both users
-        user_analysis = self.personality_analyzer.analyze_user()
-        match_analysis = self.personality_analyzer.analyze_user()
+        profile1 = score["profile1"]
+        profile2 = score["profile2"]
+        tier = tier or overload_controller.tier
         
-        # Calculate compatibility
-        compatibility = await self.calculate_compatibility(
-            user_analysis,
-            match_analysis
+        comedy = await comedy_generator.generate_match_comedy(
+            profile1,
+            profile2,
+            result.total_score,
+            result.match_level,
+            mode=tier.comedy
         )
+        date_idea = await comedy_generator.generate_date_idea(profile1, profile2)
+        
+        # Render into the image store, the result only keeps the key
+        image_key = None
+        if render:
+            image_key = await image_generator.store_match_image_async(
+                profile1,
+                profile2,
+                result.total_score,
+                result.match_level,
+                comedy,
+                mode=tier.image
+            )
+        if result.image_key and image_key:
+            # Progressive results already handed out a job key, point it at the render
+            image_generator.store.put(result.image_key, image_generator.store.get(image_key))
+            image_key = result.image_key
         
         # Generate share text
         share_text = await comedy_generator.generate_viral_share_text(
-            user_name,
-            match_name,
-            compatibility["total_score"],
-            compatibility["comedy"]
+            result.user_name,
+            result.match_name,
+            result.total_score,
+            comedy
         )
         
-        return {
-            "user": {
-                "fid": user_fid,
-                "name": user_name,
-                "personality": user_analysis
-            },
-            "match": {
-                "fid": match_fid,
-                "name": match_name,
-                "personality": match_analysis
-            },
-            "compatibility": compatibility,
-            "share_text": share_text,
-            "timestamp": "2025-10-23T00:00:00Z"
-        }
+        return result.replace(
+            comedy=comedy,
+            date_idea=date_idea,
+            image_key=image_key,
+            share_text=share_text
+        )
+    
+    async def generate_match_result(
+        self,
+        user_fid: str,
+        match_fid: str,
+        user_name: str = "You",
+        match_name: str = "Your Match",
+        user_analysis: Optional[Dict] = None,
+        match_analysis: Optional[Dict] = None,
+        tier: Optional[Tier] = None,
+        render: bool = True
+    ) -> MatchResult:
+        """
+        Generate complete match result for Frame display
+        """
+        result, score = self._start_result(
+            user_fid, match_fid, user_name, match_name, user_analysis, match_analysis
+        )
+        return await self._finish_result(result, score, tier, render)
+    
+    async def render_result(self, result: MatchResult, tier: Optional[Tier] = None) -> MatchResult:
+        """Render the image of a result finished with render=False"""
+        tier = tier or overload_controller.tier
+        image_key = await image_generator.store_match_image_async(
+            result.user_profile,
+            result.match_profile,
+            result.total_score,
+            result.match_level,
+            result.comedy,
+            mode=tier.image
+        )
+        return result.replace(image_key=image_key)
+    
+    def start_match_result(
+        self,
+        user_fid: str,
+        match_fid: str,
+        user_name: str = "You",
+        match_name: str = "Your Match",
+        user_analysis: Optional[Dict] = None,
+        match_analysis: Optional[Dict] = None,
+        tier: Optional[Tier] = None
+    ) -> Tuple[MatchResult, asyncio.Task]:
+        """
+        Score a match now and finish comedy/image in a background task
+        The partial result already carries the image key the render will be stored under
+        """
+        result, score = self._start_result(
+            user_fid, match_fid, user_name, match_name, user_analysis, match_analysis
+        )
+        result = result.replace(image_key=f"job-{secrets.token_hex(10)}")
+        task = asyncio.create_task(self._finish_result(result, score, tier))
+        render_jobs.track(result.image_key, task)
+        return result, task
 
 
 # Singleton instance
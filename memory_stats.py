@@ -0,0 +1,165 @@
+"""
+Memory Accounting
+Approximate per-store memory usage and tracemalloc snapshot diffs for leak hunting
+"""
+from typing import Any, Callable, Dict, List, Optional, Union
+from collections import OrderedDict
+from enum import Enum
+from itertools import islice
+import heapq
+import sys
+import time
+import tracemalloc
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None, ignore: Optional[set] = None) -> int:
+    """
+    Approximate the number of bytes reachable from obj
+    Objects whose id is in `ignore` (shared, long-lived data) are not counted
+    """
+    if seen is None:
+        seen = set()
+    ignore = ignore or set()
+
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        obj_id = id(current)
+        if obj_id in seen or obj_id in ignore or isinstance(current, (type, Enum)):
+            continue
+        seen.add(obj_id)
+        size += sys.getsizeof(current)
+
+        if isinstance(current, (str, bytes, bytearray, int, float, bool)) or current is None:
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            if hasattr(current, "__dict__"):
+                stack.append(vars(current))
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+
+    return size
+
+
+class MemoryAccountant:
+    """Tracks registered caches/stores and tracemalloc snapshots"""
+
+    MAX_SNAPSHOTS = 4
+
+    def __init__(self):
+        self.stores: Dict[str, Union[Dict, Callable[[], Dict]]] = {}
+        self.snapshots: "OrderedDict[str, tuple]" = OrderedDict()
+        self._ignore: set = set()
+
+    def register(self, name: str, store: Union[Dict, Callable[[], Dict]]):
+        """Register a mapping (or a callable returning one) to be reported on"""
+        self.stores[name] = store
+
+    def ignore_shared(self, obj: Any):
+        """Exclude shared long-lived data (e.g. personality profiles) from per-entry sizes"""
+        seen = set()
+        deep_sizeof(obj, seen=seen)
+        self._ignore.update(seen)
+
+    def report(self, top: int = 5, sample_size: int = 2000) -> Dict:
+        """
+        Report entries, approximate bytes and largest entries for each store
+        Large stores are sampled and the total extrapolated. Safe to run in a worker
+        thread: a store that changes size mid-walk is retried, then reported as busy
+        """
+        result = {}
+        for name, store in list(self.stores.items()):
+            for _ in range(3):
+                try:
+                    mapping = store() if callable(store) else store
+                    entries = len(mapping)
+                    sizes = [
+                        (deep_sizeof(value, ignore=self._ignore) + sys.getsizeof(key), key)
+                        for key, value in list(islice(mapping.items(), sample_size))
+                    ]
+                    break
+                except RuntimeError:  # "changed size during iteration"
+                    sizes = None
+            if sizes is None:
+                result[name] = {"error": "changed during the walk, try again"}
+                continue
+            sampled = len(sizes)
+            sampled_bytes = sum(size for size, _ in sizes)
+            avg = sampled_bytes / sampled if sampled else 0
+            container = sys.getsizeof(mapping)
+
+            result[name] = {
+                "entries": entries,
+                "sampled": sampled,
+                "approx_bytes": int(container + avg * entries),
+                "avg_entry_bytes": int(avg),
+                "largest": [
+                    {"key": str(key), "bytes": size}
+                    for size, key in heapq.nlargest(top, sizes, key=lambda item: item[0])
+                ]
+            }
+
+        return result
+
+    def take_snapshot(self, label: Optional[str] = None, frames: int = 5) -> str:
+        """Take a tracemalloc snapshot (starting tracing on first use)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+        label = label or f"snap-{int(time.time())}"
+        self.snapshots[label] = (time.time(), tracemalloc.take_snapshot())
+        self.snapshots.move_to_end(label)
+        while len(self.snapshots) > self.MAX_SNAPSHOTS:
+            self.snapshots.popitem(last=False)
+
+        return label
+
+    def diff(self, before: str, after: str, top: int = 20) -> List[Dict]:
+        """Top allocation sites that grew between two snapshots"""
+        if before not in self.snapshots or after not in self.snapshots:
+            raise KeyError(f"Unknown snapshot label(s): {before}, {after}")
+
+        old = self.snapshots[before][1]
+        new = self.snapshots[after][1]
+        stats = new.compare_to(old, "lineno")
+
+        return [
+            {
+                "location": str(stat.traceback[0]) if stat.traceback else "?",
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count
+            }
+            for stat in stats[:top]
+        ]
+
+    def stop_tracing(self):
+        """Stop tracemalloc and drop stored snapshots"""
+        self.snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def status(self) -> Dict:
+        """Current tracemalloc status"""
+        if not tracemalloc.is_tracing():
+            return {"tracing": False, "snapshots": list(self.snapshots)}
+
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "snapshots": list(self.snapshots)
+        }
+
+
+# Singleton instance
+memory_accountant = MemoryAccountant()
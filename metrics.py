@@ -0,0 +1,111 @@
+"""
+Metrics
+Process-local counters and gauges rendered in the Prometheus text format
+"""
+from typing import Callable, Dict, List, Sequence, Tuple
+import threading
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()  # render threads increment too
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(tuple(str(label) for label in labels), 0)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[tuple(str(label) for label in labels)] = value
+
+
+class CallbackMetric:
+    """Metric read from a function at scrape time (sizes, counters kept elsewhere)"""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.labelnames = ()
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        try:
+            return [((), float(self.fn()))]
+        except Exception as e:
+            print(f"Metric {self.name} failed: {e}")
+            return []
+
+
+class MetricsRegistry:
+    """Named metrics; get-or-create so modules can share one counter"""
+
+    def __init__(self, prefix: str = "cryptomatch_"):
+        self.prefix = prefix
+        self._metrics: Dict[str, object] = {}
+
+    def _get(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(self.prefix + name, *args, **kwargs)
+            self._metrics[name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labelnames)
+
+    def register_callback(self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge"):
+        self._metrics[name] = CallbackMetric(self.prefix + name, help, fn, kind)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in metric.samples():
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+metrics = MetricsRegistry()
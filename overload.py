@@ -0,0 +1,175 @@
+"""
+Overload Control
+Measures event-loop lag, in-flight match requests and the render backlog, and steps
+the match pipeline down through cheaper quality tiers (and back up, with hysteresis)
+"""
+from typing import Callable, Dict, NamedTuple, Optional
+from contextlib import contextmanager
+import asyncio
+import time
+
+from comedy_generator import COMEDY_AI, COMEDY_CACHED, COMEDY_TEMPLATE
+from image_generator import IMAGE_ATLAS, IMAGE_FULL, IMAGE_STATIC, image_generator
+from render_jobs import render_jobs
+from metrics import metrics
+from config import settings
+
+
+class Tier(NamedTuple):
+    name: str
+    comedy: str
+    image: str
+
+
+# Quality tiers, best first
+TIERS = (
+    Tier("full", COMEDY_AI, IMAGE_FULL),
+    Tier("reduced", COMEDY_CACHED, IMAGE_ATLAS),
+    Tier("minimal", COMEDY_TEMPLATE, IMAGE_STATIC)
+)
+
+
+class OverloadController:
+    """
+    Picks the pipeline tier from load signals
+    Pressure is the largest signal/threshold ratio; at >= 1 the tier steps down (at most once
+    per `step_down_hold` seconds), below `recover_ratio` for `step_up_hold` seconds it steps up
+    """
+
+    def __init__(
+        self,
+        lag_high: float = 0.1,
+        inflight_high: int = 64,
+        backlog_high: int = 16,
+        recover_ratio: float = 0.5,
+        step_down_hold: float = 1.0,
+        step_up_hold: float = 5.0,
+        interval: float = 0.1,
+        backlog: Optional[Callable[[], int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        enabled: bool = True
+    ):
+        self.lag_high = lag_high
+        self.inflight_high = inflight_high
+        self.backlog_high = backlog_high
+        self.recover_ratio = recover_ratio
+        self.step_down_hold = step_down_hold
+        self.step_up_hold = step_up_hold
+        self.interval = interval
+        self.backlog = backlog or (lambda: 0)
+        self.clock = clock
+        self.enabled = enabled
+
+        self.level = 0  # index into TIERS
+        self.lag = 0.0  # smoothed event-loop lag, seconds
+        self.inflight = 0
+        self._changed_at = clock()
+        self._calm_since: Optional[float] = None
+        self._monitor: Optional[asyncio.Task] = None
+
+        self.tier_gauge = metrics.gauge("overload_tier", "Match pipeline quality tier (0 = full)")
+        self.transitions = metrics.counter(
+            "overload_transitions_total",
+            "Quality tier changes",
+            ("from_tier", "to_tier")
+        )
+        self.lag_gauge = metrics.gauge("event_loop_lag_seconds", "Smoothed event-loop scheduling lag")
+        self.tier_gauge.set(0)
+        self.lag_gauge.set(0)
+
+    @property
+    def tier(self) -> Tier:
+        return TIERS[self.level]
+
+    def signals(self) -> Dict[str, float]:
+        return {"lag": self.lag, "inflight": self.inflight, "backlog": self.backlog()}
+
+    def pressure(self) -> float:
+        """Largest signal relative to its threshold (1.0 = at the limit)"""
+        signals = self.signals()
+        return max(
+            signals["lag"] / self.lag_high,
+            signals["inflight"] / self.inflight_high,
+            signals["backlog"] / self.backlog_high
+        )
+
+    def observe_lag(self, lag: float):
+        """Fold one lag sample in (EWMA, so a single slow callback doesn't flip tiers)"""
+        self.lag = 0.7 * self.lag + 0.3 * max(0.0, lag)
+        self.lag_gauge.set(round(self.lag, 6))
+
+    def evaluate(self) -> Tier:
+        """Apply at most one tier step for the current pressure"""
+        if not self.enabled:
+            return self.tier
+
+        now = self.clock()
+        pressure = self.pressure()
+        if pressure >= 1.0:
+            self._calm_since = None
+            if self.level < len(TIERS) - 1 and now - self._changed_at >= self.step_down_hold:
+                self._set_level(self.level + 1, now, pressure)
+        elif pressure < self.recover_ratio:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif self.level > 0 and now - max(self._calm_since, self._changed_at) >= self.step_up_hold:
+                self._set_level(self.level - 1, now, pressure)
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        return self.tier
+
+    def _set_level(self, level: int, now: float, pressure: float):
+        old = self.tier
+        self.level = level
+        self._changed_at = now
+        self.tier_gauge.set(level)
+        self.transitions.inc(old.name, self.tier.name)
+        print(f"Overload: {old.name} -> {self.tier.name} (pressure {pressure:.2f})")
+
+    @contextmanager
+    def request(self):
+        """Count an in-flight match request; yields the tier to serve it at"""
+        self.inflight += 1
+        try:
+            yield self.evaluate()
+        finally:
+            self.inflight -= 1
+
+    async def _run(self):
+        while True:
+            start = self.clock()
+            await asyncio.sleep(self.interval)
+            self.observe_lag(self.clock() - start - self.interval)
+            self.evaluate()
+
+    def start(self):
+        """Start sampling event-loop lag (call from a running loop)"""
+        if self.enabled and (self._monitor is None or self._monitor.done()):
+            self._monitor = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+
+
+# Singleton instance
+overload_controller = OverloadController(
+    lag_high=settings.overload_lag_high,
+    inflight_high=settings.overload_inflight_high,
+    backlog_high=settings.overload_backlog_high,
+    step_up_hold=settings.overload_recover_seconds,
+    backlog=lambda: len(render_jobs) + image_generator.pending_renders,
+    enabled=settings.overload_control
+)
+metrics.register_callback(
+    "match_requests_inflight", "Match requests being served", lambda: overload_controller.inflight
+)
+metrics.register_callback(
+    "render_backlog", "Match renders and background finishes pending", overload_controller.backlog
+)
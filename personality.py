@@ -2,10 +2,14 @@
 Crypto Personality Analyzer
 Analyzes user's crypto personality based on their behavior
 """
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import Counter
 import random
+import re
 from enum import Enum
 
+from vocabulary import trait_vocab, token_vocab, popcount
+
 
 class RiskLevel(str, Enum):
     """Risk tolerance levels"""
@@ -26,6 +30,16 @@ class PersonalityType(str, Enum):
     SHITCOIN_SURFER = "shitcoin_surfer"
 
 
+def _set_bits(mask: int):
+    """Indices of set bits in a mask"""
+    bit = 0
+    while mask:
+        if mask & 1:
+            yield bit
+        mask >>= 1
+        bit += 1
+
+
 class PersonalityAnalyzer:
     """Analyzes and generates crypto personalities"""
     
@@ -104,6 +118,35 @@ class PersonalityAnalyzer:
         }
     }
     
+    # Words in casts that point at a personality (profile token symbols count too)
+    CAST_KEYWORDS = {
+        PersonalityType.BITCOIN_MAXI: ("bitcoin", "sats", "satoshi", "hodl", "halving", "maxi", "nocoiner", "laser"),
+        PersonalityType.DEFI_DEGEN: ("defi", "yield", "apy", "farm", "farming", "liquidity", "lp", "staking", "protocol", "airdrop", "uniswap", "curve"),
+        PersonalityType.NFT_COLLECTOR: ("nft", "nfts", "pfp", "mint", "minted", "art", "artist", "collection", "opensea", "punks", "zora"),
+        PersonalityType.MEME_LORD: ("meme", "memes", "memecoin", "moon", "wen", "lambo", "lfg", "frog", "dog"),
+        PersonalityType.STABLECOIN_SAFE: ("stablecoin", "stablecoins", "stable", "peg", "savings", "treasury", "safe", "conservative"),
+        PersonalityType.ALTCOIN_HUNTER: ("altcoin", "altcoins", "alts", "gem", "gems", "solana", "cardano", "polkadot", "avalanche", "cosmos", "research", "100x"),
+        PersonalityType.WHALE: ("whale", "portfolio", "position", "otc", "fund", "allocation", "institutional", "millions"),
+        PersonalityType.SHITCOIN_SURFER: ("pump", "dump", "rug", "rugged", "presale", "ape", "aped", "launch", "1000x", "shitcoin")
+    }
+    _KEYWORD_TYPES: Dict[str, Tuple[PersonalityType, ...]] = {}
+    _WORD = re.compile(r"\$?[a-z0-9_]+")
+    
+    # Hashed bit segments in feature vectors (vocabularies may outgrow them)
+    FEATURE_TRAIT_DIMS = 48
+    FEATURE_TOKEN_DIMS = 64
+    FEATURE_DIMS = len(PersonalityType) + FEATURE_TRAIT_DIMS + FEATURE_TOKEN_DIMS + len(RiskLevel)
+    _BASE_ROWS: Dict = {}
+    
+    # Precomputed trait/token bitmasks per profile (see vocabulary.py)
+    PROFILE_MASKS = {
+        personality: {
+            "trait_mask": trait_vocab.mask(profile["traits"]),
+            "token_mask": token_vocab.mask(profile["tokens"])
+        }
+        for personality, profile in PERSONALITY_PROFILES.items()
+    }
+    
     @classmethod
     def get_random_personality(cls) -> PersonalityType:
         """Get random personality type"""
@@ -114,38 +157,142 @@ class PersonalityAnalyzer:
         """Get full personality profile"""
         return cls.PERSONALITY_PROFILES.get(personality, cls.PERSONALITY_PROFILES[PersonalityType.BITCOIN_MAXI])
     
+    @classmethod
+    def get_profile_masks(cls, personality: PersonalityType) -> Dict:
+        """Get precomputed trait/token bitmasks for a personality"""
+        return cls.PROFILE_MASKS.get(personality, cls.PROFILE_MASKS[PersonalityType.BITCOIN_MAXI])
+    
+    @classmethod
+    def analyze_casts(cls, casts: Iterable[str], max_tokens: int = 8) -> Optional[Tuple[PersonalityType, int, List[str]]]:
+        """
+        Keyword analysis of a user's casts: (personality, confidence, cashtags of known tokens)
+        None when no cast mentions anything personality-specific
+        """
+        if not cls._KEYWORD_TYPES:
+            keyword_types: Dict[str, List[PersonalityType]] = {}
+            for personality, words in cls.CAST_KEYWORDS.items():
+                symbols = [token.lower() for token in cls.PERSONALITY_PROFILES[personality]["tokens"]]
+                for word in (*words, *symbols):
+                    keyword_types.setdefault(word, []).append(personality)
+            cls._KEYWORD_TYPES = {word: tuple(types) for word, types in keyword_types.items()}
+        
+        scores: Counter = Counter()
+        cashtags: Counter = Counter()
+        for cast in casts:
+            for word in cls._WORD.findall(cast.lower()):
+                if word.startswith("$"):
+                    word = word[1:]
+                    if word in token_vocab:  # unknown tickers would grow the vocabulary without bound
+                        cashtags[word.upper()] += 1
+                for personality in cls._KEYWORD_TYPES.get(word, ()):
+                    scores[personality] += 1
+        if not scores:
+            return None
+        
+        (personality, top), = scores.most_common(1)
+        confidence = min(99, 60 + round(39 * top / sum(scores.values())))
+        return personality, confidence, [token for token, _ in cashtags.most_common(max_tokens)]
+    
     @classmethod
     def analyze_user(cls, user_data: Optional[Dict] = None) -> Dict:
         """
         Analyze user and return personality profile
         In production, this would use real Farcaster data
         """
-        # For now, generate random personality
-        personality = cls.get_random_personality()
+        user_data = user_data or {}
+        
+        # A supplied personality wins, then keyword analysis of casts, otherwise random
+        confidence = user_data.get("confidence") or random.randint(85, 99)
+        tokens = list(user_data.get("tokens", []))
+        analyzed = cls.analyze_casts(user_data["casts"]) if user_data.get("casts") and not user_data.get("personality_type") else None
+        if user_data.get("personality_type"):
+            personality = PersonalityType(user_data["personality_type"])
+        elif analyzed is not None:
+            personality, confidence, cashtags = analyzed
+            tokens.extend(cashtags)
+        else:
+            personality = cls.get_random_personality()
         profile = cls.get_personality_profile(personality)
+        masks = cls.get_profile_masks(personality)
+        
+        # User-specific traits/tokens extend the profile's
+        trait_mask = masks["trait_mask"] | trait_vocab.mask(user_data.get("traits", []))
+        token_mask = masks["token_mask"] | token_vocab.mask(tokens)
         
         return {
             "personality_type": personality,
             "profile": profile,
+            "trait_mask": trait_mask,
+            "token_mask": token_mask,
             "metadata": {
                 "analyzed_at": "2025-10-23",
-                "confidence": random.randint(85, 99)
+                "confidence": confidence
             }
         }
     
     @classmethod
-    def get_compatibility_factors(cls, personality1: PersonalityType, personality2: PersonalityType) -> Dict:
+    def feature_vector(cls, analysis: Dict) -> List[float]:
+        """
+        Dense, L2-normalized feature vector for a user analysis
+        Layout: personality compatibility row | hashed trait bits | hashed token bits | risk one-hot
+        Segments are scaled by the matchmaking weights so cosine similarity tracks the score
+        """
+        personality = analysis.get("personality_type", PersonalityType.BITCOIN_MAXI)
+        profile = cls.get_personality_profile(personality)
+        
+        base_row = cls._BASE_ROWS.get(personality)
+        if base_row is None:
+            base_row = [
+                cls.get_compatibility_factors(personality, other)["base_compatibility"] / 100
+                for other in PersonalityType
+            ]
+            cls._BASE_ROWS[personality] = base_row
+        traits = [0.0] * cls.FEATURE_TRAIT_DIMS
+        for bit in _set_bits(analysis.get("trait_mask", 0)):
+            traits[bit % cls.FEATURE_TRAIT_DIMS] = 1.0
+        tokens = [0.0] * cls.FEATURE_TOKEN_DIMS
+        for bit in _set_bits(analysis.get("token_mask", 0)):
+            tokens[bit % cls.FEATURE_TOKEN_DIMS] = 1.0
+        risk = [1.0 if profile["risk_level"] == level else 0.0 for level in RiskLevel]
+        
+        segments = (
+            (base_row, 0.30),
+            (traits, 0.15),
+            (tokens, 0.25),
+            (risk, 0.20)
+        )
+        vector = []
+        for values, weight in segments:
+            norm = sum(v * v for v in values) ** 0.5 or 1.0
+            scale = weight ** 0.5 / norm
+            vector.extend(v * scale for v in values)
+        
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+    
+    @classmethod
+    def get_compatibility_factors(
+        cls,
+        personality1: PersonalityType,
+        personality2: PersonalityType,
+        token_mask1: Optional[int] = None,
+        token_mask2: Optional[int] = None
+    ) -> Dict:
         """
         Calculate compatibility factors between two personalities
+        User-level token masks override the profile tokens when given
         """
         profile1 = cls.get_personality_profile(personality1)
         profile2 = cls.get_personality_profile(personality2)
         
-        # Calculate token overlap
-        tokens1 = set(profile1["tokens"])
-        tokens2 = set(profile2["tokens"])
-        common_tokens = tokens1 & tokens2
-        token_compatibility = (len(common_tokens) / max(len(tokens1), len(tokens2))) * 100
+        # Calculate token overlap on bitmasks
+        if token_mask1 is None:
+            token_mask1 = cls.get_profile_masks(personality1)["token_mask"]
+        if token_mask2 is None:
+            token_mask2 = cls.get_profile_masks(personality2)["token_mask"]
+        common_mask = token_mask1 & token_mask2
+        largest = max(popcount(token_mask1), popcount(token_mask2))
+        token_compatibility = (popcount(common_mask) / largest) * 100 if largest else 0
         
         # Risk level compatibility
         risk_match = 100 if profile1["risk_level"] == profile2["risk_level"] else 50
@@ -192,7 +339,7 @@ class PersonalityAnalyzer:
             "base_compatibility": base_compatibility,
             "token_compatibility": token_compatibility,
             "risk_compatibility": risk_match,
-            "common_tokens": list(common_tokens),
+            "common_tokens": token_vocab.symbols(common_mask),
             "personality1_profile": profile1,
             "personality2_profile": profile2
         }
@@ -0,0 +1,136 @@
+"""
+Speculative Match Prefetch
+After a result is served, the user's next match is computed in the background so the
+"Find Another Match" press can be answered from a ready slot; bounded by a global
+concurrency budget and skipped whenever the overload controller sees pressure
+"""
+from typing import Awaitable, Callable, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import time
+
+from overload import overload_controller
+from metrics import metrics
+from config import settings
+
+
+class MatchPrefetcher:
+    """
+    One prefetch slot per fid (bounded LRU)
+    A slot is taken at most once; slots that expire, get evicted or are replaced
+    were wasted work and are counted as such
+    """
+
+    def __init__(
+        self,
+        budget: int = 8,
+        ttl: float = 300.0,
+        max_slots: int = 10_000,
+        controller=overload_controller,
+        clock: Callable[[], float] = time.monotonic,
+        enabled: bool = True
+    ):
+        self.budget = budget
+        self.ttl = ttl
+        self.max_slots = max_slots
+        self.controller = controller
+        self.clock = clock
+        self.enabled = enabled
+        self.inflight = 0
+        self._slots: "OrderedDict[str, Tuple[asyncio.Task, float]]" = OrderedDict()
+        self.outcomes = metrics.counter(
+            "prefetch_total",
+            "Match prefetches by outcome (scheduled, hit, miss, wasted, failed, skipped_*)",
+            ("outcome",)
+        )
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _idle(self) -> bool:
+        """Only speculate while serving at the full tier with pressure well below the limits"""
+        return self.controller.level == 0 and self.controller.pressure() < self.controller.recover_ratio
+
+    def schedule(self, fid: str, compute: Callable[[], Awaitable]) -> bool:
+        """Start computing fid's next match unless over budget, overloaded or already prefetched"""
+        if not self.enabled:
+            return False
+        if fid in self._slots:
+            return False
+        if self.inflight >= self.budget:
+            self.outcomes.inc("skipped_budget")
+            return False
+        if not self._idle():
+            self.outcomes.inc("skipped_overload")
+            return False
+
+        self.inflight += 1
+        task = asyncio.create_task(compute())
+        task.add_done_callback(self._done)
+        self._slots[fid] = (task, self.clock())
+        self.outcomes.inc("scheduled")
+        while len(self._slots) > self.max_slots:
+            _, (evicted, _) = self._slots.popitem(last=False)
+            self._discard(evicted)
+        return True
+
+    def _done(self, task: asyncio.Task):
+        self.inflight -= 1
+        if not task.cancelled() and task.exception() is not None:
+            self.outcomes.inc("failed")
+
+    def _discard(self, task: asyncio.Task):
+        if not task.done():
+            task.cancel()
+        self.outcomes.inc("wasted")
+
+    async def take(self, fid: str):
+        """
+        The prefetched result for fid, or None (counted as a miss)
+        A prefetch still in flight is awaited: it started earlier than a fresh compute would
+        """
+        slot = self._slots.pop(fid, None)
+        if slot is None:
+            self.outcomes.inc("miss")
+            return None
+        task, created_at = slot
+        if self.clock() - created_at > self.ttl:
+            self._discard(task)
+            self.outcomes.inc("miss")
+            return None
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                self.outcomes.inc("miss")
+                return None
+            raise  # the request itself was cancelled
+        except Exception:
+            self.outcomes.inc("miss")
+            return None
+        self.outcomes.inc("hit")
+        return result
+
+    def discard(self, fid: str):
+        """Drop fid's slot (e.g. the user's state changed and the prefetch is stale)"""
+        slot = self._slots.pop(fid, None)
+        if slot is not None:
+            self._discard(slot[0])
+
+    async def stop(self):
+        """Cancel prefetches still running"""
+        tasks = [task for task, _ in self._slots.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._slots.clear()
+
+
+# Singleton instance
+match_prefetcher = MatchPrefetcher(
+    budget=settings.prefetch_budget,
+    ttl=settings.prefetch_ttl,
+    enabled=settings.prefetch
+)
+metrics.register_callback("prefetch_inflight", "Match prefetches running", lambda: match_prefetcher.inflight)
+metrics.register_callback("prefetch_slots", "Prefetched next matches waiting to be served", lambda: len(match_prefetcher))
@@ -0,0 +1,78 @@
+"""
+Sampling Profiler
+Low-overhead statistical profiler for diagnosing hotspots in a running worker
+"""
+from typing import Dict, Optional
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """Periodically samples thread stacks and aggregates them as collapsed stacks"""
+
+    MAX_SECONDS = 60
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self.thread_labels: Dict[int, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def label_thread(self, ident: int, label: str):
+        """Give a thread a stable label (e.g. the event loop thread)"""
+        self.thread_labels[ident] = label
+
+    def sample(self, seconds: float, interval: Optional[float] = None) -> Counter:
+        """
+        Sample all threads for `seconds` and return collapsed stack counts
+        Blocks the calling thread, so run it off the event loop
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Profiler is already running")
+
+        try:
+            seconds = max(0.1, min(float(seconds), self.MAX_SECONDS))
+            interval = max(0.001, interval or self.interval)
+            own_ident = threading.get_ident()
+            stacks = Counter()
+            deadline = time.monotonic() + seconds
+
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    label = self.thread_labels.get(ident) or names.get(ident, f"thread-{ident}")
+                    stacks[self._collapse(label, frame)] += 1
+                time.sleep(interval)
+
+            return stacks
+        finally:
+            self._lock.release()
+
+    def _collapse(self, label: str, frame) -> str:
+        """Turn a frame chain into a root-first `label;frame;frame` string"""
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        parts.append(label)
+        parts.reverse()
+        return ";".join(parts)
+
+    @staticmethod
+    def format_collapsed(stacks: Counter) -> str:
+        """Render stack counts in the collapsed format understood by flamegraph.pl / speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+# Singleton instance
+profiler = SamplingProfiler()
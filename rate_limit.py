@@ -0,0 +1,163 @@
+"""
+Rate Limiting
+Per-fid (per-IP fallback) token buckets with in-process and Redis backends
+"""
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import time
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional for single-worker deployments
+    aioredis = None
+
+
+class InMemoryRateLimiter:
+    """Token buckets held in process memory (one worker)"""
+
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int = 100_000):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    def take(self, key: str, now: Optional[float] = None) -> bool:
+        """Take one token from key's bucket, O(1)"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                # Least recently seen buckets are the fullest anyway, dropping them is harmless
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return True
+
+        self.limited += 1
+        return False
+
+    async def allow(self, key: str) -> bool:
+        return self.take(key)
+
+
+class RedisRateLimiter:
+    """Token buckets in Redis, shared by all workers (one round trip per decision)"""
+
+    # Refill + take in one atomic step, using the Redis clock so workers agree on time
+    SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ttl)
+return allowed
+"""
+
+    def __init__(
+        self,
+        redis_url: str,
+        capacity: float,
+        refill_per_second: float,
+        prefix: str = "ratelimit:"
+    ):
+        if aioredis is None:
+            raise RuntimeError("redis package is not installed")
+
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.prefix = prefix
+        # Idle buckets expire once they would have refilled completely
+        self.ttl = max(1, int(capacity / refill_per_second) + 1) if refill_per_second > 0 else 86400
+        self.client = aioredis.from_url(redis_url)
+        self._script = self.client.register_script(self.SCRIPT)
+        self.fallback = InMemoryRateLimiter(capacity, refill_per_second)
+        self.allowed = 0
+        self.limited = 0
+
+    async def allow(self, key: str) -> bool:
+        try:
+            allowed = bool(await self._script(
+                keys=[self.prefix + key],
+                args=[self.capacity, self.refill_per_second, self.ttl]
+            ))
+        except Exception as e:
+            print(f"Redis rate limiter error: {e}, using in-process buckets")
+            allowed = self.fallback.take(key)
+
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return allowed
+
+
+def create_rate_limiter(
+    backend: str,
+    capacity: float,
+    refill_per_second: float,
+    redis_url: Optional[str] = None
+):
+    """Build the configured limiter, falling back to in-process buckets"""
+    if backend == "redis" and redis_url:
+        try:
+            return RedisRateLimiter(redis_url, capacity, refill_per_second)
+        except Exception as e:
+            print(f"Redis rate limiter unavailable: {e}, using in-process buckets")
+    return InMemoryRateLimiter(capacity, refill_per_second)
+
+
+def client_ip(scope: Dict, trusted_hops: int = 1) -> str:
+    """
+    Client IP as seen by the outermost of trusted_hops proxies
+    Each proxy appends the peer it saw to X-Forwarded-For, so only the right-most
+    trusted_hops entries are genuine; anything further left is client-supplied
+    """
+    if trusted_hops > 0:
+        hops: List[str] = []
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                hops.extend(hop.strip() for hop in value.decode("latin-1").split(","))
+        hops = [hop for hop in hops if hop]
+        if len(hops) >= trusted_hops:
+            return hops[-trusted_hops]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def frame_key(
+    fid: Optional[str],
+    verified: bool,
+    scope: Dict,
+    trust_unverified: bool = False,
+    trusted_hops: int = 1
+) -> str:
+    """
+    Bucket for a frame POST, decided after the frame message was checked
+    A verified fid keys its own bucket; a claimed fid only when unsigned fids are trusted
+    anyway (FRAME_VERIFICATION=off); anything else falls back to the client IP
+    """
+    if fid and (verified or trust_unverified):
+        return f"fid:{fid}"
+    return f"ip:{client_ip(scope, trusted_hops)}"
@@ -0,0 +1,52 @@
+"""
+Background Render Jobs
+Tracks in-flight match renders so the image endpoint can await them
+"""
+from typing import Dict
+import asyncio
+
+
+class RenderJobs:
+    """Registry of in-flight render tasks keyed by image key"""
+
+    def __init__(self):
+        self._jobs: Dict[str, asyncio.Task] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._jobs
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def track(self, key: str, task: asyncio.Task) -> asyncio.Task:
+        """Keep a reference to the task until it finishes"""
+        self._jobs[key] = task
+        task.add_done_callback(lambda _: self._finished(key, task))
+        return task
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._jobs.get(key) is task:
+            del self._jobs[key]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Render job {key} failed: {task.exception()}")
+
+    async def wait(self, key: str, timeout: float) -> bool:
+        """
+        Wait up to timeout seconds for a job to finish
+        Returns True if it finished successfully (or is unknown, i.e. already done)
+        """
+        task = self._jobs.get(key)
+        if task is None:
+            return True
+
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return False
+        except Exception:
+            return False
+        return True
+
+
+# Singleton instance
+render_jobs = RenderJobs()
@@ -0,0 +1,75 @@
+"""
+Single-Flight Coalescing
+Identical concurrent calls share one computation; the result stays reusable for a short window
+"""
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+from collections import OrderedDict
+import asyncio
+import time
+
+from metrics import metrics
+
+
+class SingleFlight:
+    """
+    Per-key request coalescing
+    While a call for a key is in flight, callers with the same key await it;
+    after it succeeds, its result is reused for `reuse_window` seconds
+    """
+
+    def __init__(
+        self,
+        name: str,
+        reuse_window: float = 2.0,
+        max_recent: int = 10_000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.reuse_window = reuse_window
+        self.max_recent = max_recent
+        self.clock = clock
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._recent: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self.calls = metrics.counter(
+            "single_flight_calls_total",
+            "Coalesced calls by outcome (leader runs the work, coalesced/reused share it)",
+            ("flight", "outcome")
+        )
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def _remember(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None or self.reuse_window <= 0:
+            return
+        self._recent[key] = (self.clock() + self.reuse_window, task.result())
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_recent:
+            self._recent.popitem(last=False)
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """Result of fn() for key, shared with identical in-flight and recent calls"""
+        recent = self._recent.get(key)
+        if recent is not None:
+            if recent[0] > self.clock():
+                self.calls.inc(self.name, "reused")
+                return recent[1]
+            del self._recent[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.calls.inc(self.name, "coalesced")
+        else:
+            self.calls.inc(self.name, "leader")
+            # A task, so a caller that disconnects doesn't cancel the work for the others
+            task = asyncio.get_running_loop().create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._remember(key, done))
+
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable):
+        """Drop a reusable result, e.g. when the underlying state changed"""
+        self._recent.pop(key, None)
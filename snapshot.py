@@ -0,0 +1,235 @@
+"""
+Warm-State Snapshots
+Periodically writes warm caches (match results, comedy lines, rendered images, match lists)
+to one versioned, sectioned file; a restarting worker maps it and restores each section
+whose version still matches before taking traffic
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import asyncio
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+from metrics import metrics
+from config import settings
+
+
+MAGIC = b"CMSNAP"
+FORMAT_VERSION = 1
+
+# magic, format version, section count, created at
+HEADER = struct.Struct("<6sHId")
+# name, section version, flags, offset, length, crc32
+ENTRY = struct.Struct("<16s32sBQQI")
+COMPRESSED = 1
+
+# key length, value length (then key and value bytes)
+BLOB = struct.Struct("<HI")
+
+
+def pack_blobs(items: Iterable[Tuple[str, bytes]]) -> bytes:
+    """Length-prefixed (key, bytes) pairs, the payload of binary sections"""
+    parts = []
+    for key, value in items:
+        encoded = key.encode()
+        parts.append(BLOB.pack(len(encoded), len(value)))
+        parts.append(encoded)
+        parts.append(value)
+    return b"".join(parts)
+
+
+def iter_blobs(data: bytes) -> Iterator[Tuple[str, memoryview]]:
+    """Inverse of pack_blobs; values are views into data (copy what you keep)"""
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        key_length, value_length = BLOB.unpack_from(view, offset)
+        offset += BLOB.size
+        key = bytes(view[offset:offset + key_length]).decode()
+        offset += key_length
+        yield key, view[offset:offset + value_length]
+        offset += value_length
+
+
+class Section(NamedTuple):
+    version: str
+    dump: Callable[[], Any]  # bytes, or whatever encode() takes
+    restore: Callable[[bytes], int]  # returns entries restored
+    compress: bool
+    encode: Optional[Callable[[Any], bytes]]  # runs in the writer thread
+
+
+class SnapshotManager:
+    """
+    Registry of snapshot sections plus the periodic writer
+    Sections are captured on the event loop (so caches aren't mutated mid-iteration), then
+    encoded, compressed and written from a worker thread; files are replaced atomically
+    """
+
+    def __init__(self, path: Optional[str] = None, interval: float = 300.0):
+        self.path = path
+        self.interval = interval
+        self._sections: Dict[str, Section] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.outcomes = metrics.counter(
+            "snapshot_sections_total",
+            "Snapshot sections by outcome (written, restored, discarded)",
+            ("outcome",)
+        )
+
+    def register(
+        self,
+        name: str,
+        version: str,
+        dump: Callable[[], bytes],
+        restore: Callable[[bytes], int],
+        compress: bool = False,
+        encode: Optional[Callable[[Any], bytes]] = None
+    ):
+        """
+        Add a section; bump `version` whenever the encoding or the meaning of the
+        cached data changes, and old snapshots of it will be discarded
+        With `encode`, dump() only captures references (e.g. a list of items) and
+        encode() turns them into bytes off the event loop
+        """
+        if len(name.encode()) > 16 or len(version.encode()) > 32:
+            raise ValueError(f"Snapshot section name or version too long: {name!r} {version!r}")
+        self._sections[name] = Section(version, dump, restore, compress, encode)
+
+    def capture(self) -> List[Tuple[str, Any]]:
+        """Take every section's state now (cheap, call on the event loop): [(name, state)]"""
+        return [(name, section.dump()) for name, section in self._sections.items()]
+
+    def encode(self, captured: List[Tuple[str, Any]]) -> List[Tuple[str, str, int, bytes]]:
+        """Encode and compress captured sections (thread-safe): [(name, version, flags, payload)]"""
+        encoded = []
+        for name, state in captured:
+            section = self._sections[name]
+            payload = section.encode(state) if section.encode is not None else state
+            flags = 0
+            if section.compress:
+                payload = zlib.compress(payload, 1)
+                flags |= COMPRESSED
+            encoded.append((name, section.version, flags, payload))
+        return encoded
+
+    def dump(self) -> List[Tuple[str, str, int, bytes]]:
+        """Encode every section now: [(name, version, flags, payload)]"""
+        return self.encode(self.capture())
+
+    @staticmethod
+    def write_file(path: str, sections: List[Tuple[str, str, int, bytes]]) -> int:
+        """Write dumped sections atomically; returns the file size"""
+        offset = HEADER.size + ENTRY.size * len(sections)
+        table = [HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), time.time())]
+        for name, version, flags, payload in sections:
+            table.append(ENTRY.pack(name.encode(), version.encode(), flags, offset, len(payload), zlib.crc32(payload)))
+            offset += len(payload)
+
+        # Unique temp name: workers sharing the path must not write into each other's file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(b"".join(table))
+                for _, _, _, payload in sections:
+                    f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return offset
+
+    def _write(self, path: str, captured: List[Tuple[str, Any]]) -> int:
+        sections = self.encode(captured)
+        self.write_file(path, sections)
+        return len(sections)
+
+    def save(self, path: Optional[str] = None) -> int:
+        """Dump and write synchronously"""
+        sections = self.dump()
+        size = self.write_file(path or self.path, sections)
+        self.outcomes.inc("written", amount=len(sections))
+        return size
+
+    def load(self, path: Optional[str] = None) -> Dict[str, int]:
+        """
+        Restore every section that matches its registered version
+        Returns {section: entries restored}; a missing, foreign or corrupt file restores nothing
+        """
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return {}
+        restored: Dict[str, int] = {}
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, version, count, created_at = HEADER.unpack_from(data)
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    print(f"Ignoring snapshot at {path}: unsupported format {magic!r} v{version}")
+                    return {}
+                for index in range(count):
+                    raw_name, raw_version, flags, offset, length, crc = ENTRY.unpack_from(
+                        data, HEADER.size + index * ENTRY.size
+                    )
+                    name = raw_name.rstrip(b"\0").decode()
+                    section_version = raw_version.rstrip(b"\0").decode()
+                    section = self._sections.get(name)
+                    if section is None or section.version != section_version:
+                        print(f"Discarding snapshot section {name} (version {section_version!r})")
+                        self.outcomes.inc("discarded")
+                        continue
+                    payload = data[offset:offset + length]  # only this section is paged in
+                    if len(payload) != length or zlib.crc32(payload) != crc:
+                        print(f"Discarding snapshot section {name}: checksum mismatch")
+                        self.outcomes.inc("discarded")
+                        continue
+                    if flags & COMPRESSED:
+                        payload = zlib.decompress(payload)
+                    try:
+                        restored[name] = section.restore(payload)
+                    except (ValueError, KeyError, TypeError, struct.error) as e:
+                        print(f"Discarding snapshot section {name}: {e}")
+                        self.outcomes.inc("discarded")
+                        continue
+                    self.outcomes.inc("restored")
+        except (OSError, ValueError, struct.error, zlib.error) as e:
+            print(f"Ignoring snapshot at {path}: {e}")
+        return restored
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                captured = self.capture()
+                written = await asyncio.to_thread(self._write, self.path, captured)
+                self.outcomes.inc("written", amount=written)
+            except Exception as e:
+                print(f"Snapshot write failed: {e}")
+
+    def start(self):
+        """Start periodic snapshots (call from a running loop)"""
+        if self.path and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer and take a final snapshot"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.path:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Final snapshot failed: {e}")
+
+
+# Singleton instance
+snapshots = SnapshotManager(settings.snapshot_path, settings.snapshot_interval)
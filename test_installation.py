@@ -139,6 +139,233 @@ async def test_comedy():
         return False
 
 
+async def test_comedy_batch():
+    """Test batched AI comedy against a stubbed client"""
+    print("\n🔍 Testing batched comedy...")
+    
+    try:
+        import json
+        from types import SimpleNamespace
+        from comedy_generator import ComedyGenerator, COMEDY_CACHED
+        from personality import PersonalityAnalyzer, PersonalityType
+        
+        class StubCompletions:
+            def __init__(self):
+                self.calls = []
+                self.content = ""
+                self.finish_reason = "stop"
+            
+            async def create(self, **kwargs):
+                self.calls.append(kwargs)
+                message = SimpleNamespace(content=self.content)
+                choice = SimpleNamespace(message=message, finish_reason=self.finish_reason)
+                return SimpleNamespace(choices=[choice], usage=SimpleNamespace(total_tokens=900))
+        
+        stub = StubCompletions()
+        generator = ComedyGenerator(
+            client=SimpleNamespace(chat=SimpleNamespace(completions=stub)), source="batch", batch_interval=0.01
+        )
+        profile = PersonalityAnalyzer.get_personality_profile
+        maxi, degen, whale = profile(PersonalityType.BITCOIN_MAXI), profile(PersonalityType.DEFI_DEGEN), profile(PersonalityType.WHALE)
+        before = {outcome: generator.batches.value(outcome) for outcome in ("accepted", "rejected")}
+        
+        # Misses are answered locally and queued, the API is never awaited per match
+        for pair in ((maxi, degen), (degen, whale), (whale, maxi)):
+            assert await generator.generate_match_comedy(*pair, 90, "high_match")
+        assert not stub.calls
+        
+        lines = [f"Batched line number {n} for the maxi and the degen" for n in range(4)]
+        stub.content = json.dumps({"pairs": [
+            {"id": 1, "comedy": lines, "date_ideas": ["Split a Bitcoin pizza and argue about APY"]},
+            {"id": 2, "comedy": "not a list", "date_ideas": []},
+            {"id": 3, "comedy": ["x" * 500, 42, "A whale and a maxi walk into a cold wallet..."]},
+            {"id": 9, "comedy": ["Unknown pair that was never requested"]}
+        ]})
+        assert await generator.fill_batch() == 5 and len(stub.calls) == 1
+        assert generator.batches.value("accepted") - before["accepted"] == 6
+        assert generator.batches.value("rejected") - before["rejected"] == 4
+        assert "maxi" in stub.calls[0]["messages"][1]["content"].lower()
+        
+        assert await generator.generate_match_comedy(maxi, degen, 91, "high_match", mode=COMEDY_CACHED) in lines
+        assert await generator.generate_date_idea(maxi, degen) == "Split a Bitcoin pizza and argue about APY"
+        print(f"  ✅ 3 pairs in 1 completion, 5 lines cached, malformed entries discarded")
+        
+        # A malformed completion caches nothing and the pairs stay queued
+        stub.content = "Sorry, I can't do JSON today"
+        await generator.generate_match_comedy(degen, maxi, 40, "low_match")
+        try:
+            await generator.fill_batch()
+            raise AssertionError("malformed completion accepted")
+        except ValueError:
+            pass
+        
+        # The background filler picks queued pairs up on its own
+        stub.content = json.dumps({"pairs": [{"id": n, "comedy": [f"Filled in the background, pair {n}"]} for n in (1, 2)]})
+        generator.start()
+        await asyncio.sleep(0.2)
+        await generator.stop()
+        assert len(stub.calls) == 3
+        assert (await generator.generate_match_comedy(degen, maxi, 40, "low_match")).startswith("Filled in the background")
+        print(f"  ✅ Background filler: {len(stub.calls)} completions total")
+        
+        # Cut off at max_tokens: finished pairs are kept, the rest requeued into smaller batches
+        stable = profile(PersonalityType.STABLECOIN_SAFE)
+        for pair in ((stable, maxi), (stable, degen), (stable, whale)):
+            await generator.generate_match_comedy(*pair, 20, "low_match")
+        stub.content = json.dumps({"pairs": [
+            {"id": 1, "comedy": ["Finished before the cut, safety first"]},
+            {"id": 2, "comedy": ["Cut off mid-line"]}
+        ]})[:-30]
+        stub.finish_reason = "length"
+        assert await generator.fill_batch() == 1
+        assert generator.pending_pairs == 2 and generator._batch_size == 1
+        stub.content = json.dumps({"pairs": [{"id": 1, "comedy": ["Fits in one pair's worth of tokens"]}]})
+        stub.finish_reason = "stop"
+        assert await generator.fill_batch() == 1
+        assert generator.pending_pairs == 1 and generator._batch_size == 2
+        print("  ✅ Truncated completion: complete pairs kept, the rest retried in smaller batches")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Batched comedy error: {e!r}")
+        return False
+
+
+def test_comedy_grammar():
+    """Test the local comedy grammar"""
+    print("\n🔍 Testing comedy grammar...")
+    
+    try:
+        import re
+        import time
+        from comedy_grammar import ComedyGrammar, CompiledGrammar, comedy_grammar
+        from personality import PersonalityAnalyzer, PersonalityType
+        
+        profiles = PersonalityAnalyzer.PERSONALITY_PROFILES
+        whale, degen = profiles[PersonalityType.WHALE], profiles[PersonalityType.DEFI_DEGEN]
+        maxi, stable = profiles[PersonalityType.BITCOIN_MAXI], profiles[PersonalityType.STABLECOIN_SAFE]
+        
+        line = comedy_grammar.generate(whale, degen, 88, "high_match", seed=42)
+        assert line == comedy_grammar.generate(whale, degen, 88, "high_match", seed=42)
+        assert len({comedy_grammar.generate(whale, degen, 88, "high_match", seed=i) for i in range(20)}) > 5
+        
+        # Bitcoin maxis and stablecoin players share no token: no line may need one
+        shared_only = ComedyGrammar({"low_match": ["<a>"], "a": ["{common} or bust", "No overlap, {name1}"]})
+        assert all(shared_only.generate(maxi, stable, 10, "low_match", seed=i) == "No overlap, Bitcoin Maximalist" for i in range(20))
+        assert shared_only.generate(whale, degen, 10, "low_match", seed=1) in ("ETH or bust", "No overlap, Crypto Whale")
+        try:
+            CompiledGrammar({"start": ["<missing>"]})
+            raise AssertionError("unknown rule accepted")
+        except ValueError:
+            pass
+        
+        lines = [comedy_grammar.generate(a, b, 50, level) for a in profiles.values() for b in profiles.values()
+                 for level in ("high_match", "medium_match", "low_match")]
+        assert all(0 < len(text) <= 200 and "{" not in text and "<" not in text for text in lines)
+        
+        # Every sentence starts with a capital letter (or a number: "85%?!")
+        sentences = [
+            sentence
+            for a in profiles.values() for b in profiles.values()
+            for level in ("high_match", "medium_match", "low_match")
+            for i in range(10)
+            for sentence in re.split(r"(?<=[.!?])\s+", comedy_grammar.generate(a, b, 50, level, seed=i))
+        ]
+        starts = [re.search(r"[^\W_]", sentence) for sentence in sentences]
+        assert all(start is None or not start.group().islower() for start in starts), [
+            sentence for sentence, start in zip(sentences, starts) if start and start.group().islower()
+        ][:3]
+        lowercase = ComedyGrammar({"medium_match": ["💫 {score}%. <a> <a>"], "a": ["different chains!", "\"lol\" ok."]})
+        assert {lowercase.generate(whale, degen, 50, "medium_match", seed=i) for i in range(20)} == {
+            '💫 50%. Different chains! Different chains!', '💫 50%. Different chains! "Lol" ok.',
+            '💫 50%. "Lol" ok. Different chains!', '💫 50%. "Lol" ok. "Lol" ok.'
+        }
+        
+        # Same-type pairs get their own lines instead of "X and X", "tagline ... tagline"
+        for profile in profiles.values():
+            name = profile["title"].rsplit(" ", 1)[0]
+            for level in ("high_match", "medium_match", "low_match"):
+                for i in range(10):
+                    text = comedy_grammar.generate(profile, profile, 50, level, seed=i)
+                    assert text.count(name) <= 1 and text.count(profile["tagline"]) <= 1, text
+        
+        wordy = ComedyGrammar({"medium_match": ["{tagline1} " * 30]})
+        clamped = wordy.generate(maxi, stable, 50, "medium_match", seed=1)
+        assert len(clamped) <= 200 and clamped.endswith("…") and clamped.startswith("In Bitcoin we trust"), clamped
+        
+        start = time.perf_counter()
+        for i in range(1000):
+            comedy_grammar.generate(whale, degen, 70, "medium_match", seed=i)
+        per_line = (time.perf_counter() - start) / 1000 * 1e6
+        print(f"  ✅ {line}")
+        print(f"  ✅ {len(lines)} lines under 200 chars, {per_line:.0f}µs per line")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Comedy grammar error: {e}")
+        return False
+
+
+def test_emoji_atlas():
+    """Test the emoji sprite atlas and text/emoji layout"""
+    print("\n🔍 Testing emoji atlas...")
+
+    try:
+        import os
+        import tempfile
+        from PIL import Image, ImageDraw
+        from build_emoji_atlas import build, collect_sequences, twemoji_names
+        from emoji_atlas import EmojiAtlas, emoji_sequences
+        from image_generator import FONT_REGULAR, image_generator
+
+        assert emoji_sequences("hi 👨‍💻 and ❤️ 👍🏽!") == ["👨‍💻", "❤️", "👍🏽"]
+        assert emoji_sequences("Slow down! ⏳") == ["⏳"]
+        assert twemoji_names("❤️") == ["2764", "2764-fe0f"]
+        sequences = collect_sequences(".")
+        assert "💕" in sequences and "🔥" in sequences
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Twemoji-style source: solid red squares named by codepoint
+            source = os.path.join(tmp, "72x72")
+            os.makedirs(source)
+            for sequence in ("💕", "🔥"):
+                Image.new("RGBA", (72, 72), (255, 0, 0, 255)).save(os.path.join(source, f"{twemoji_names(sequence)[0]}.png"))
+            packed, missing = build(["💕", "🔥", "🐋"], os.path.join(tmp, "atlas"), source=source)
+            assert packed == sorted(["💕", "🔥"]) and missing == ["🐋"]
+
+            atlas = EmojiAtlas(os.path.join(tmp, "atlas"))
+            assert atlas.load() and len(atlas) == 2 and "💕" in atlas and "🐋" not in atlas
+            assert atlas.split_runs("💕 HI 🐋 ⚡") == [(True, "💕"), (False, " HI  ⚡")]
+
+            font = image_generator.font(FONT_REGULAR, 40)
+            size, advance = atlas.emoji_size(font)
+            assert atlas.text_width("💕AB", font) == round(advance + font.getlength("AB"))
+
+            img = Image.new("RGB", (200, 80), (255, 255, 255))
+            atlas.draw_text(img, ImageDraw.Draw(img), (10, 10), "💕AB", font, (0, 0, 0))
+            assert img.getpixel((10 + advance // 2, 10 + size // 2)) == (255, 0, 0)
+
+        # The shipped Twemoji atlas covers every emoji the app uses and draws 🔥 in color
+        shipped = EmojiAtlas()
+        assert shipped.load() and all(sequence in shipped for sequence in sequences), "static/emoji atlas is stale"
+        font = image_generator.font(FONT_REGULAR, 40)
+        img = Image.new("RGB", (120, 80), (255, 255, 255))
+        shipped.draw_text(img, ImageDraw.Draw(img), (10, 10), "🔥", font, (0, 0, 0))
+        pixels = img.getdata()
+        assert any(r > 200 and 60 < g < 200 and b < 80 for r, g, b in pixels), "🔥 did not render in color"
+        print(f"  ✅ Shipped atlas has all {len(shipped)} app emoji; 🔥 renders in color")
+
+        # Without an atlas nothing is stripped: the font draws the text as it always did
+        empty = EmojiAtlas(os.path.join(tempfile.gettempdir(), "no-emoji-atlas"))
+        assert not empty.load() and empty.split_runs("💕 MATCH 💕") == [(False, "💕 MATCH 💕")]
+
+        print(f"  ✅ {len(sequences)} emoji used by the app, sprites pasted with text runs")
+        return True
+    except Exception as e:
+        print(f"  ❌ Emoji atlas error: {e}")
+        return False
+
+
 def test_image_generator():
     """Test image generator"""
     print("\n🔍 Testing image generator...")
@@ -163,12 +390,78 @@ def test_image_generator():
         print(f"  ✅ Image generated")
         print(f"  📷 Format: {image_url[:50]}...")
         
+        # Breakdown chart is content-addressed, identical breakdowns share one render
+        breakdown = {"personality_base": 95, "token_overlap": 66.7, "risk_tolerance": 100, "trait_similarity": 50, "community_vibe": 80}
+        key = image_generator.store_breakdown_image(breakdown, 'high_match')
+        assert image_generator.store_breakdown_image(dict(breakdown), 'high_match') == key
+        assert image_generator.store.get(key).startswith(b"\x89PNG")
+        print(f"  ✅ Breakdown chart: {key}")
+        
         return True
     except Exception as e:
         print(f"  ❌ Image generator error: {e}")
         return False
 
 
+def test_image_variants():
+    """Test on-demand image size/format variants"""
+    print("\n🔍 Testing image variants...")
+    
+    try:
+        import io
+        from PIL import Image
+        from fastapi.testclient import TestClient
+        from image_generator import IMAGE_FORMATS, IMAGE_VARIANTS, ImageStore, MatchImageGenerator
+        from main import app
+        from main import image_generator as app_images
+        from personality import PersonalityAnalyzer
+        
+        user1 = PersonalityAnalyzer.analyze_user()
+        user2 = PersonalityAnalyzer.analyze_user()
+        generator = MatchImageGenerator(ImageStore(max_entries=2), render_workers=1)
+        key = generator.store_match_image(user1['profile'], user2['profile'], 87, 'high_match', "Variant test!")
+        
+        for variant, size in IMAGE_VARIANTS.items():
+            for fmt in IMAGE_FORMATS:
+                data = generator.variant(key, variant, fmt)
+                assert Image.open(io.BytesIO(data)).size == size
+                assert generator.variant(key, variant, fmt) is data  # memoized
+        assert generator.variant(key, "full", "png") is generator.store.get(key)
+        
+        # The square card letterboxes the whole render: every text pixel stays on the card,
+        # the bars only continue the background (one color per row)
+        master = Image.open(io.BytesIO(generator.store.get(key)))
+        square = Image.open(io.BytesIO(generator.variant(key, "square", "png")))
+        fit = (630, round(630 * master.height / master.width))
+        top = (630 - fit[1]) // 2
+        band = square.crop((0, top, 630, top + fit[1]))
+        expected = master.resize(fit, Image.BILINEAR, reducing_gap=2.0)
+        assert band.tobytes() == expected.tobytes(), "render was cropped or shifted"
+        for y in list(range(top)) + list(range(top + fit[1], 630)):
+            assert len(set(square.crop((0, y, 630, y + 1)).getdata())) == 1, f"text in the bar at row {y}"
+        assert generator.variant("missing", "half", "jpg") is None
+        
+        # Variants leave with their master
+        generator.store_breakdown_image({"personality_base": 10}, 'low_match')
+        generator.store_breakdown_image({"personality_base": 20}, 'low_match')
+        assert key not in generator.store and key not in generator.store.variants
+        print(f"  ✅ {len(IMAGE_VARIANTS)} sizes x {len(IMAGE_FORMATS)} formats, memoized per master")
+        
+        client = TestClient(app)
+        key = app_images.store_match_image(user1['profile'], user2['profile'], 87, 'high_match', "Route test!")
+        response = client.get(f"/image/half/{key}.jpg")
+        assert response.status_code == 200 and response.headers["content-type"] == "image/jpeg"
+        assert len(response.content) < len(client.get(f"/image/{key}.png").content)
+        assert client.get(f"/image/huge/{key}.jpg").status_code == 404
+        assert client.get(f"/image/half/{key}.gif").status_code == 404
+        print(f"  ✅ /image/half/{key}.jpg served ({len(response.content)} bytes)")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Image variants error: {e}")
+        return False
+
+
 async def test_api():
     """Test FastAPI app"""
     print("\n🔍 Testing FastAPI app...")
@@ -204,6 +497,1066 @@ async def test_api():
         return False
 
 
+def test_vocabulary():
+    """Test bitset trait/token vocabularies"""
+    print("\n🔍 Testing trait/token bitsets...")
+    
+    try:
+        from vocabulary import Vocabulary, jaccard, popcount
+        
+        vocab = Vocabulary("test")
+        a = vocab.mask(["BTC", "ETH", "SOL"])
+        b = vocab.mask(["ETH", "SOL", "DOGE"])
+        
+        assert popcount(a & b) == 2
+        assert jaccard(a, b) == 0.5
+        assert vocab.symbols(a & b) == ["ETH", "SOL"]
+        
+        # Vocabularies grow past 64 symbols
+        wide = vocab.mask(f"TOKEN_{i}" for i in range(100))
+        assert popcount(wide) == 100 and len(vocab) == 104
+        print(f"  ✅ Jaccard via popcount works ({len(vocab)} symbols interned)")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Vocabulary error: {e}")
+        return False
+
+
+def test_match_result():
+    """Test compact match result model"""
+    print("\n🔍 Testing match result model...")
+    
+    try:
+        from match_result import MatchResult
+        from personality import PersonalityType
+        
+        result = MatchResult(
+            user_fid="1", user_name="You", user_type=PersonalityType.WHALE, user_confidence=90,
+            match_fid="2", match_name="Them", match_type=PersonalityType.BITCOIN_MAXI, match_confidence=88,
+            total_score=81, match_level="high_match", scores=(85, 33.3, 100, 20.0, 70),
+            common_tokens=("BTC",), comedy="HODL together", date_idea="Buy the dip",
+            image_key="abc123", share_text="81% match!"
+        )
+        data = result.to_dict()
+        
+        assert not hasattr(result, "__dict__")
+        assert data["compatibility"]["breakdown"]["token_overlap"] == 33.3
+        assert data["compatibility"]["image_url"].endswith("/image/abc123.png")
+        assert data["user"]["personality"]["profile"]["title"].startswith("Crypto Whale")
+        print(f"  ✅ Serialized {result!r}")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Match result error: {e}")
+        return False
+
+
+def test_match_index():
+    """Test incrementally maintained top-K match lists"""
+    print("\n🔍 Testing precomputed match lists...")
+    
+    try:
+        import random
+        from candidate_pool import Candidate, CandidatePool
+        from match_index import TopKMatchIndex
+        from matchmaking import matchmaking_engine
+        from personality import PersonalityAnalyzer
+        
+        index = TopKMatchIndex(CandidatePool(), matchmaking_engine.rank_score, k=5)
+        for fid in range(60):
+            index.join(Candidate.from_analysis(str(fid), f"User #{fid}", PersonalityAnalyzer.analyze_user()))
+        for fid in random.sample(range(60), 20):
+            index.leave(str(fid))
+        
+        # Incremental lists must match a brute-force recomputation
+        for candidate in index.pool:
+            expected = sorted(
+                (matchmaking_engine.rank_score(candidate.to_analysis(), other.to_analysis())
+                 for other in index.pool if other.fid != candidate.fid),
+                reverse=True
+            )[:5]
+            got = [score for _, score in index.top(candidate.fid, 5)]
+            assert [round(x, 6) for x in got] == [round(x, 6) for x in expected]
+        
+        some_fid = next(iter(index.pool)).fid
+        assert index.next_match(some_fid) != some_fid
+        print(f"  ✅ {len(index)} users, lists match brute force")
+        
+        # One-sided scorer: a cached pair must keep each direction's own score
+        def one_sided(a, b):
+            return float(a["trait_mask"] * 2 + b["token_mask"])
+        
+        lopsided = TopKMatchIndex(CandidatePool(), one_sided, k=5)
+        for fid in range(20):
+            lopsided.join(Candidate.from_analysis(str(fid), f"User #{fid}", PersonalityAnalyzer.analyze_user()))
+        for a in lopsided.buckets:
+            for b in lopsided.buckets:
+                assert lopsided._score(a, b) == one_sided(lopsided._reps[a], lopsided._reps[b])
+        print("  ✅ Asymmetric scores cached per direction")
+        
+        guests = TopKMatchIndex(CandidatePool(), matchmaking_engine.rank_score, k=5, max_guests=3)
+        guests.ensure_user("verified")
+        for fid in range(5):
+            guests.ensure_user(f"guest{fid}", verified=False)
+        guests.ensure_user("guest2", verified=False)  # seen again, evicted last
+        guests.ensure_user("guest5", verified=False)
+        assert "verified" in guests and list(guests.guests) == ["guest4", "guest2", "guest5"]
+        assert len(guests) == 4 and "guest0" not in guests.pool
+        guests.ensure_user("guest4")  # verified later: no longer a guest
+        assert list(guests.guests) == ["guest2", "guest5"]
+        print("  ✅ Unverified users capped as guests")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Match index error: {e}")
+        return False
+
+
+def test_match_history():
+    """Test per-user match history and repeat skipping"""
+    print("\n🔍 Testing match history...")
+    
+    try:
+        from candidate_pool import Candidate, CandidatePool
+        from match_history import MatchHistory, UserHistory
+        from match_index import TopKMatchIndex
+        from matchmaking import matchmaking_engine
+        from personality import PersonalityAnalyzer
+        
+        history = UserHistory(size=10)
+        for i in range(200):
+            history.add(f"m{i}", 80, "high_match")
+        assert len(history) == 10 and all(f"m{i}" in history for i in range(200))
+        false_positives = sum(f"other{i}" in history for i in range(10_000))
+        assert false_positives < 300, false_positives
+        history.add("m200", 50, "medium_match")  # rebuild: only the ring survives
+        assert "m199" in history and "m200" in history and sum(f"m{i}" in history for i in range(150)) < 10
+        
+        restored = UserHistory.from_bytes(history.to_bytes())
+        assert list(restored.entries) == list(history.entries) and restored.seen.data == history.seen.data
+        print(f"  ✅ Bounded ring + filter: {len(history.to_bytes())} bytes, {false_positives / 100:.2f}% false positives")
+        
+        index = TopKMatchIndex(CandidatePool(), matchmaking_engine.rank_score, k=5)
+        for fid in range(30):
+            index.join(Candidate.from_analysis(str(fid), f"User #{fid}", PersonalityAnalyzer.analyze_user()))
+        matches = MatchHistory(size=20)
+        shown = []
+        for _ in range(len(index.top("0"))):
+            match_fid = index.next_match("0", skip=matches.skipper("0"))
+            shown.append(match_fid)
+            matches.record("0", match_fid, 70, "medium_match")
+        assert len(set(shown)) == len(shown), shown
+        
+        # Once everything was seen, repeats rotate through the list instead of sticking to one
+        repeats = [index.next_match("0", skip=matches.skipper("0")) for _ in range(len(shown))]
+        assert sorted(repeats) == sorted(shown), repeats
+        
+        items, next_offset, total = matches.page("0", 0, 3)
+        assert total == len(shown) and [item["match_fid"] for item in items] == shown[::-1][:3]
+        assert next_offset == 3
+        items, next_offset, _ = matches.page("0", 3, 100)
+        assert next_offset is None and len(items) == total - 3
+        
+        copy = MatchHistory()
+        copy.load_dict(matches.to_dict())
+        assert copy.seen("0", shown[0]) and copy.page("0")[2] == total
+        print(f"  ✅ {len(shown)} matches without repeats, paginated newest first")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Match history error: {e}")
+        return False
+
+
+def test_import_users():
+    """Test streaming bulk import with checkpoint/resume"""
+    print("\n🔍 Testing bulk user import...")
+    
+    try:
+        import json
+        import os
+        import tempfile
+        from candidate_pool import CandidatePool
+        from import_users import UserImporter
+        from match_index import TopKMatchIndex
+        from matchmaking import matchmaking_engine
+        
+        casts = ["stacking sats, HODL bitcoin", "gm! new NFT mint on base", "yield farming APY on defi"]
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "users.ndjson")
+            with open(source, "w", encoding="utf-8") as f:
+                for fid in range(30):
+                    f.write(json.dumps({"fid": str(fid), "name": f"User {fid}", "casts": [casts[fid % 3]]}) + "\n")
+                f.write("{not json\n")
+            
+            def importer():
+                index = TopKMatchIndex(CandidatePool(), matchmaking_engine.rank_score, k=5)
+                return UserImporter(index, os.path.join(tmp, "index.json"), workers=0, batch_size=7,
+                                    checkpoint_path=os.path.join(tmp, "users.checkpoint"))
+            
+            first = importer()
+            stats = first.run(source)
+            assert stats["imported"] == 30 and stats["rejected"] == 1 and stats["candidates"] == 30
+            assert first.index.pool.get("0").personality_type.value == "bitcoin_maxi"
+            
+            # Appended records resume from the checkpoint; earlier ones aren't re-read
+            with open(source, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"fid": "30", "name": "Late", "personality_type": "defi_degen"}) + "\n")
+            resumed = importer()
+            stats = resumed.run(source)
+            assert stats["imported"] == 31 and stats["candidates"] == 31
+            print(f"  ✅ NDJSON: {stats['imported']} imported, {stats['rejected']} rejected, resumed after append")
+            
+            # CSV with a quoted multi-line casts cell and ';'-separated tokens
+            csv_source = os.path.join(tmp, "users.csv")
+            with open(csv_source, "w", encoding="utf-8", newline="") as f:
+                f.write('fid,name,casts,tokens\n')
+                f.write('100,Alice,"gm frens\nwagmi NFT mint",ETH;PEPE\n')
+                f.write('101,Bob,"HODL bitcoin, stacking sats",\n')
+            index = TopKMatchIndex(CandidatePool(), matchmaking_engine.rank_score, k=5)
+            stats = UserImporter(index, os.path.join(tmp, "csv-index.json"), workers=0).run(csv_source)
+            assert stats["imported"] == 2 and index.pool.get("101").personality_type.value == "bitcoin_maxi"
+            print(f"  ✅ CSV: {stats['imported']} imported")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Bulk import error: {e}")
+        return False
+
+
+def test_snapshot():
+    """Test warm-cache snapshot and restore"""
+    print("\n🔍 Testing warm-cache snapshots...")
+    
+    try:
+        import os
+        import tempfile
+        from snapshot import SnapshotManager, iter_blobs, pack_blobs
+        from image_generator import ImageStore
+        from match_result import MatchResult
+        from personality import PersonalityType
+        
+        result = MatchResult(
+            user_fid="1", user_name="You", user_type=PersonalityType.WHALE, user_confidence=90,
+            match_fid="2", match_name="Them", match_type=PersonalityType.BITCOIN_MAXI, match_confidence=88,
+            total_score=81, match_level="high_match", scores=(85, 33.3, 100, 20.0, 70),
+            common_tokens=("BTC",), comedy="HODL together", date_idea="Buy the dip",
+            image_key="abc123", share_text="81% match!", created_at=1700000000.0
+        )
+        restored = MatchResult.from_record(result.to_record())
+        assert restored.to_dict() == result.to_dict() and restored.user_type is PersonalityType.WHALE
+        assert [(key, bytes(value)) for key, value in iter_blobs(pack_blobs([("a", b"1"), ("bb", b"")]))] == [("a", b"1"), ("bb", b"")]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "warm.snap")
+            store = ImageStore()
+            for i in range(20):
+                store.put(f"img{i}", bytes([i]) * 1000)
+            lines = {"k": "v"}
+            
+            writer = SnapshotManager(path)
+            writer.register("images", "r1", store.capture, store.restore, encode=pack_blobs)
+            writer.register("comedy", "1", lambda: repr(lines).encode(), lambda data: 1, compress=True)
+            captured = dict(writer.capture())
+            assert captured["images"][0][1] is store.get("img0")  # references only, packed in the writer
+            size = writer.save()
+            assert os.listdir(tmp) == ["warm.snap"]  # per-write temp file replaced, nothing left over
+            
+            fresh = ImageStore()
+            reader = SnapshotManager(path)
+            reader.register("images", "r1", fresh.dump, fresh.restore)
+            reader.register("comedy", "2", lambda: b"", lambda data: 1)  # renderer changed: discard
+            assert reader.load() == {"images": 20}
+            assert fresh.get("img7") == bytes([7]) * 1000 and list(fresh.items())[-1][0] == "img7"
+            
+            # A flipped byte fails that section's checksum only; a foreign file restores nothing
+            with open(path, "r+b") as f:
+                f.seek(size // 2)
+                f.write(b"X")
+            assert writer.load() == {"comedy": 1}
+            with open(path, "wb") as f:
+                f.write(b"not a snapshot at all, just bytes")
+            assert reader.load() == {}
+        
+        print(f"  ✅ {size} byte snapshot restored; stale versions and corrupt sections discarded")
+        return True
+    except Exception as e:
+        print(f"  ❌ Snapshot error: {e}")
+        return False
+
+def test_vector_index():
+    """Test feature vectors and cosine similarity search"""
+    print("\n🔍 Testing vector similarity search...")
+    
+    try:
+        from personality import PersonalityAnalyzer, PersonalityType
+        from vector_index import FlatIndex, IVFIndex, np
+        
+        users = {
+            str(fid): PersonalityAnalyzer.feature_vector(PersonalityAnalyzer.analyze_user())
+            for fid in range(300)
+        }
+        flat = FlatIndex(PersonalityAnalyzer.FEATURE_DIMS, block_size=64)
+        flat.add_many(users.items())
+        
+        hits = flat.search(users["0"], k=5, exclude="0")
+        assert len(hits) == 5 and all(fid != "0" for fid, _ in hits)
+        assert abs(hits[0][1] - 1.0) < 1e-4  # someone shares user 0's personality
+        print(f"  ✅ Blocked brute force: top similarity {hits[0][1]:.3f}")
+        
+        if np is not None:
+            ivf = IVFIndex(PersonalityAnalyzer.FEATURE_DIMS, nlist=8, nprobe=8)
+            ivf.train(list(users.values()))
+            ivf.add_many(users.items())
+            approx = ivf.search(users["0"], k=5, exclude="0")
+            assert [round(score, 4) for _, score in approx] == [round(score, 4) for _, score in hits]
+            print(f"  ✅ IVF with full probe matches brute force")
+        
+        # Match lists from a cosine shortlist of buckets stay close to scoring every bucket
+        import random
+        from candidate_pool import Candidate, CandidatePool
+        from match_index import TopKMatchIndex
+        from matchmaking import matchmaking_engine
+        
+        tokens = ["BTC", "ETH", "SOL", "DOGE", "PEPE", "USDC", "UNI", "AAVE", "LINK", "ARB", "OP", "BONK"]
+        traits = ["Art lover", "Hype chaser", "Risk averse", "Market mover", "Degen trader", "Early adopter"]
+        rng = random.Random(7)
+        analyses = [
+            PersonalityAnalyzer.analyze_user({"tokens": rng.sample(tokens, 3), "traits": rng.sample(traits, 2)})
+            for _ in range(400)
+        ]
+        exact = TopKMatchIndex(CandidatePool(), matchmaking_engine.rank_score, k=5, vectors=FlatIndex(PersonalityAnalyzer.FEATURE_DIMS))
+        shortlisted = TopKMatchIndex(
+            CandidatePool(), matchmaking_engine.rank_score, k=5,
+            vectors=FlatIndex(PersonalityAnalyzer.FEATURE_DIMS), retrieval_min=0
+        )
+        for fid, analysis in enumerate(analyses):
+            for index in (exact, shortlisted):
+                index.join(Candidate.from_analysis(str(fid), f"User #{fid}", analysis))
+        assert shortlisted.shortlisted > 0 and exact.shortlisted == 0
+        found = total = 0
+        for fid in map(str, range(0, 400, 10)):
+            floor = min(score for _, score in exact.top(fid))
+            found += sum(score >= floor for _, score in shortlisted.top(fid))
+            total += len(exact.top(fid))
+        assert found / total >= 0.9, found / total
+        some_fid = next(iter(shortlisted.pool)).fid
+        assert shortlisted.next_match(some_fid) not in (None, some_fid)
+        print(f"  ✅ Shortlisted match lists: recall {found / total:.2f} vs scoring every bucket")
+        
+        # A join scores a bounded number of buckets and the score cache stays bounded
+        calls = []
+        
+        def counted(a, b):
+            calls.append(1)
+            return matchmaking_engine.rank_score(a, b)
+        
+        bounded = TopKMatchIndex(
+            CandidatePool(), counted, k=5,
+            vectors=FlatIndex(PersonalityAnalyzer.FEATURE_DIMS), retrieval_min=0, max_scores=500
+        )
+        for fid, analysis in enumerate(analyses):
+            bounded.join(Candidate.from_analysis(str(fid), f"User #{fid}", analysis))
+        del calls[:]
+        bounded.join(Candidate.from_analysis("new", "Newcomer", PersonalityAnalyzer.analyze_user(
+            {"tokens": ["WIF", "TIA", "SEI"], "traits": ["Shitposter"]}
+        )))
+        assert len(bounded._scores) <= 500 and len(calls) <= 4 * bounded.capacity * bounded.retrieval_factor
+        assert len(calls) < len(bounded.buckets), (len(calls), len(bounded.buckets))
+        print(f"  ✅ Join scored {len(calls)} of {len(bounded.buckets)} buckets, {len(bounded._scores)} cached scores")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Vector index error: {e}")
+        return False
+
+
+async def test_batch_scoring():
+    """Test streaming batch pair scoring"""
+    print("\n🔍 Testing batch scoring...")
+    
+    try:
+        from batch import batch_scorer, parse_pair_line, pairs_from_lines
+        
+        assert parse_pair_line("fid1,fid2") is None
+        assert parse_pair_line('{"fid1": 1, "fid2": 2}') == ("1", "2")
+        assert parse_pair_line("[3, 4]") == ("3", "4")
+        
+        async def body():
+            yield b"fid1,fid2\n1,2\n3,"
+            yield b"4\n[5, 6]"
+        
+        records = [record async for record in batch_scorer.score_pairs(pairs_from_lines(body()), comedy=True, concurrency=2)]
+        assert [(r["fid1"], r["fid2"]) for r in records] == [("1", "2"), ("3", "4"), ("5", "6")]
+        assert all(0 <= r["total_score"] <= 100 and r["comedy"] for r in records)
+        print(f"  ✅ Streamed {len(records)} pairs in input order")
+        
+        from main import app, settings
+        from fastapi.testclient import TestClient
+        token, limit = settings.debug_token, settings.batch_json_max_body
+        settings.debug_token, settings.batch_json_max_body = "t", 200
+        try:
+            client = TestClient(app)
+            headers = {"x-debug-token": "t"}
+            small = client.post("/api/match/batch", json={"pairs": [[1, 2], [3, 4]]}, headers=headers)
+            assert small.status_code == 200 and len(small.text.splitlines()) == 2
+            big = client.post("/api/match/batch", json={"pairs": [[i, i + 1] for i in range(50)]}, headers=headers)
+            assert big.status_code == 413, big.status_code
+        finally:
+            settings.debug_token, settings.batch_json_max_body = token, limit
+        print("  ✅ Oversized JSON batches rejected (413), NDJSON streams instead")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Batch scoring error: {e}")
+        return False
+
+
+def test_export():
+    """Test compatibility export and leaderboards"""
+    print("\n🔍 Testing compatibility export...")
+    
+    try:
+        from itertools import islice
+        from candidate_pool import Candidate, CandidatePool
+        from export import csv_chunks, top_pairs, top_user_pairs, type_pair_rows, user_pair_rows, TYPE_COLUMNS
+        from personality import PersonalityAnalyzer
+        
+        text = "".join(csv_chunks(type_pair_rows(), TYPE_COLUMNS, chunk_rows=5))
+        assert len(text.splitlines()) == 1 + 64  # header + ordered type pairs
+        print(f"  ✅ Type matrix: 64 pairs")
+        
+        pool = CandidatePool()
+        for fid in range(40):
+            pool.add(Candidate.from_analysis(str(fid), f"User {fid}", PersonalityAnalyzer.analyze_user()))
+        assert sum(1 for _ in user_pair_rows(pool)) == 40 * 39
+        
+        # Export scores come from the engine's public pair_factors, the same score rank_score ranks by
+        from export import _pair_values
+        from matchmaking import matchmaking_engine
+        a, b = [candidate.to_analysis() for candidate in islice(pool, 2)]
+        scores, common_tokens, score = matchmaking_engine.pair_factors(a, b)
+        assert score == matchmaking_engine.rank_score(a, b)
+        assert _pair_values(a, b)["score"] == round(score, 2) and _pair_values(a, b)["common_tokens"] == " ".join(common_tokens)
+        
+        brute = [row["score"] for row in top_pairs(user_pair_rows(pool), 15)]
+        fast = [row["score"] for row in top_user_pairs(pool, 15)]
+        assert brute == fast, (brute, fast)
+        print(f"  ✅ Leaderboard matches brute force (best {fast[0]})")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Export error: {e}")
+        return False
+
+
+async def test_frame_verification():
+    """Test frame message signature verification"""
+    print("\n🔍 Testing frame verification...")
+    
+    try:
+        from frame_verify import (
+            FrameVerifier, FrameVerificationError, StaticSignerSource, VerifyKey, blake3, sign_frame_action
+        )
+        if VerifyKey is None or blake3 is None:
+            print("  ⚠️  pynacl/blake3 not installed, skipping")
+            return True
+        from nacl.signing import SigningKey
+        
+        key, other = SigningKey.generate(), SigningKey.generate()
+        verifier = FrameVerifier(StaticSignerSource({42: [bytes(key.verify_key)]}))
+        
+        def body(message):
+            return {"untrustedData": {"fid": 1}, "trustedData": {"messageBytes": message.hex()}}
+        
+        good = [body(sign_frame_action(key, 42, button_index=i)) for i in (1, 2, 3)]
+        messages = await asyncio.gather(*(verifier.verify(b) for b in good))
+        assert [(m.fid, m.button_index) for m in messages] == [(42, 1), (42, 2), (42, 3)]
+        assert verifier.batches == 1 and verifier.signers.misses == 1
+        print(f"  ✅ 3 concurrent messages verified in {verifier.batches} batch, 1 signer lookup")
+        
+        tampered = bytearray(sign_frame_action(key, 42))
+        tampered[-40] ^= 1
+        for bad in (body(bytes(tampered)), body(sign_frame_action(other, 42)), body(sign_frame_action(key, 42, timestamp=1700000000))):
+            try:
+                await verifier.verify(bad)
+                raise AssertionError("bad message accepted")
+            except FrameVerificationError:
+                pass
+        print(f"  ✅ Rejected tampered, unknown-signer and stale messages")
+        
+        # Testnet messages and frames on another app (or a look-alike host) don't replay here
+        pinned = FrameVerifier(StaticSignerSource({42: [bytes(key.verify_key)]}), base_url="https://cryptomatch.app/")
+        for url in ("https://cryptomatch.app", "https://cryptomatch.app/match", "https://cryptomatch.app/?ref=1"):
+            assert (await pinned.verify(body(sign_frame_action(key, 42, url=url)))).url == url.encode()
+        rejected = (
+            (sign_frame_action(key, 42, url="https://cryptomatch.app/match", network=2), "Wrong network"),
+            (sign_frame_action(key, 42, url="https://other.app/match"), "not on this app"),
+            (sign_frame_action(key, 42, url="https://cryptomatch.app.evil.net/match"), "not on this app"),
+            (sign_frame_action(key, 42), "not on this app")
+        )
+        for message, reason in rejected:
+            try:
+                await pinned.verify(body(message))
+                raise AssertionError(f"accepted a message that should fail with {reason!r}")
+            except FrameVerificationError as e:
+                assert reason in str(e), e
+        try:
+            await verifier.verify(body(sign_frame_action(key, 42, network=3)))
+            raise AssertionError("devnet message accepted")
+        except FrameVerificationError:
+            pass
+        print("  ✅ Rejected other-network messages and frame URLs outside the app")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Frame verification error: {e}")
+        return False
+
+
+async def test_single_flight():
+    """Test coalescing of duplicate in-flight requests"""
+    print("\n🔍 Testing single-flight coalescing...")
+    
+    try:
+        from single_flight import SingleFlight
+        
+        now = [0.0]
+        flight = SingleFlight("test", reuse_window=2.0, clock=lambda: now[0])
+        runs = []
+        
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return len(runs)
+        
+        results = await asyncio.gather(*(flight.run(("1", 1), work) for _ in range(5)))
+        assert results == [1] * 5 and len(runs) == 1
+        assert await flight.run(("1", 1), work) == 1  # inside the reuse window
+        assert await flight.run(("1", 2), work) == 2  # different button
+        now[0] = 5.0
+        assert await flight.run(("1", 1), work) == 3  # window expired
+        print(f"  ✅ 8 calls, {len(runs)} runs ({flight.calls.value('test', 'coalesced'):.0f} coalesced, {flight.calls.value('test', 'reused'):.0f} reused)")
+        
+        # A shared render survives its first requester disconnecting
+        from image_generator import ImageStore, MatchImageGenerator
+        from personality import PersonalityAnalyzer
+        generator = MatchImageGenerator(ImageStore(), render_workers=1)
+        args = (PersonalityAnalyzer.analyze_user()["profile"], PersonalityAnalyzer.analyze_user()["profile"], 80, "high_match", "Cancel test")
+        leader = asyncio.create_task(generator.store_match_image_async(*args))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(generator.store_match_image_async(*args))
+        await asyncio.sleep(0)
+        leader.cancel()
+        key = await follower
+        assert leader.cancelled() and key in generator.store and generator.pending_renders == 0
+        print("  ✅ Render kept for other waiters after the leader was cancelled")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Single-flight error: {e}")
+        return False
+
+
+def test_fast_json():
+    """Test typed frame payloads and the fast JSON response"""
+    print("\n🔍 Testing frame payload parsing...")
+    
+    try:
+        from fast_json import FastJSONResponse
+        from frame_models import FramePayload
+        from personality import PersonalityType
+        
+        payload = FramePayload.model_validate_json(
+            b'{"untrustedData": {"fid": 7, "castId": {"fid": 1, "hash": "0x0"}}, "trustedData": {"messageBytes": "ab"}}'
+        )
+        assert payload.untrusted_data.fid == 7 and payload.untrusted_data.button_index == 1
+        assert payload.trusted_data.message_bytes == "ab"
+        assert FramePayload.model_validate({}).untrusted_data.fid is None
+        try:
+            FramePayload.model_validate({"untrustedData": {"fid": "not a number"}})
+            raise AssertionError("invalid fid accepted")
+        except ValueError:
+            pass
+        print(f"  ✅ Typed payload: fid {payload.untrusted_data.fid}, button {payload.untrusted_data.button_index}")
+        
+        body = FastJSONResponse(content={"type": PersonalityType.WHALE, "score": 1.5}).body
+        assert body == b'{"type":"whale","score":1.5}', body
+        print(f"  ✅ FastJSONResponse: {body.decode()}")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Fast JSON error: {e}")
+        return False
+
+
+def test_static_assets():
+    """Test fingerprinted asset build and precompressed serving"""
+    print("\n🔍 Testing static assets...")
+    
+    try:
+        import os
+        import shutil
+        import tempfile
+        from PIL import Image
+        from starlette.applications import Starlette
+        from starlette.routing import Mount
+        from fastapi.testclient import TestClient
+        from assets import AssetManifest, PrecompressedStaticFiles
+        from build_assets import build
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            src, out = os.path.join(tmp, "static"), os.path.join(tmp, "static", "dist")
+            os.makedirs(src)
+            Image.new("RGB", (400, 300), (20, 30, 40)).save(os.path.join(src, "splash.png"))
+            with open(os.path.join(src, "style.css"), "w") as f:
+                f.write("body { background: url(/static/splash.png); }\n" * 20)
+            
+            files = build(src, out)
+            manifest = AssetManifest(out)
+            assert manifest.files == files and set(files) == {"splash.png", "style.css"}
+            with Image.open(os.path.join(out, files["splash.png"])) as image:
+                assert image.size == (200, 150), image.size
+            with open(os.path.join(out, files["style.css"])) as f:
+                assert f"/static/dist/{files['splash.png']}" in f.read()
+            html = manifest.rewrite('<img src="/static/splash.png">')
+            assert html == '<img src="/static/dist/%s">' % files["splash.png"], html
+            assert AssetManifest(os.path.join(tmp, "missing")).url("splash.png") == "/static/splash.png"
+            print(f"  ✅ Built {len(files)} assets: {', '.join(sorted(files.values()))}")
+            
+            client = TestClient(Starlette(routes=[Mount("/static/dist", PrecompressedStaticFiles(directory=out))]))
+            url = manifest.url("style.css")
+            for accept, encoding in (("br, gzip", "br"), ("gzip", "gzip"), ("identity", None)):
+                if encoding == "br" and not os.path.exists(os.path.join(out, files["style.css"] + ".br")):
+                    encoding = "gzip"  # brotli not installed
+                response = client.get(url, headers={"Accept-Encoding": accept})
+                assert response.status_code == 200
+                assert response.headers.get("content-encoding") == encoding, response.headers
+                assert response.headers["content-type"].startswith("text/css")
+                assert "immutable" in response.headers["cache-control"]
+                assert "url(/static/dist/" in response.text
+            print(f"  ✅ Served {url} precompressed with immutable caching")
+            
+            manifest_response = client.get("/static/dist/manifest.json")
+            assert manifest_response.status_code == 200
+            assert manifest_response.headers["cache-control"] == "no-cache"
+            raw = client.get(f"{url}.gz")
+            assert "immutable" in raw.headers["cache-control"]
+            print("  ✅ manifest.json revalidated, hashed files and their .gz immutable")
+
+            # static/dist is committed (deploys don't run the build): it must match static/
+            shutil.copytree("static", os.path.join(tmp, "current"), ignore=shutil.ignore_patterns("dist"))
+            rebuilt = build(os.path.join(tmp, "current"), os.path.join(tmp, "current", "dist"))
+            assert AssetManifest().files == rebuilt, "static/dist is stale, run python build_assets.py"
+            assert all(os.path.exists(os.path.join("static", "dist", hashed)) for hashed in rebuilt.values())
+
+            import main
+            frame = main.rate_limited_frame().decode()
+            assert "unsplash" not in frame and f"/static/dist/{rebuilt['error.png']}" in frame
+            print(f"  ✅ Committed static/dist matches static/ ({len(rebuilt)} assets), frames use error.png")
+
+        return True
+    except Exception as e:
+        print(f"  ❌ Static assets error: {e}")
+        return False
+
+
+async def test_overload():
+    """Test overload tiers, hysteresis and the degraded pipeline"""
+    print("\n🔍 Testing overload control...")
+    
+    try:
+        from overload import OverloadController
+        from comedy_generator import comedy_generator, COMEDY_CACHED
+        from image_generator import image_generator, IMAGE_ATLAS, IMAGE_STATIC
+        from metrics import metrics
+        
+        now = [0.0]
+        backlog = [0]
+        controller = OverloadController(
+            inflight_high=4, backlog_high=10, step_down_hold=1.0, step_up_hold=5.0,
+            backlog=lambda: backlog[0], clock=lambda: now[0]
+        )
+        
+        def at(t, load):
+            now[0] = t
+            backlog[0] = load
+            return controller.evaluate().name
+        
+        assert at(1.0, 10) == "reduced"
+        assert at(1.5, 10) == "reduced", "stepped twice inside the hold"
+        assert at(2.0, 20) == "minimal"
+        assert at(3.0, 7) == "minimal", "between thresholds holds the tier"
+        assert at(4.0, 2) == "minimal"
+        assert at(8.0, 2) == "minimal", "recovered before the calm period"
+        assert at(9.0, 2) == "reduced"
+        assert at(13.0, 2) == "reduced"
+        assert at(14.0, 0) == "full"
+        
+        now[0] = 16.0
+        with controller.request(), controller.request(), controller.request():
+            with controller.request() as tier:
+                assert controller.inflight == 4 and tier.name == "reduced"
+        assert controller.inflight == 0
+        
+        controller.observe_lag(1.0)
+        assert round(controller.lag, 6) == 0.3 and round(controller.pressure(), 6) == 3.0
+        assert "cryptomatch_overload_transitions_total" in metrics.render()
+        print(f"  ✅ Tiers step down under load and back up after {controller.step_up_hold:.0f}s calm")
+        
+        profile = {"title": "Whale", "emoji": "🐋"}
+        other = {"title": "Degen", "emoji": "🎲"}
+        comedy_generator._remember(("Whale", "Degen", "high_match"), "cached line")
+        text = await comedy_generator.generate_match_comedy(profile, other, 90, "high_match", mode=COMEDY_CACHED)
+        assert text == "cached line", text
+        
+        atlas_key = await image_generator.store_match_image_async(profile, other, 90, "high_match", text, mode=IMAGE_ATLAS)
+        static_key = await image_generator.store_match_image_async(profile, other, 90, "high_match", text, mode=IMAGE_STATIC)
+        assert atlas_key.startswith("a") and static_key == "static-high_match"
+        assert image_generator.store.get(atlas_key)[:8] == b"\x89PNG\r\n\x1a\n"
+        assert image_generator.store.get(static_key) == image_generator.static_match_png("high_match")
+        print(f"  ✅ Degraded tiers: cached comedy, atlas image {atlas_key}, static image {static_key}")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Overload error: {e}")
+        return False
+
+
+async def test_prefetch():
+    """Test speculative next-match prefetch"""
+    print("\n🔍 Testing match prefetch...")
+    
+    try:
+        from prefetch import MatchPrefetcher
+        from overload import OverloadController
+        from matchmaking import matchmaking_engine
+        
+        now = [0.0]
+        load = [0]
+        controller = OverloadController(backlog_high=10, backlog=lambda: load[0], clock=lambda: now[0])
+        prefetcher = MatchPrefetcher(budget=1, ttl=10.0, controller=controller, clock=lambda: now[0])
+        outcomes = ("hit", "miss", "wasted", "skipped_budget", "skipped_overload")
+        before = {outcome: prefetcher.outcomes.value(outcome) for outcome in outcomes}
+        count = lambda outcome: prefetcher.outcomes.value(outcome) - before[outcome]
+        release = asyncio.Event()
+        
+        async def next_match(name):
+            await release.wait()
+            return name
+        
+        assert prefetcher.schedule("1", lambda: next_match("match for 1"))
+        assert not prefetcher.schedule("2", lambda: next_match("match for 2")), "budget of 1 exceeded"
+        release.set()
+        assert await prefetcher.take("1") == "match for 1" and prefetcher.inflight == 0
+        assert await prefetcher.take("1") is None, "a slot is served once"
+        
+        load[0] = 6  # above half the limit: no speculation
+        assert not prefetcher.schedule("3", lambda: next_match("match for 3"))
+        load[0] = 0
+        assert prefetcher.schedule("3", lambda: next_match("match for 3"))
+        await asyncio.sleep(0)
+        now[0] = 11.0
+        assert await prefetcher.take("3") is None, "expired slot served"
+        assert count("hit") == 1 and count("miss") == 2 and count("wasted") == 1
+        assert count("skipped_budget") == 1 and count("skipped_overload") == 1
+        
+        # A wasted prefetch only peeked at the user's list; a served one moves the cursor
+        from candidate_pool import Candidate, CandidatePool
+        from match_index import TopKMatchIndex
+        from personality import PersonalityAnalyzer
+        index = TopKMatchIndex(CandidatePool(), matchmaking_engine.rank_score, k=5)
+        for fid in range(10):
+            index.join(Candidate.from_analysis(str(fid), f"User #{fid}", PersonalityAnalyzer.analyze_user()))
+        index.next_match("0")
+        await asyncio.sleep(0)  # done callbacks return the budget
+        
+        async def peek():
+            return index.next_match("0", advance=False)
+        
+        assert prefetcher.schedule("0", peek)
+        await asyncio.sleep(0)
+        now[0] += 11.0
+        assert await prefetcher.take("0") is None
+        upcoming = await peek()
+        assert index.next_match("0") == upcoming, "expired prefetch consumed a candidate"
+        
+        await asyncio.sleep(0)
+        assert prefetcher.schedule("0", peek)
+        served = await prefetcher.take("0")
+        index.consume("0", served)
+        assert index.next_match("0") not in (served, None)
+        
+        # Prefetch without the render, the image is rendered when the slot is served
+        result = await matchmaking_engine.generate_match_result("10", "20", render=False)
+        assert result.image_key is None and result.comedy
+        rendered = await matchmaking_engine.render_result(result)
+        assert rendered.image_key and rendered.comedy == result.comedy
+        
+        print(f"  ✅ Budget, overload and TTL respected; 1 hit, 2 misses, 1 wasted")
+        return True
+    except Exception as e:
+        print(f"  ❌ Prefetch error: {e}")
+        return False
+
+
+async def test_analytics():
+    """Test the buffered analytics recorder and its SQLite sink"""
+    print("\n🔍 Testing analytics events...")
+    
+    try:
+        import os
+        import sqlite3
+        import tempfile
+        from analytics import EventRecorder, SQLiteSink
+        
+        class FlakySink:
+            def __init__(self):
+                self.fail = True
+                self.rows = []
+            
+            async def write(self, events):
+                if self.fail:
+                    raise ConnectionError("sink down")
+                self.rows.extend(events)
+            
+            async def close(self):
+                pass
+        
+        sink = FlakySink()
+        recorder = EventRecorder(sink, capacity=5, batch_size=2)
+        assert all(recorder.record("match", str(fid), score=fid) for fid in range(5))
+        assert not recorder.record("match", "6"), "full buffer should drop"
+        try:
+            await recorder.flush()
+            raise AssertionError("flush should surface sink errors")
+        except ConnectionError:
+            pass
+        assert len(recorder) == 5, "failed batch should be requeued"
+        sink.fail = False
+        assert await recorder.flush() == 5
+        assert [row[2] for row in sink.rows] == ["0", "1", "2", "3", "4"]
+        assert recorder.events.value("dropped") >= 1
+        print("  ✅ Bounded buffer: dropped when full, failed batch retried in order")
+        
+        # Stopping while a write hangs: the batch goes back to the buffer and the final flush writes it
+        class HangingSink(FlakySink):
+            async def write(self, events):
+                if self.fail:
+                    self.fail = False
+                    await asyncio.sleep(3600)
+                self.rows.extend(events)
+        
+        sink = HangingSink()
+        recorder = EventRecorder(sink, batch_size=2, flush_interval=0.01)
+        recorder.start()
+        dropped = recorder.events.value("dropped")
+        recorder.record("match", "a")
+        recorder.record("match", "b")
+        await asyncio.sleep(0.05)
+        await recorder.stop(timeout=0.1)
+        assert [row[2] for row in sink.rows] == ["a", "b"] and recorder.events.value("dropped") == dropped
+        print("  ✅ Stop mid-write: batch requeued and written, nothing lost")
+        
+        # Share clicks only count with the signature issued in the result frame
+        from main import app, event_recorder, share_token, user_cache
+        from fastapi.testclient import TestClient
+        from matchmaking import matchmaking_engine
+        clicks = []
+        user_cache["match_4242"] = await matchmaking_engine.generate_match_result("4242", "77", render=False)
+        event_recorder.record_match = lambda event, result, tier="": clicks.append(event)
+        try:
+            client = TestClient(app)
+            assert client.get("/share/4242?t=forged", follow_redirects=False).status_code in (302, 307)
+            assert client.get("/share/4242", follow_redirects=False).status_code in (302, 307)
+            assert not clicks, "unsigned share click counted"
+            client.get(f"/share/4242?t={share_token('4242', '77')}", follow_redirects=False)
+            assert clicks == ["share_click"]
+        finally:
+            del event_recorder.record_match
+            user_cache.pop("match_4242", None)
+        print("  ✅ Share clicks counted only with a valid link signature")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events.db")
+            recorder = EventRecorder(SQLiteSink(path), batch_size=100, flush_interval=0.05)
+            recorder.start()
+            for fid in range(250):
+                recorder.record("share_click" if fid % 10 == 0 else "match", str(fid), "m", "whale", "degen", 80, "high_match", "full")
+            await asyncio.sleep(0.2)
+            assert len(recorder) == 0, "flusher should drain full batches"
+            recorder.record("details", "last")
+            await recorder.stop()
+            
+            conn = sqlite3.connect(path)
+            rows = conn.execute("SELECT event, COUNT(*) FROM match_events GROUP BY event ORDER BY event").fetchall()
+            conn.close()
+            assert rows == [("details", 1), ("match", 225), ("share_click", 25)], rows
+            print(f"  ✅ SQLite sink: {rows}")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Analytics error: {e}")
+        return False
+
+
+async def test_rate_limiter():
+    """Test token-bucket rate limiter"""
+    print("\n🔍 Testing rate limiter...")
+    
+    try:
+        from rate_limit import InMemoryRateLimiter, client_ip, frame_key
+        
+        limiter = InMemoryRateLimiter(capacity=3, refill_per_second=1.0)
+        decisions = [limiter.take("fid:1", now=100.0) for _ in range(4)]
+        assert decisions == [True, True, True, False]
+        assert limiter.take("fid:2", now=100.0)
+        assert limiter.take("fid:1", now=101.0)  # refilled one token
+        print(f"  ✅ Buckets enforce burst + refill ({limiter.limited} limited)")
+        
+        scope = {
+            "headers": [(b"x-forwarded-for", b"6.6.6.6, 203.0.113.7")],
+            "client": ("10.0.0.1", 443)
+        }
+        assert client_ip(scope, trusted_hops=1) == "203.0.113.7"  # spoofed left-most hop ignored
+        assert client_ip(scope, trusted_hops=2) == "6.6.6.6"
+        assert client_ip(scope, trusted_hops=3) == "10.0.0.1"
+        assert client_ip(scope, trusted_hops=0) == "10.0.0.1"
+        assert frame_key("1", True, scope) == "fid:1"
+        assert frame_key("1", False, scope) == "ip:203.0.113.7"
+        assert frame_key("1", False, scope, trust_unverified=True) == "fid:1"
+        print("  ✅ Client IP taken from the trusted proxy hop")
+        
+        from frame_verify import FrameVerifier, StaticSignerSource, VerifyKey, blake3, sign_frame_action
+        if VerifyKey is None or blake3 is None:
+            print("  ⚠️  pynacl/blake3 not installed, skipping spoofed fid check")
+            return True
+        from nacl.signing import SigningKey
+        from fastapi.testclient import TestClient
+        import main
+        
+        key = SigningKey.generate()
+        saved = main.frame_verifier, main.rate_limiter, main.settings.frame_verification
+        main.frame_verifier = FrameVerifier(
+            StaticSignerSource({42: [bytes(key.verify_key)], 43: [bytes(key.verify_key)]}), base_url=main.settings.base_url
+        )
+        main.rate_limiter = InMemoryRateLimiter(capacity=2, refill_per_second=0.0)
+        main.settings.frame_verification = "enforce"
+        try:
+            client = TestClient(main.app)
+            
+            def post(claimed_fid, signed_fid):
+                message = sign_frame_action(key, signed_fid, button_index=2, url=f"{main.settings.base_url}/match")
+                body = {"untrustedData": {"fid": claimed_fid, "buttonIndex": 2}, "trustedData": {"messageBytes": message.hex()}}
+                return "x-ratelimit-limited" in client.post("/match", json=body).headers
+            
+            # One signed message replayed with rotating untrustedData.fid: still fid 42's bucket
+            assert [post(claimed, 42) for claimed in (1, 2, 3)] == [False, False, True]
+            assert not post(42, 43), "another verified fid has its own bucket"
+        finally:
+            main.frame_verifier, main.rate_limiter, main.settings.frame_verification = saved
+        print("  ✅ Spoofed untrustedData.fid gets no fresh bucket")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Rate limiter error: {e}")
+        return False
+
+
+def test_profiler():
+    """Test sampling profiler"""
+    print("\n🔍 Testing sampling profiler...")
+    
+    try:
+        import threading
+        from profiler import SamplingProfiler
+        
+        # Keep a second thread busy so there is something to sample
+        done = threading.Event()
+        worker = threading.Thread(target=lambda: done.wait(5), name="busy-worker")
+        worker.start()
+        
+        profiler = SamplingProfiler(interval=0.005)
+        try:
+            stacks = profiler.sample(0.2)
+        finally:
+            done.set()
+            worker.join()
+        output = profiler.format_collapsed(stacks)
+        
+        assert stacks, "no samples collected"
+        assert output.splitlines()[0].rsplit(" ", 1)[1].isdigit()
+        print(f"  ✅ Collected {sum(stacks.values())} samples ({len(stacks)} unique stacks)")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Profiler error: {e}")
+        return False
+
+
+def test_memory_stats():
+    """Test memory accounting"""
+    print("\n🔍 Testing memory accounting...")
+    
+    try:
+        from memory_stats import MemoryAccountant
+        
+        accountant = MemoryAccountant()
+        store = {"small": "x", "big": "y" * 10000}
+        accountant.register("demo", store)
+        report = accountant.report(top=1)["demo"]
+        
+        assert report["entries"] == 2
+        assert report["largest"][0]["key"] == "big"
+        print(f"  ✅ Store report: {report['entries']} entries, ~{report['approx_bytes']} bytes")
+
+        # Stores mutated by the event loop while the report walks them in a thread
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("dictionary changed size during iteration")
+            return store
+
+        def busy():
+            raise RuntimeError("dictionary changed size during iteration")
+
+        accountant.register("flaky", flaky)
+        accountant.register("busy", busy)
+        reports = accountant.report(top=1)
+        assert reports["flaky"]["entries"] == 2 and len(calls) == 2 and "error" in reports["busy"]
+
+        import threading
+        from fastapi.testclient import TestClient
+        import main
+        walked_on = []
+        saved = main.settings.debug_token
+        main.settings.debug_token = "memory-test"
+        main.memory_accountant.register("thread_check", lambda: walked_on.append(threading.current_thread()) or {})
+        try:
+            response = TestClient(main.app).get("/debug/memory", headers={"x-debug-token": "memory-test"})
+            assert response.status_code == 200 and "thread_check" in response.json()["stores"]
+            assert walked_on and walked_on[0] is not threading.main_thread()
+        finally:
+            main.settings.debug_token = saved
+            main.memory_accountant.stores.pop("thread_check", None)
+        print("  ✅ /debug/memory walks stores in a worker thread, retries stores that change mid-walk")
+
+        accountant.take_snapshot("a")
+        garbage = [bytes(1000) for _ in range(100)]
+        accountant.take_snapshot("b")
+        diff = accountant.diff("a", "b", top=3)
+        accountant.stop_tracing()
+        print(f"  ✅ Snapshot diff: {len(diff)} sites")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Memory accounting error: {e}")
+        return False
+
+
 async def run_all_tests():
     """Run all tests"""
     print("=" * 60)
@@ -220,8 +1573,31 @@ async def run_all_tests():
     # Run async tests
     results.append(("Matchmaking", await test_matchmaking()))
     results.append(("Comedy", await test_comedy()))
+    results.append(("Comedy Batch", await test_comedy_batch()))
+    results.append(("Comedy Grammar", test_comedy_grammar()))
+    results.append(("Emoji Atlas", test_emoji_atlas()))
     results.append(("Image Generator", test_image_generator()))
+    results.append(("Image Variants", test_image_variants()))
     results.append(("API", await test_api()))
+    results.append(("Vocabulary", test_vocabulary()))
+    results.append(("Match Result", test_match_result()))
+    results.append(("Match Index", test_match_index()))
+    results.append(("Match History", test_match_history()))
+    results.append(("Bulk Import", test_import_users()))
+    results.append(("Snapshot", test_snapshot()))
+    results.append(("Vector Index", test_vector_index()))
+    results.append(("Batch Scoring", await test_batch_scoring()))
+    results.append(("Export", test_export()))
+    results.append(("Frame Verification", await test_frame_verification()))
+    results.append(("Single Flight", await test_single_flight()))
+    results.append(("Fast JSON", test_fast_json()))
+    results.append(("Static Assets", test_static_assets()))
+    results.append(("Overload", await test_overload()))
+    results.append(("Prefetch", await test_prefetch()))
+    results.append(("Analytics", await test_analytics()))
+    results.append(("Rate Limiter", await test_rate_limiter()))
+    results.append(("Profiler", test_profiler()))
+    results.append(("Memory Stats", test_memory_stats()))
     
     # Print summary
     print("\n" + "=" * 60)
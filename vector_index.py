@@ -0,0 +1,325 @@
+"""
+Vector Similarity Search
+Cosine top-k over user feature vectors: blocked brute force plus an IVF coarse-quantizer index
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import heapq
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, brute force falls back to pure Python
+    np = None
+
+
+def _normalize(vector: Sequence[float]):
+    if np is not None:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else array
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class _RowStore:
+    """Growable float32 matrix with an id per row and O(1) swap-remove"""
+
+    def __init__(self, dim: int, initial_capacity: int = 1024):
+        self.dim = dim
+        self.ids: List[str] = []
+        self.pos: Dict[str, int] = {}
+        if np is not None:
+            self.matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        else:
+            self.matrix = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, item_id: str, vector):
+        row = self.pos.get(item_id)
+        if row is None:
+            row = len(self.ids)
+            self.ids.append(item_id)
+            self.pos[item_id] = row
+            if np is not None:
+                if row >= self.matrix.shape[0]:
+                    grown = np.zeros((self.matrix.shape[0] * 2, self.dim), dtype=np.float32)
+                    grown[:row] = self.matrix[:row]
+                    self.matrix = grown
+            else:
+                self.matrix.append(None)
+        self.matrix[row] = vector
+
+    def remove(self, item_id: str) -> bool:
+        row = self.pos.pop(item_id, None)
+        if row is None:
+            return False
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.pos[moved] = row
+            self.matrix[row] = self.matrix[last]
+        self.ids.pop()
+        if np is None:
+            self.matrix.pop()
+        return True
+
+    def rows(self):
+        """Live rows as a matrix view (NumPy only)"""
+        return self.matrix[:len(self.ids)]
+
+
+def _merge_topk(best_scores, best_rows, scores, rows, k: int):
+    """Keep the k highest scores from two candidate sets"""
+    if best_scores is not None:
+        scores = np.concatenate([best_scores, scores])
+        rows = np.concatenate([best_rows, rows])
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[keep], rows[keep]
+    return scores, rows
+
+
+class FlatIndex:
+    """
+    Exact cosine search; scores blocks of rows at a time so the temporary
+    similarity matrix stays block_size x queries regardless of index size
+    """
+
+    def __init__(self, dim: int, block_size: int = 65536):
+        self.dim = dim
+        self.block_size = block_size
+        self.store = _RowStore(dim)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.store.pos
+
+    def add(self, item_id: str, vector: Sequence[float]):
+        self.store.add(item_id, _normalize(vector))
+
+    def add_many(self, items: Iterable[Tuple[str, Sequence[float]]]):
+        for item_id, vector in items:
+            self.add(item_id, vector)
+
+    def remove(self, item_id: str) -> bool:
+        return self.store.remove(item_id)
+
+    def vector(self, item_id: str):
+        row = self.store.pos.get(item_id)
+        return None if row is None else self.store.matrix[row]
+
+    def search(
+        self,
+        query: Sequence[float],
+        k: int = 10,
+        exclude: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Top-k (id, cosine) for one query vector"""
+        return self.search_many([query], k, exclude=[exclude])[0]
+
+    def search_many(
+        self,
+        queries: Sequence[Sequence[float]],
+        k: int = 10,
+        exclude: Optional[Sequence[Optional[str]]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Top-k for a batch of queries, one blocked matrix multiply per block"""
+        exclude = list(exclude or [None] * len(queries))
+        if not len(self.store):
+            return [[] for _ in queries]
+        # Ask for one extra result per query in case the excluded id is among them
+        want = min(k + 1, len(self.store))
+
+        if np is None:
+            return [
+                self._search_python(_normalize(query), want, k, skip)
+                for query, skip in zip(queries, exclude)
+            ]
+
+        query_matrix = np.stack([_normalize(query) for query in queries]).astype(np.float32)
+        best = [(None, None)] * len(queries)
+        rows = self.store.rows()
+
+        for start in range(0, len(rows), self.block_size):
+            block = rows[start:start + self.block_size]
+            sims = block @ query_matrix.T  # (block, queries)
+            for qi in range(sims.shape[1]):
+                column = sims[:, qi]
+                if len(column) > want:
+                    top = np.argpartition(-column, want - 1)[:want]
+                else:
+                    top = np.arange(len(column))
+                best[qi] = _merge_topk(best[qi][0], best[qi][1], column[top], top + start, want)
+
+        results = []
+        for (scores, found), skip in zip(best, exclude):
+            order = np.argsort(-scores)
+            hits = [(self.store.ids[found[i]], float(scores[i])) for i in order]
+            results.append([hit for hit in hits if hit[0] != skip][:k])
+        return results
+
+    def _search_python(self, query, want: int, k: int, skip: Optional[str]) -> List[Tuple[str, float]]:
+        scored = (
+            (sum(a * b for a, b in zip(row, query)), item_id)
+            for item_id, row in zip(self.store.ids, self.store.matrix)
+        )
+        top = heapq.nlargest(want, scored)
+        return [(item_id, score) for score, item_id in top if item_id != skip][:k]
+
+
+class IVFIndex:
+    """
+    Inverted-file index: k-means centroids partition the vectors and a query
+    only scans the `nprobe` closest partitions (sub-linear, approximate)
+    Requires NumPy
+    """
+
+    def __init__(self, dim: int, nlist: int = 256, nprobe: int = 8, block_size: int = 65536):
+        if np is None:
+            raise RuntimeError("IVFIndex requires numpy")
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.block_size = block_size
+        self.centroids = None
+        self.lists: List[_RowStore] = []
+        self.where: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.where
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors, iterations: int = 10, sample_size: Optional[int] = None, seed: int = 0):
+        """Spherical k-means on a sample of the vectors (~40 per list is plenty)"""
+        data = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(data, axis=1, keepdims=True)
+        data = data / np.where(norms == 0, 1, norms)
+
+        rng = np.random.default_rng(seed)
+        sample_size = sample_size or 40 * self.nlist
+        if len(data) > sample_size:
+            data = data[rng.choice(len(data), sample_size, replace=False)]
+        nlist = min(self.nlist, len(data))
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = self._assign(data, centroids)
+            # Sum members per cluster in one pass: sort by cluster, then reduce contiguous runs
+            order = np.argsort(assignment, kind="stable")
+            sorted_assignment = assignment[order]
+            clusters, starts = np.unique(sorted_assignment, return_index=True)
+            sums = np.add.reduceat(data[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids[clusters] = sums / np.where(norms == 0, 1, norms)
+
+            # Re-seed empty clusters so every list gets used
+            empty = np.setdiff1d(np.arange(nlist), clusters)
+            if len(empty):
+                centroids[empty] = data[rng.integers(len(data), size=len(empty))]
+
+        self.centroids = centroids
+        self.nlist = nlist
+        self.lists = [_RowStore(self.dim, initial_capacity=64) for _ in range(nlist)]
+        self.where = {}
+
+    def _assign(self, data, centroids):
+        assignment = np.empty(len(data), dtype=np.int64)
+        for start in range(0, len(data), self.block_size):
+            block = data[start:start + self.block_size]
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignment
+
+    def add(self, item_id: str, vector: Sequence[float]):
+        if not self.trained:
+            raise RuntimeError("IVFIndex must be trained before adding vectors")
+        vector = _normalize(vector)
+        list_no = int(np.argmax(self.centroids @ vector))
+        previous = self.where.get(item_id)
+        if previous is not None and previous != list_no:
+            self.lists[previous].remove(item_id)
+        self.lists[list_no].add(item_id, vector)
+        self.where[item_id] = list_no
+
+    def add_many(self, items: Iterable[Tuple[str, Sequence[float]]], chunk_size: int = 8192):
+        """Add in chunks, assigning each chunk to lists with one matrix multiply"""
+        if not self.trained:
+            raise RuntimeError("IVFIndex must be trained before adding vectors")
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                self._add_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._add_chunk(chunk)
+
+    def _add_chunk(self, chunk: List[Tuple[str, Sequence[float]]]):
+        data = np.asarray([vector for _, vector in chunk], dtype=np.float32)
+        norms = np.linalg.norm(data, axis=1, keepdims=True)
+        data = data / np.where(norms == 0, 1, norms)
+        assignment = self._assign(data, self.centroids)
+        for (item_id, _), vector, list_no in zip(chunk, data, assignment):
+            list_no = int(list_no)
+            previous = self.where.get(item_id)
+            if previous is not None and previous != list_no:
+                self.lists[previous].remove(item_id)
+            self.lists[list_no].add(item_id, vector)
+            self.where[item_id] = list_no
+
+    def remove(self, item_id: str) -> bool:
+        list_no = self.where.pop(item_id, None)
+        if list_no is None:
+            return False
+        return self.lists[list_no].remove(item_id)
+
+    def search(
+        self,
+        query: Sequence[float],
+        k: int = 10,
+        exclude: Optional[str] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """Approximate top-k (id, cosine) scanning the nprobe nearest lists"""
+        if not self.trained or not self.where:
+            return []
+        query = _normalize(query)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        want = k + 1
+        best_scores, best_ids = None, []
+        for list_no in probe:
+            store = self.lists[list_no]
+            if not len(store):
+                continue
+            scores = store.rows() @ query
+            if len(scores) > want:
+                top = np.argpartition(-scores, want - 1)[:want]
+            else:
+                top = np.arange(len(scores))
+            ids = [store.ids[i] for i in top]
+            if best_scores is None:
+                best_scores, best_ids = scores[top], ids
+            else:
+                best_scores = np.concatenate([best_scores, scores[top]])
+                best_ids = best_ids + ids
+                if len(best_scores) > want:
+                    keep = np.argpartition(-best_scores, want - 1)[:want]
+                    best_scores = best_scores[keep]
+                    best_ids = [best_ids[i] for i in keep]
+
+        if best_scores is None:
+            return []
+        order = np.argsort(-best_scores)
+        hits = [(best_ids[i], float(best_scores[i])) for i in order]
+        return [hit for hit in hits if hit[0] != exclude][:k]
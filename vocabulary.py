@@ -0,0 +1,89 @@
+"""
+Symbol Vocabularies
+Interns traits and token symbols into bit positions so sets become int bitmasks
+"""
+from typing import Callable, Dict, Iterable, List, Optional
+import threading
+
+
+if hasattr(int, "bit_count"):
+    def popcount(mask: int) -> int:
+        """Number of set bits"""
+        return mask.bit_count()
+else:  # Python < 3.10
+    def popcount(mask: int) -> int:
+        """Number of set bits"""
+        return bin(mask).count("1")
+
+
+def jaccard(mask1: int, mask2: int) -> float:
+    """Jaccard similarity of two bitmasks, in [0, 1]"""
+    union = popcount(mask1 | mask2)
+    return popcount(mask1 & mask2) / union if union else 0.0
+
+
+class Vocabulary:
+    """
+    Assigns every distinct symbol a bit, growing as new symbols appear
+    Python ints are arbitrary precision, so masks keep working past 64 symbols
+    """
+
+    def __init__(self, name: str, normalize: Optional[Callable[[str], str]] = None):
+        self.name = name
+        self.normalize = normalize or (lambda symbol: symbol.strip())
+        self._bits: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.normalize(symbol) in self._bits
+
+    def intern(self, symbol: str) -> int:
+        """Bit index for a symbol, assigning a new one if unseen"""
+        key = self.normalize(symbol)
+        bit = self._bits.get(key)
+        if bit is not None:
+            return bit
+
+        with self._lock:
+            bit = self._bits.get(key)
+            if bit is None:
+                bit = len(self._symbols)
+                self._symbols.append(symbol.strip())
+                self._bits[key] = bit
+        return bit
+
+    def mask(self, symbols: Iterable[str]) -> int:
+        """Bitmask for a collection of symbols"""
+        mask = 0
+        for symbol in symbols:
+            mask |= 1 << self.intern(symbol)
+        return mask
+
+    def symbols(self, mask: int) -> List[str]:
+        """Symbols whose bits are set in mask, in bit order"""
+        result = []
+        bit = 0
+        while mask:
+            if mask & 1:
+                result.append(self._symbols[bit])
+            mask >>= 1
+            bit += 1
+        return result
+
+    def to_list(self) -> List[str]:
+        """Symbols in bit order (enough to rebuild the vocabulary)"""
+        return list(self._symbols)
+
+    def load(self, symbols: Iterable[str]):
+        """Re-intern saved symbols in order so stored masks decode the same after a restart"""
+        for symbol in symbols:
+            self.intern(symbol)
+
+
+# Global vocabularies
+trait_vocab = Vocabulary("traits", normalize=lambda symbol: symbol.strip().casefold())
+token_vocab = Vocabulary("tokens", normalize=lambda symbol: symbol.strip().upper())